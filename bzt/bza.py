@@ -3,22 +3,81 @@ The idea for this module is to keep it separate from bzt codebase as much as pos
 it may become separate library in the future. Things like imports and logging should be minimal.
 """
 import base64
+import copy
+import gzip
 import json
 import logging
+import re
+import threading
 import time
 from collections import OrderedDict
 
 import requests
+from requests.adapters import HTTPAdapter
 from bzt import TaurusNetworkError, ManualShutdown, VERSION
 
+from bzt.six import BytesIO
 from bzt.six import cookielib
+from bzt.six import parse
 from bzt.six import string_types
 from bzt.six import text_type
 from bzt.six import urlencode
 from bzt.utils import to_json, MultiPartForm
 
 
+class RequestStats(object):
+    """
+    Latency counters of API calls, endpoints are told apart by method and URL path with numeric ids masked
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = OrderedDict()  # endpoint -> [count, errors, total time, max time]
+
+    @staticmethod
+    def get_endpoint(method, url):
+        parsed = parse.urlparse(url)
+        return "%s %s%s" % (method, parsed.netloc, re.sub(r"/\d+(?=/|$)", "/{id}", parsed.path))
+
+    def add(self, method, url, elapsed, is_error):
+        endpoint = self.get_endpoint(method, url)
+        with self.lock:
+            counters = self.endpoints.setdefault(endpoint, [0, 0, 0.0, 0.0])
+            counters[0] += 1
+            counters[1] += int(is_error)
+            counters[2] += elapsed
+            counters[3] = max(counters[3], elapsed)
+
+    def get_report(self):
+        """
+        :rtype: list[str]
+        """
+        with self.lock:
+            return ["%s: %s calls, %s errors, avg %.3fs, max %.3fs" % (endpoint, count, errors, total / count, max_time)
+                    for endpoint, (count, errors, total, max_time) in self.endpoints.items()]
+
+
+def get_http_session(pool_size=10):
+    """
+    Session with keep-alive connections pool, shared by BZA objects created from the same prototype
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def gzip_body(data):
+    buf = BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=6) as fds:
+        fds.write(data)
+    return buf.getvalue()
+
+
 class BZAObject(dict):
+    __proto_attrs = None
+
     def __init__(self, proto=None, data=None):
         """
         :type proto: BZAObject
@@ -32,26 +91,52 @@ class BZAObject(dict):
         self.timeout = 10
         self.logger_limit = 256
         self.token = None
+        self.gzip_requests = False  # compress bodies of bulk data uploads
+        self.gzip_threshold = 64 * 1024  # smaller bodies aren't worth compressing
         self.log = logging.getLogger(self.__class__.__name__)
-        self._cookies = cookielib.CookieJar()
-        self.http_request = requests.request
 
         # copy infrastructure from prototype
         if isinstance(proto, BZAObject):
+            for attr in self.__get_proto_attrs():
+                self.__setattr__(attr, proto.__getattribute__(attr))
+        else:
+            self._cookies = cookielib.CookieJar()
+            self.http_session = get_http_session()
+            self.http_session.cookies = self._cookies
+            self.http_request = self.http_session.request
+            self.request_stats = RequestStats()
+
+    def with_own_connections(self):
+        """
+        Copy of object with separate connections pool, to be used from another thread.
+        Cookies and request stats stay shared, they are thread-safe.
+
+        :rtype: BZAObject
+        """
+        clone = copy.copy(self)
+        clone.http_session = get_http_session(pool_size=1)
+        clone.http_session.cookies = self._cookies
+        clone.http_request = clone.http_session.request
+        return clone
+
+    @classmethod
+    def __get_proto_attrs(cls):
+        if BZAObject.__proto_attrs is None:
             attrs_own = set(dir(BZAObject()))
             attrs_parent = set(dir(BZAObject.__bases__[0]()))
             attrs_diff = attrs_own - attrs_parent  # get only BZAObject attrs
-            for attr in attrs_diff:
-                if attr.startswith('__') or attr in (self._request.__name__,):
-                    continue
-                self.__setattr__(attr, proto.__getattribute__(attr))
+            methods = (cls._request.__name__, cls.with_own_connections.__name__)
+            BZAObject.__proto_attrs = [attr for attr in attrs_diff if not attr.startswith('_BZAObject__') and
+                                       not attr.startswith('__') and attr not in methods]
+        return BZAObject.__proto_attrs
 
-    def _request(self, url, data=None, headers=None, method=None, raw_result=False):
+    def _request(self, url, data=None, headers=None, method=None, raw_result=False, compress=False):
         """
         :param url: str
         :type data: Union[dict,str]
         :param headers: dict
         :param method: str
+        :param compress: gzip body if it's enabled by `gzip_requests` and body is bigger than `gzip_threshold`
         :return: dict
         """
         if not headers:
@@ -81,8 +166,20 @@ class BZAObject(dict):
 
         self.log.debug("Request: %s %s %s", log_method, url, data[:self.logger_limit] if data else None)
 
-        response = self.http_request(method=log_method, url=url, data=data, headers=headers, cookies=self._cookies,
-                                     timeout=self.timeout)
+        if compress and self.gzip_requests and data and len(data) > self.gzip_threshold:
+            size = len(data)
+            data = gzip_body(data.encode("utf8") if isinstance(data, text_type) else data)
+            headers["Content-Encoding"] = "gzip"
+            self.log.debug("Request body is compressed from %s to %s bytes", size, len(data))
+
+        start = time.time()
+        try:
+            response = self.http_request(method=log_method, url=url, data=data, headers=headers,
+                                         cookies=self._cookies, timeout=self.timeout)
+        except BaseException:
+            self.request_stats.add(log_method, url, time.time() - start, True)
+            raise
+        self.request_stats.add(log_method, url, time.time() - start, response.status_code >= 400)
 
         resp = response.content
         if not isinstance(resp, str):
@@ -449,7 +546,7 @@ class Master(BZAObject):
 
     def send_custom_metrics(self, data):
         url = self.address + "/api/v4/data/masters/%s/custom-metrics" % self['id']
-        res = self._request(url, data, method="POST")
+        res = self._request(url, data, method="POST", compress=True)
         return res
 
     def send_custom_tables(self, data):
@@ -558,7 +655,7 @@ class Session(BZAObject):
         url %= self['id'], self.data_signature, self['testId'], self['userId']
         url += "&pq=0&target=%s&update=1" % self.kpi_target
         hdr = {"Content-Type": "application/json"}
-        response = self._request(url, data, headers=hdr)
+        response = self._request(url, data, headers=hdr, compress=True)
 
         if response and 'response_code' in response and response['response_code'] != 200:
             raise TaurusNetworkError("Failed to feed data, response code %s" % response['response_code'])
@@ -41,7 +41,7 @@ from bzt.six import build_opener, install_opener, urlopen, numeric_types, iterit
 from bzt.six import string_types, text_type, PY2, UserDict, parse, ProxyHandler, reraise
 from bzt.utils import PIPE, shell_exec, get_full_path, ExceptionalDownloader, get_uniq_name
 from bzt.utils import load_class, to_json, BetterDict, ensure_is_dict, dehumanize_time, is_windows
-from bzt.utils import str_representer
+from bzt.utils import str_representer, FileChangesWaiter
 
 SETTINGS = "settings"
 
@@ -75,8 +75,14 @@ class Engine(object):
         self.aggregator = Aggregator(is_functional=False)
         self.interrupted = False
         self.check_interval = 1
+        self.min_check_interval = 0.25
+        self.changes_waiter = None
+        self.results_files = set()  # files that modules read results from, see watch_results_files()
+        self.update_thread = None
         self.stopping_reason = None
         self.engine_loop_utilization = 0
+        self.engine_loop_misses = 0
+        self.check_scheduler = CheckScheduler(self.log)
         self.prepared = []
         self.started = []
         self.default_cwd = None
@@ -103,8 +109,9 @@ class Engine(object):
         self.config.merge({"version": bzt.VERSION})
         self._set_up_proxy()
 
-        thread = threading.Thread(target=self._check_updates)  # intentionally non-daemon thread
-        thread.start()
+        self.update_thread = threading.Thread(target=self._check_updates)  # intentionally non-daemon thread
+        if not self.__forks_readers():  # otherwise it's started after reader processes are forked
+            self.update_thread.start()
 
         return merged_config
 
@@ -116,6 +123,13 @@ class Engine(object):
         self.log.info("Preparing...")
         interval = self.config.get(SETTINGS).get("check-interval", self.check_interval)
         self.check_interval = dehumanize_time(interval)
+        min_interval = self.config.get(SETTINGS).get("min-check-interval", self.min_check_interval)
+        self.min_check_interval = min(dehumanize_time(min_interval), self.check_interval)
+        if self.config.get(SETTINGS).get("wake-on-results", True):
+            self.changes_waiter = FileChangesWaiter(self.log)
+        self.check_scheduler.threads = int(self.config.get(SETTINGS).get("check-threads", 0))
+        timeout = self.config.get(SETTINGS).get("check-timeout", self.check_scheduler.timeout)
+        self.check_scheduler.timeout = dehumanize_time(timeout)
 
         try:
             self.__prepare_aggregator()
@@ -130,12 +144,26 @@ class Engine(object):
 
     def _startup(self):
         modules = self.services + [self.aggregator] + self.reporters + [self.provisioning]  # order matters
+        forks_readers = self.__forks_readers()
+        if forks_readers:  # reader processes are forked before any module starts its threads
+            modules = [self.aggregator] + self.services + self.reporters + [self.provisioning]
         for module in modules:
             self.log.debug("Startup %s", module)
             self.started.append(module)
             module.startup()
+            if module is self.aggregator and forks_readers and self.update_thread and not self.update_thread.ident:
+                self.update_thread.start()
         self.config.dump()
 
+    def __forks_readers(self):
+        """
+        Aggregator with `reader-processes` option forks at startup, threads mustn't run at that moment
+        """
+        alias = self.config.get(SETTINGS).get("aggregator", "")
+        modules = self.config.get("modules")
+        settings = modules[alias] if alias in modules else {}
+        return isinstance(settings, dict) and bool(settings.get("reader-processes", False))
+
     def run(self):
         """
         Run the job. Calls `startup`, does periodic `check`,
@@ -167,12 +195,10 @@ class Engine(object):
             reraise(exc_info)
 
     def _check_modules_list(self):
-        finished = False
         modules = [self.provisioning, self.aggregator] + self.services + self.reporters  # order matters
-        for module in modules:
-            if module in self.started:
-                self.log.debug("Checking %s", module)
-                finished |= bool(module.check())
+        finished = self.check_scheduler.check([module for module in modules if module in self.started],
+                                              self.check_interval)
+        self.engine_loop_misses = self.check_scheduler.misses_count
         return finished
 
     def _wait(self):
@@ -189,12 +215,31 @@ class Engine(object):
             self.engine_loop_utilization = diff / self.check_interval
             self.log.debug("Iteration took %.3f sec, sleeping for %.3f sec...", diff, delay)
             if delay > 0:
-                time.sleep(delay)
+                self.__sleep(delay, self.min_check_interval - diff)
             prev = time.time()
             if self.interrupted:
                 raise ManualShutdown()
         self.config.dump()
 
+    def __sleep(self, delay, min_delay):
+        """
+        Sleep till next check, wake up earlier when results files are written
+        """
+        if self.changes_waiter:
+            self.changes_waiter.watch(self.results_files)
+            if self.changes_waiter.wait(delay, min_delay):
+                self.log.debug("Woken up by results")
+        else:
+            time.sleep(delay)
+
+    def watch_results_files(self, filenames):
+        """
+        Wake up engine loop as soon as any of given files is written
+
+        :type filenames: collections.Iterable[str]
+        """
+        self.results_files.update(filenames)
+
     def _shutdown(self):
         """
         Shutdown modules
@@ -202,6 +247,7 @@ class Engine(object):
         """
         self.log.info("Shutting down...")
         exc_info = None
+        self.check_scheduler.wait_background()
         modules = [self.provisioning, self.aggregator] + self.reporters + self.services  # order matters
         for module in modules:
             try:
@@ -212,6 +258,14 @@ class Engine(object):
                 if not exc_info:
                     exc_info = sys.exc_info()
 
+        if self.changes_waiter:
+            self.changes_waiter.close()
+
+        if self.check_scheduler.misses:
+            self.log.debug("Missed check deadlines: %s", self.check_scheduler.misses)
+        if self.check_scheduler.overruns:
+            self.log.debug("Overrun background checks: %s", self.check_scheduler.overruns)
+
         self.config.dump()
         if exc_info:
             reraise(exc_info)
@@ -549,6 +603,140 @@ class Engine(object):
                 self.log.warning("Failed to check for updates")
 
 
+class BackgroundCheck(threading.Thread):
+    """
+    Runs `check()` of module outside of engine loop thread, keeps its result or exception for the loop to pick up
+
+    :type module: EngineModule
+    """
+
+    def __init__(self, module):
+        super(BackgroundCheck, self).__init__(name="check-%s" % module.__class__.__name__)
+        self.daemon = True  # overrun check must not prevent Taurus from exiting
+        self.module = module
+        self.started = time.time()
+        self.overrun = False
+        self.result = None
+        self.exc_info = None
+
+    def run(self):
+        try:
+            self.result = self.module.check()
+        except BaseException:
+            self.exc_info = sys.exc_info()
+
+    def get_result(self):
+        if self.exc_info:
+            reraise(self.exc_info)
+        return self.result
+
+
+class CheckScheduler(object):
+    """
+    Decides which modules are checked at engine loop iteration and in what order.
+
+    Module is due for check when its `check_period` has passed since previous check (0 means every iteration),
+    due modules are checked in order of `check_priority`, higher first. Periodic modules are postponed
+    to next iteration if current one is already over its time budget. Check that happens later than
+    one loop interval after expected time is counted as deadline miss for the module.
+
+    When `threads` is set, checks of modules with `check_in_background` flag are started in up to that
+    many threads and their results are picked up by next iteration. Check that runs longer than `timeout`
+    is counted as overrun, module isn't checked again until it completes.
+    """
+
+    def __init__(self, parent_logger):
+        self.log = parent_logger.getChild(self.__class__.__name__)
+        self.last_checks = {}
+        self.misses = defaultdict(int)
+        self.misses_count = 0
+        self.threads = 0  # 0 means all checks are done in engine loop thread
+        self.timeout = 60
+        self.background = {}
+        self.overruns = defaultdict(int)
+        self.overruns_count = 0
+
+    def check(self, modules, interval):
+        """
+        Call `check()` of due modules
+
+        :type modules: list[EngineModule]
+        :type interval: float
+        :return: True if some module has finished
+        """
+        finished = self.__join_background()
+        started = time.time()
+        for module in sorted(modules, key=lambda mod: -mod.check_priority):  # sort is stable, order is kept
+            in_background = self.threads and module.check_in_background
+            if in_background and module in self.background:
+                continue  # previous check is still running
+
+            now = time.time()
+            period = self.__get_period(module)
+            last_check = self.last_checks.get(module, None)
+            if last_check is not None and now < last_check + period:
+                continue
+
+            if in_background and len(self.background) >= self.threads:
+                self.log.debug("No free check threads, postponing check of %s", module)
+                continue
+
+            if period and not in_background and now - started > interval:
+                self.log.debug("Loop iteration is over budget, postponing check of %s", module)
+                continue
+
+            if last_check is not None and now > last_check + max(period, interval) + interval:
+                self.misses[module.__class__.__name__] += 1
+                self.misses_count += 1
+                self.log.debug("Check deadline is missed for %s by %.3fs", module, now - last_check - period)
+
+            self.last_checks[module] = now
+            if in_background:
+                self.log.debug("Checking %s in background", module)
+                self.background[module] = BackgroundCheck(module)
+                self.background[module].start()
+            else:
+                self.log.debug("Checking %s", module)
+                finished |= bool(module.check())
+        return finished
+
+    def wait_background(self):
+        """
+        Wait for running background checks before modules are shut down, overrun checks are abandoned
+        """
+        for module, task in list(self.background.items()):
+            task.join(max(0, task.started + self.timeout - time.time()))
+            if task.is_alive():
+                self.__overrun(task)
+            elif task.exc_info:
+                self.log.warning("Background check of %s failed: %s", module, task.exc_info[1])
+        self.background.clear()
+
+    def __join_background(self):
+        finished = False
+        for module, task in list(self.background.items()):
+            if task.is_alive():
+                if not task.overrun and time.time() - task.started > self.timeout:
+                    self.__overrun(task)
+                continue
+
+            del self.background[module]
+            finished |= bool(task.get_result())
+        return finished
+
+    def __overrun(self, task):
+        task.overrun = True
+        self.overruns[task.module.__class__.__name__] += 1
+        self.overruns_count += 1
+        self.log.warning("Check of %s takes longer than %ss", task.module, self.timeout)
+
+    @staticmethod
+    def __get_period(module):
+        if "check-period" in module.settings:
+            return dehumanize_time(module.settings["check-period"])
+        return module.check_period
+
+
 class Configuration(BetterDict):
     """
     loading both JSONs and YAMLs and .properties-like override
@@ -680,6 +868,9 @@ class EngineModule(object):
         self.parameters = BetterDict()
         self.delay = None  # FIXME: why here? Why not in ScenarioExecutor?
         self.start_time = None  # FIXME: why here? Why not in ScenarioExecutor?
+        self.check_period = 0  # seconds between checks, 0 means every engine loop iteration
+        self.check_priority = 0  # modules with higher priority are checked first
+        self.check_in_background = False  # I/O-bound check that doesn't touch shared state, see CheckScheduler
 
     def prepare(self):
         """
@@ -206,6 +206,24 @@ class JMX(object):
 
         return JMX.__jtl_writer(filename, "KPI Writer", flags)
 
+    @staticmethod
+    def new_socket_listener(script_file, address, queue_size):
+        """
+        Generates JSR223 listener that sends samples to Taurus over TCP socket
+
+        :param script_file: path to sender script
+        :param address: (host, port) tuple
+        :param queue_size: max count of samples waiting for sending, others are dropped
+        :return:
+        """
+        listener = etree.Element("JSR223Listener", guiclass="TestBeanGUI", testclass="JSR223Listener",
+                                 testname="KPI Sender")
+        listener.append(JMX._string_prop("filename", script_file))
+        listener.append(JMX._string_prop("script", ""))
+        listener.append(JMX._string_prop("parameters", "%s %s %s" % (address[0], address[1], queue_size)))
+        listener.append(JMX._string_prop("scriptLanguage", "groovy"))
+        return listener
+
     @staticmethod
     def new_xml_listener(filename, is_full, user_flags):
         """
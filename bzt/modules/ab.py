@@ -19,7 +19,6 @@ limitations under the License.
 import logging
 import time
 from math import ceil
-from os import path
 
 from bzt import TaurusConfigError, ToolError
 from bzt.engine import ScenarioExecutor, HavingInstallableTools
@@ -27,7 +26,7 @@ from bzt.modules.aggregator import ConsolidatingAggregator, ResultsReader
 from bzt.modules.console import WidgetProvider, ExecutorWidget
 from bzt.requests_model import HTTPRequest
 from bzt.six import iteritems
-from bzt.utils import shell_exec, shutdown_process, RequiredTool, dehumanize_time
+from bzt.utils import shell_exec, shutdown_process, RequiredTool, dehumanize_time, FileReader
 
 
 class ApacheBenchmarkExecutor(ScenarioExecutor, WidgetProvider, HavingInstallableTools):
@@ -152,43 +151,26 @@ class TSVDataReader(ResultsReader):
     def __init__(self, filename, parent_logger):
         super(TSVDataReader, self).__init__()
         self.log = parent_logger.getChild(self.__class__.__name__)
-        self.filename = filename
-        self.fds = None
+        self.file = FileReader(filename, self.log)
         self.skipped_header = False
         self.concurrency = None
         self.url_label = None
 
+    def get_results_files(self):
+        return [self.file.filename]
+
     def setup(self, concurrency, url_label):
         self.concurrency = concurrency
         self.url_label = url_label
 
-    def __open_fds(self):
-        if not path.isfile(self.filename):
-            self.log.debug("File not appeared yet")
-            return False
-
-        if not path.getsize(self.filename):
-            self.log.debug("File is empty: %s", self.filename)
-            return False
-
-        if not self.fds:
-            self.fds = open(self.filename)
-
-        return True
-
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
-
     def _read(self, last_pass=False):
-        while not self.fds and not self.__open_fds():
+        while not self.file.is_ready():
             self.log.debug("No data to start reading yet")
             yield None
+
+        lines = self.file.get_text_lines(last_pass)
         if last_pass:
-            lines = self.fds.readlines()
-            self.fds.close()
-        else:
-            lines = self.fds.readlines(1024 * 1024)
+            self.file.close()
 
         for line in lines:
             if not self.skipped_header:
@@ -15,24 +15,294 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
+import bisect
 import copy
+import heapq
+import itertools
 import logging
 import math
+import multiprocessing
 import operator
+import os
 import re
+import signal
+import traceback
 from abc import abstractmethod
-from collections import Counter
+from array import array
+from collections import Counter, OrderedDict, defaultdict
 
 from bzt import TaurusInternalException, TaurusConfigError
 from bzt.engine import Aggregator
-from bzt.six import iteritems
-from bzt.utils import BetterDict, dehumanize_time
+from bzt.six import iteritems, accumulate
+from bzt.utils import BetterDict, dehumanize_time, JSONConvertible
 
 
-class KPISet(BetterDict):
+class RespTimesCounter(JSONConvertible):
+    """
+    Log-linear bucketed histogram of response times (HDR-style),
+    behaves like read-only Counter of {resp_time: count} for consumers.
+
+    Times are stored as integer microseconds. Values below 2^sub_bits get
+    own bucket each, every next power-of-two range is split into
+    2^(sub_bits-1) equal buckets, where 2^sub_bits >= 2 * 10^sign_figures.
+    Value reported for bucket is its middle, so relative error of any
+    reported time (percentiles as well) is not bigger than 0.5 * 10^-sign_figures.
+    Only non-empty buckets are stored, their count can't exceed
+    2^(sub_bits-1) * (log2(max_time_in_us) - sub_bits + 2),
+    e.g. ~23K for 3 significant figures and 1 hour max time.
+
+    :type sign_figures: int
+    """
+    RESOLUTION = 1000000.0  # time units per second
+    MAX_INSORTS = 16  # more new buckets at once are cheaper to sort than insert one by one
+    __slots__ = ('sign_figures', '_sub_bits', '_half_count', '_counts', '_indexes', '_cumulative',
+                 '_total', '_sum', '_sum_sq', '_owner')
+
+    def __init__(self, sign_figures=3):
+        super(RespTimesCounter, self).__init__()
+        self.sign_figures = sign_figures
+        self._sub_bits = int(math.ceil(math.log(2 * 10 ** sign_figures, 2)))
+        self._half_count = 1 << (self._sub_bits - 1)
+        self._counts = Counter()  # bucket index -> count
+        self._indexes = []  # sorted bucket indexes, None if need to be sorted again
+        self._cumulative = None  # counts of times up to and including each bucket in _indexes, None if outdated
+        # running sums over bucket values to get stdev without pass over buckets
+        self._total = 0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._owner = None  # KPISet to notify about changes, see KPISet.recalculate()
+
+    def __deepcopy__(self, memo):
+        mycopy = RespTimesCounter(self.sign_figures)
+        mycopy._counts = self._counts.copy()
+        mycopy._indexes = None if self._indexes is None else self._indexes[:]
+        mycopy._cumulative = None if self._cumulative is None else self._cumulative[:]
+        mycopy._total = self._total
+        mycopy._sum = self._sum
+        mycopy._sum_sq = self._sum_sq
+        return mycopy
+
+    def __getstate__(self):
+        # owner is linked again by KPISet
+        return tuple(None if name == '_owner' else getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __json__(self):
+        return dict(self.items())
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __bool__(self):
+        return bool(self._counts)
+
+    __nonzero__ = __bool__
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, r_time):
+        return self.__bucket(r_time) in self._counts
+
+    def __getitem__(self, r_time):
+        return self._counts[self.__bucket(r_time)]
+
+    def __bucket(self, r_time):
+        units = int(round(r_time * self.RESOLUTION))
+        if units < 0:
+            units = 0
+
+        shift = units.bit_length() - self._sub_bits
+        if shift <= 0:
+            return units
+        return shift * self._half_count + (units >> shift)
+
+    def __bucket_value(self, index):
+        shift = index // self._half_count - 1
+        if shift <= 0:
+            return index / self.RESOLUTION
+
+        low = (index - shift * self._half_count) << shift
+        return (low + (1 << (shift - 1))) / self.RESOLUTION
+
+    def __get_indexes(self):
+        if self._indexes is None:
+            self._indexes = sorted(self._counts)
+        return self._indexes
+
+    def __get_cumulative(self):
+        if self._cumulative is None:
+            counts = self._counts
+            self._cumulative = list(accumulate(counts[index] for index in self.__get_indexes()))
+        return self._cumulative
+
+    def __add_to_bucket(self, index, count):
+        if index not in self._counts and self._indexes is not None:
+            bisect.insort(self._indexes, index)
+        self._counts[index] += count
+        self._cumulative = None
+        if self._owner is not None:
+            self._owner._dirty = True  # pylint: disable=protected-access
+
+        value = self.__bucket_value(index)
+        self._total += count
+        self._sum += value * count
+        self._sum_sq += value * value * count
+
+    def keys(self):
+        return [self.__bucket_value(index) for index in self.__get_indexes()]
+
+    def values(self):
+        return [self._counts[index] for index in self.__get_indexes()]
+
+    def items(self):
+        return [(self.__bucket_value(index), self._counts[index]) for index in self.__get_indexes()]
+
+    def add(self, r_time, count=1):
+        """
+        Record response time
+
+        :type r_time: float
+        :type count: int
+        """
+        self.__add_to_bucket(self.__bucket(r_time), count)
+
+    def update(self, src):
+        """
+        Merge other histogram or {resp_time: count} dict into self
+
+        :type src: RespTimesCounter|dict
+        """
+        if isinstance(src, RespTimesCounter) and src.sign_figures == self.sign_figures:
+            # pylint: disable=protected-access
+            if self._indexes is not None:
+                new_indexes = [index for index in src._counts if index not in self._counts]
+                if len(new_indexes) > self.MAX_INSORTS:
+                    self._indexes = None
+                else:
+                    for index in new_indexes:
+                        bisect.insort(self._indexes, index)
+            self._counts.update(src._counts)
+            self._cumulative = None
+            if self._owner is not None:
+                self._owner._dirty = True  # pylint: disable=protected-access
+            self._total += src._total
+            self._sum += src._sum
+            self._sum_sq += src._sum_sq
+        else:
+            bucket = self.__bucket
+            for r_time, count in src.items():
+                self.__add_to_bucket(bucket(float(r_time)), count)
+
+    def get_perc_and_stdev(self, percentiles_to_calc=(), avg=0):
+        """
+        Returns [(percentile, value)] with nearest rank percentiles.
+        Percentile 0: <min_value>, 100: <max_value>.
+        percentiles_to_calc: iterable for percentiles to calculate; 0 <= ~ <= 100
+
+        Percentiles are found by binary search over cumulative counts,
+        stdev is calculated from running sums.
+
+        :type percentiles_to_calc: list(float)
+        :type avg: float
+        """
+        assert all(0 <= percentile <= 100 for percentile in percentiles_to_calc)
+        percentiles = []
+        if not self._counts:
+            return percentiles, 0
+
+        indexes = self.__get_indexes()
+        cumulative = self.__get_cumulative()
+        num = self._total
+        for percentile in sorted(percentiles_to_calc):
+            if percentile < 100:
+                position = bisect.bisect_right(cumulative, percentile / 100.0 * num)
+                index = indexes[min(position, len(indexes) - 1)]
+            else:
+                index = indexes[-1]  # we could add a small value
+            percentiles.append((percentile, self.__bucket_value(index)))
+
+        sqr_diffs = self._sum_sq - 2 * avg * self._sum + avg * avg * num
+        stdev = math.sqrt(max(sqr_diffs, 0) / num)
+        return percentiles, stdev
+
+
+class SamplesBatch(object):
+    """
+    Columnar chunk of samples, alternative for readers to yielding one tuple
+    per sample from ResultsReader._read. Numeric columns are arrays,
+    string columns (label, rc, error, trname) are lists of shared str objects.
+    """
+
+    def __init__(self):
+        super(SamplesBatch, self).__init__()
+        self.timestamps = array('l')
+        self.labels = []
+        self.concurrencies = array('l')
+        self.r_times = array('d')
+        self.con_times = array('d')
+        self.latencies = array('d')
+        self.r_codes = []
+        self.errors = []
+        self.trnames = []
+        self.byte_counts = array('l')
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __bool__(self):
+        return len(self.timestamps) > 0
+
+    __nonzero__ = __bool__
+
+    def append(self, t_stamp, label, conc, r_time, con_time, latency, r_code, error, trname, byte_count):
+        """
+        Add sample, fields are the same as in tuples returned by ResultsReader._read
+        """
+        self.timestamps.append(t_stamp)
+        self.labels.append(label)
+        self.concurrencies.append(conc or 0)
+        self.r_times.append(r_time)
+        self.con_times.append(con_time or 0.0)
+        self.latencies.append(latency)
+        self.r_codes.append(r_code)
+        self.errors.append(error)
+        self.trnames.append(trname)
+        self.byte_counts.append(byte_count or 0)
+
+    def extend(self, samples):
+        """
+        Add list of sample tuples at once, column by column.
+        Unlike append, no None values are allowed for numeric fields.
+
+        :type samples: list[tuple]
+        """
+        if not samples:
+            return
+
+        t_stamps, labels, concs, r_times, con_times, latencies, r_codes, errors, trnames, byte_counts = zip(*samples)
+        self.timestamps.extend(t_stamps)
+        self.labels.extend(labels)
+        self.concurrencies.extend(concs)
+        self.r_times.extend(r_times)
+        self.con_times.extend(con_times)
+        self.latencies.extend(latencies)
+        self.r_codes.extend(r_codes)
+        self.errors.extend(errors)
+        self.trnames.extend(trnames)
+        self.byte_counts.extend(byte_counts)
+
+
+class KPISet(JSONConvertible):
     """
     Main entity in results, contains all KPIs for single label,
     capable of merging other KPISet's into it to compose cumulative results
+
+    Values are stored in slots, vectors are created on first use.
+    Dict-like access to them by KPI names is kept for consumers.
     """
     ERRORS = "errors"
     SAMPLE_COUNT = "throughput"
@@ -49,39 +319,174 @@ class KPISet(BetterDict):
     RESP_CODES = "rc"
     ERRTYPE_ERROR = 0
     ERRTYPE_ASSERT = 1
+    OTHER_ERRORS = "Other errors"
 
-    def __init__(self, perc_levels=(), rt_dist_maxlen=None):
+    # ids, hashes and numbers embedded into error messages,
+    # errors that differ only by them are counted together
+    error_generalize_regexps = [
+        (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "U"),
+        (re.compile(r"\b(?=[a-fA-F]*[0-9])[0-9a-fA-F]{8,}\b"), "U"),
+        (re.compile(r"\b[0-9]+\b"), "N"),
+    ]
+
+    SCALARS = (SAMPLE_COUNT, CONCURRENCY, SUCCESSES, FAILURES,
+               AVG_RESP_TIME, STDEV_RESP_TIME, AVG_LATENCY, AVG_CONN_TIME, BYTE_COUNT)
+    VECTORS = (ERRORS, RESP_TIMES, RESP_CODES, PERCENTILES)
+    KPIS = frozenset(SCALARS + VECTORS)
+    CALCULATED = frozenset((CONCURRENCY, AVG_RESP_TIME, STDEV_RESP_TIME, AVG_LATENCY, AVG_CONN_TIME, PERCENTILES))
+
+    # KPI values are stored in slots named after them
+    __slots__ = SCALARS + VECTORS + ('sum_rt', 'sum_lt', 'sum_cn', 'perc_levels', 'rtimes_digits',
+                                     'max_error_variety', 'generalize_errors', '_concurrencies', '_errors_index',
+                                     '_extras', '_dirty')
+
+    def __init__(self, perc_levels=(), rtimes_digits=3, max_error_variety=0, generalize_errors=False):
         super(KPISet, self).__init__()
         self.sum_rt = 0
         self.sum_lt = 0
         self.sum_cn = 0
         self.perc_levels = perc_levels
-        self.rtimes_len = rt_dist_maxlen
+        self.rtimes_digits = rtimes_digits
+        self.max_error_variety = max_error_variety  # 0 means no limit
+        self.generalize_errors = generalize_errors  # count errors together when they differ by ids and numbers only
         # scalars
-        self.get(self.SAMPLE_COUNT, 0)
-        self.get(self.CONCURRENCY, 0)
-        self.get(self.SUCCESSES, 0)
-        self.get(self.FAILURES, 0)
-        self.get(self.AVG_RESP_TIME, 0)
-        self.get(self.STDEV_RESP_TIME, 0)
-        self.get(self.AVG_LATENCY, 0)
-        self.get(self.AVG_CONN_TIME, 0)
-        self.get(self.BYTE_COUNT, 0)
-        # vectors
-        self.get(self.ERRORS, [])
-        self.get(self.RESP_TIMES, Counter())
-        self.get(self.RESP_CODES, Counter())
-        self.get(self.PERCENTILES)
-        self._concurrencies = BetterDict()  # NOTE: shouldn't it be Counter?
+        self.throughput = 0
+        self.concurrency = 0
+        self.succ = 0
+        self.fail = 0
+        self.avg_rt = 0
+        self.stdev_rt = 0
+        self.avg_lt = 0
+        self.avg_ct = 0
+        self.bytes = 0
+        # vectors, see __new_vector()
+        self.errors = None
+        self.rt = None
+        self.rc = None
+        self.perc = None
+        self._concurrencies = None
+        self._errors_index = None  # see __get_errors_index()
+        self._extras = None  # non-KPI keys set by consumers
+        self._dirty = False  # calculated KPIs are outdated, see recalculate()
+
+    def __new_vector(self, key):
+        if key == self.ERRORS:
+            vector = []
+        elif key == self.RESP_TIMES:
+            vector = RespTimesCounter(self.rtimes_digits)
+            vector._owner = self  # pylint: disable=protected-access
+        elif key == self.RESP_CODES:
+            vector = Counter()
+        else:
+            vector = BetterDict()
+        setattr(self, key, vector)
+        return vector
+
+    def __getitem__(self, key):
+        if key in self.CALCULATED and self._dirty:
+            self.recalculate()
+        return self.__get(key)
+
+    def __get(self, key):
+        if key in self.KPIS:
+            value = getattr(self, key)
+            if value is None:
+                value = self.__new_vector(key)
+            return value
+        elif self._extras is not None and key in self._extras:
+            return self._extras[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.KPIS:
+            if key == self.ERRORS:
+                self._errors_index = None
+            if key not in self.CALCULATED:
+                self._dirty = True
+            if key == self.RESP_TIMES and isinstance(value, RespTimesCounter):
+                value._owner = self  # pylint: disable=protected-access
+            setattr(self, key, value)
+        else:
+            if self._extras is None:
+                self._extras = {}
+            self._extras[key] = value
+
+    def __contains__(self, key):
+        return key in self.KPIS or (self._extras is not None and key in self._extras)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.KPIS) + (len(self._extras) if self._extras else 0)
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, dict(self.items()))
+
+    def __json__(self):
+        return dict(self.items())
+
+    def keys(self):
+        keys = list(self.SCALARS + self.VECTORS)
+        if self._extras:
+            keys.extend(self._extras.keys())
+        return keys
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def items(self):
+        if self._dirty:
+            self.recalculate()
+        return [(key, self.__get(key)) for key in self.keys()]
+
+    def get(self, key, default=defaultdict):
+        """
+        Same as BetterDict.get, sets default value if key is absent
+
+        :type key: str
+        """
+        if key in self:
+            return self[key]
+
+        if default == defaultdict:
+            default = BetterDict()
+        elif isinstance(default, BaseException):
+            raise default
+
+        self[key] = default
+        return default
+
+    setdefault = get
+
+    def __getstate__(self):
+        # errors index is rebuilt on demand, no need to transfer it
+        return tuple(None if name == '_errors_index' else getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+        if isinstance(self.rt, RespTimesCounter):
+            self.rt._owner = self  # pylint: disable=protected-access
 
     def __deepcopy__(self, memo):
-        mycopy = KPISet(self.perc_levels)
+        mycopy = KPISet(self.perc_levels, self.rtimes_digits, self.max_error_variety, self.generalize_errors)
         mycopy.sum_rt = self.sum_rt
         mycopy.sum_lt = self.sum_lt
         mycopy.sum_cn = self.sum_cn
-        mycopy.rtimes_len = self.rtimes_len
-        for key, val in iteritems(self):
-            mycopy[key] = copy.deepcopy(val, memo)
+        for key in self.SCALARS:
+            setattr(mycopy, key, getattr(self, key))
+        for key in self.VECTORS:
+            value = getattr(self, key)
+            if value is not None:
+                setattr(mycopy, key, copy.deepcopy(value, memo))
+        if self._concurrencies is not None:
+            mycopy._concurrencies = self._concurrencies.copy()
+        if self._extras is not None:
+            mycopy._extras = copy.deepcopy(self._extras, memo)
+        if isinstance(mycopy.rt, RespTimesCounter):
+            mycopy.rt._owner = mycopy  # pylint: disable=protected-access
+        mycopy._dirty = self._dirty
         return mycopy
 
     @staticmethod
@@ -111,8 +516,11 @@ class KPISet(BetterDict):
         """
         # TODO: introduce a flag to not count failed in resp times? or offer it always?
         cnc, r_time, con_time, latency, r_code, error, trname, byte_count = sample
-        self[self.SAMPLE_COUNT] += 1
+        self._dirty = True
+        self.throughput += 1
         if cnc:
+            if self._concurrencies is None:
+                self._concurrencies = {}
             self._concurrencies[trname] = cnc
 
         if r_code is not None:
@@ -125,20 +533,72 @@ class KPISet(BetterDict):
             self.sum_rt += r_time
 
         if error is not None:
-            self[self.FAILURES] += 1
+            self.fail += 1
 
-            item = self.error_item_skel(error, r_code, 1, KPISet.ERRTYPE_ERROR, Counter())
-            self.inc_list(self[self.ERRORS], ("msg", error), item)
+            self.inc_error(self.error_item_skel(error, r_code, 1, KPISet.ERRTYPE_ERROR, Counter()))
         else:
-            self[self.SUCCESSES] += 1
+            self.succ += 1
 
-        self[self.RESP_TIMES][r_time] += 1
+        self[self.RESP_TIMES].add(r_time)
 
         if byte_count is not None:
-            self[self.BYTE_COUNT] += byte_count
+            self.bytes += byte_count
             # TODO: max/min rt? there is percentiles...
             # TODO: throughput if interval is not 1s
 
+    def add_samples(self, batch, indexes):
+        """
+        Add group of samples from columnar batch, same as calling
+        add_sample for each of them, but with per-column passes
+
+        :type batch: SamplesBatch
+        :type indexes: list[int]
+        """
+        if len(indexes) > 1:
+            take = operator.itemgetter(*indexes)
+        else:
+            take = lambda column: (column[indexes[0]],)
+
+        r_times = take(batch.r_times)
+        r_codes = take(batch.r_codes)
+
+        self._dirty = True
+        self.throughput += len(indexes)
+        concurrencies = take(batch.concurrencies)
+        if any(concurrencies):
+            if self._concurrencies is None:
+                self._concurrencies = {}
+            trnames = itertools.compress(take(batch.trnames), concurrencies)
+            self._concurrencies.update(zip(trnames, itertools.compress(concurrencies, concurrencies)))
+
+        rc_counts = Counter(r_codes)
+        rc_counts.pop(None, None)
+        self[self.RESP_CODES].update(rc_counts)
+
+        # count times only if we have RCs
+        latencies = take(batch.latencies)
+        con_times = take(batch.con_times)
+        if None in r_codes:
+            has_rc = [r_code is not None for r_code in r_codes]
+            latencies = itertools.compress(latencies, has_rc)
+            con_times = itertools.compress(con_times, has_rc)
+            self.sum_rt += sum(itertools.compress(r_times, has_rc))
+        else:
+            self.sum_rt += sum(r_times)
+        self.sum_lt += sum(latencies)
+        self.sum_cn += sum(con_times)
+
+        failures = 0
+        for (error, r_code), cnt in iteritems(Counter(zip(take(batch.errors), r_codes))):
+            if error is not None:
+                failures += cnt
+                self.inc_error(self.error_item_skel(error, r_code, cnt, KPISet.ERRTYPE_ERROR, Counter()))
+        self.fail += failures
+        self.succ += len(indexes) - failures
+
+        self[self.RESP_TIMES].update(Counter(r_times))
+        self.bytes += sum(take(batch.byte_counts))
+
     @staticmethod
     def inc_list(values, selector, value):
         """
@@ -162,99 +622,163 @@ class KPISet(BetterDict):
         if not found:
             values.append(copy.deepcopy(value))
 
-    def recalculate(self):
+    @classmethod
+    def error_key(cls, item, generalize=False):
         """
-        Recalculate averages, stdev and percentiles
+        Key to match error items: message, response code and error type
 
-        :return:
+        :type item: dict
+        :param generalize: replace ids and numbers in message
+        :rtype: tuple
         """
-        if self[self.SAMPLE_COUNT]:
-            self[self.AVG_CONN_TIME] = self.sum_cn / self[self.SAMPLE_COUNT]
-            self[self.AVG_LATENCY] = self.sum_lt / self[self.SAMPLE_COUNT]
-            self[self.AVG_RESP_TIME] = self.sum_rt / self[self.SAMPLE_COUNT]
-
-        if len(self._concurrencies):
-            self[self.CONCURRENCY] = sum(self._concurrencies.values())
-
-        perc, stdev = self.__perc_and_stdev(self[self.RESP_TIMES], self.perc_levels, self[self.AVG_RESP_TIME])
-        for level, val in perc:
-            self[self.PERCENTILES][str(float(level))] = val
+        msg = item['msg']
+        if msg and generalize:
+            for regexp, replacement in cls.error_generalize_regexps:
+                msg = regexp.sub(replacement, msg)
+        return msg, item['rc'], item['type']
+
+    @classmethod
+    def inc_index(cls, index, value, generalize=False):
+        """
+        Increment error item in index, based on error_key(),
+        copy of value is added if there's no matching item
 
-        self[self.STDEV_RESP_TIME] = stdev
+        :param index: dict of error items by their keys
+        :param value: error item to add
+        :param generalize: match items by generalized messages
+        :type index: dict
+        :type value: dict
+        :return: item that was added or incremented
+        :rtype: dict
+        """
+        key = cls.error_key(value, generalize)
+        item = index.get(key)
+        if item is None:
+            item = dict(value)
+            item['urls'] = Counter(value['urls'])
+            index[key] = item
+        else:
+            item['cnt'] += value['cnt']
+            item['urls'].update(value['urls'])
+
+        return item
+
+    def __get_errors_index(self):
+        errors = self[self.ERRORS]
+        if self._errors_index is None or len(self._errors_index) != len(errors):
+            # errors list was replaced or extended outside, reindex it
+            self._errors_index = OrderedDict()
+            for item in errors:
+                self.inc_index(self._errors_index, item, self.generalize_errors)
+            errors[:] = self._errors_index.values()
+        return self._errors_index
+
+    def inc_error(self, value):
+        """
+        Increment matching error item or add the copy of value to errors
 
-        return self
+        :type value: dict
+        """
+        index = self.__get_errors_index()
+        size = len(index)
+        item = self.inc_index(index, value, self.generalize_errors)
+        if len(index) > size:
+            self.errors.append(item)
 
-    def compact_times(self):
-        if not self.rtimes_len:
+    def __compact_errors(self):
+        """
+        Keep top errors by count, fold the rest into 'other errors' items
+        of their response code and type, so counts by response code stay correct
+        """
+        index = self.__get_errors_index()
+        others = OrderedDict((key, item) for key, item in iteritems(index) if key[0] == self.OTHER_ERRORS)
+        if len(index) - len(others) <= self.max_error_variety:
             return
 
-        times = self[KPISet.RESP_TIMES]
-        redundant_cnt = len(times) - self.rtimes_len
-        if redundant_cnt > 0:
-            logging.debug("Compacting %s response timing into %s", len(times), self.rtimes_len)
-
-        while redundant_cnt > 0:
-            keys = sorted(times.keys())
-            distances = [(lidx, keys[lidx + 1] - keys[lidx]) for lidx in range(len(keys) - 1)]
-            distances.sort(key=operator.itemgetter(1))  # sort by distance
-
-            # cast candidates for consolidation
-            lkeys_indexes = [lidx for lidx, _ in distances[:redundant_cnt]]
-
-            while lkeys_indexes:
-                lidx = lkeys_indexes.pop(0)
-                lkey = keys[lidx]
-                rkey = keys[lidx + 1]
-                if lkey in times and rkey in times:  # neighbours aren't changed
-                    lval = times.pop(lkey)
-                    rval = times.pop(rkey)
+        top = sorted([(key, item) for key, item in iteritems(index) if key not in others],
+                     key=lambda key_item: key_item[1]['cnt'], reverse=True)
+        self._errors_index = OrderedDict(top[:self.max_error_variety])
+        for _, item in top[self.max_error_variety:]:
+            other_key = (self.OTHER_ERRORS, item['rc'], item['type'])
+            if other_key not in others:
+                others[other_key] = self.error_item_skel(self.OTHER_ERRORS, item['rc'], 0, item['type'], Counter())
+            others[other_key]['cnt'] += item['cnt']  # urls are dropped to keep the size bounded
+        self._errors_index.update(others)
+        self.errors[:] = self._errors_index.values()
 
-                    # shift key proportionally to values
-                    idx_new = lkey + (rkey - lkey) * float(rval) / (lval + rval)
+    def recalculate(self):
+        """
+        Recalculate averages, stdev and percentiles,
+        does nothing if KPISet wasn't changed since previous call
 
-                    # keep precision the same
-                    lprec = len(str(math.modf(lkey)[0])) - 2
-                    rprec = len(str(math.modf(rkey)[0])) - 2
-                    idx_new = round(idx_new, max(lprec, rprec))
+        :return:
+        """
+        if not self._dirty:
+            return self
+
+        if self.throughput:
+            self.avg_ct = self.sum_cn / self.throughput
+            self.avg_lt = self.sum_lt / self.throughput
+            self.avg_rt = self.sum_rt / self.throughput
+
+        if self._concurrencies:
+            self.concurrency = sum(self._concurrencies.values())
+
+        if self.max_error_variety and self.errors and len(self.errors) > self.max_error_variety:
+            self.__compact_errors()
+
+        if self.rt:
+            perc, self.stdev_rt = self.rt.get_perc_and_stdev(self.perc_levels, self.avg_rt)
+            if self.perc is None:
+                self.perc = BetterDict()
+            for level, val in perc:
+                self.perc[str(float(level))] = val
+        else:
+            self.stdev_rt = 0
 
-                    times[idx_new] = lval + rval
-                    redundant_cnt -= 1
+        self._dirty = False
+        return self
 
-    def merge_kpis(self, src, sid=None):
+    def merge_kpis(self, src, sid=None, with_concurrency=True):
         """
         Merge other instance into self
 
         :param sid: source ID to use when suming up concurrency
+        :param with_concurrency: take concurrency of src into account
         :type src: KPISet
         :return:
         """
         src.recalculate()
+        self._dirty = True
 
         self.sum_cn += src.sum_cn
         self.sum_lt += src.sum_lt
         self.sum_rt += src.sum_rt
 
-        self[self.SAMPLE_COUNT] += src[self.SAMPLE_COUNT]
-        self[self.SUCCESSES] += src[self.SUCCESSES]
-        self[self.FAILURES] += src[self.FAILURES]
-        self[self.BYTE_COUNT] += src[self.BYTE_COUNT]
+        self.throughput += src.throughput
+        self.succ += src.succ
+        self.fail += src.fail
+        self.bytes += src.bytes
         # NOTE: should it be average? mind the timestamp gaps
-        if src[self.CONCURRENCY]:
-            self._concurrencies[sid] = src[self.CONCURRENCY]
+        if src.concurrency and with_concurrency:
+            if self._concurrencies is None:
+                self._concurrencies = {}
+            self._concurrencies[sid] = src.concurrency
 
-        if src[self.RESP_TIMES]:
+        if src.rt:
             # using raw times to calculate percentiles
-            self[self.RESP_TIMES].update(src[self.RESP_TIMES])
-            self.compact_times()
-        elif not self[self.PERCENTILES]:
+            self[self.RESP_TIMES].update(src.rt)
+        elif not self.perc and src.perc:
             # using existing percentiles
             # FIXME: it's not valid to overwrite, better take average
-            self[self.PERCENTILES] = copy.deepcopy(src[self.PERCENTILES])
+            self.perc = copy.deepcopy(src.perc)
 
-        self[self.RESP_CODES].update(src[self.RESP_CODES])
+        if src.rc:
+            self[self.RESP_CODES].update(src.rc)
 
-        for src_item in src[self.ERRORS]:
-            self.inc_list(self[self.ERRORS], ('msg', src_item['msg']), src_item)
+        if src.errors:
+            for src_item in src.errors:
+                self.inc_error(src_item)
 
     @staticmethod
     def from_dict(obj):
@@ -269,57 +793,17 @@ class KPISet(BetterDict):
         inst.sum_cn = obj[inst.AVG_CONN_TIME] * obj[inst.SAMPLE_COUNT]
         inst.sum_lt = obj[inst.AVG_LATENCY] * obj[inst.SAMPLE_COUNT]
         inst.sum_rt = obj[inst.AVG_RESP_TIME] * obj[inst.SAMPLE_COUNT]
-        inst.perc_levels = [float(x) for x in inst[inst.PERCENTILES].keys()]
-        inst[inst.RESP_TIMES] = {float(level): inst[inst.RESP_TIMES][level] for level in inst[inst.RESP_TIMES].keys()}
+        inst.perc_levels = [float(x) for x in obj.get(inst.PERCENTILES, {}).keys()]
+        if isinstance(inst.rt, RespTimesCounter):
+            inst.rtimes_digits = inst.rt.sign_figures
+        else:
+            rtimes = RespTimesCounter(inst.rtimes_digits)
+            rtimes.update(obj.get(inst.RESP_TIMES, {}))
+            inst[inst.RESP_TIMES] = rtimes
         for error in inst[KPISet.ERRORS]:
             error['urls'] = Counter(error['urls'])
         return inst
 
-    @staticmethod
-    def __perc_and_stdev(cnts_dict, percentiles_to_calc=(), avg=0):
-        """
-        from http://stackoverflow.com/questions/25070086/percentiles-from-counts-of-values
-        Returns [(percentile, value)] with nearest rank percentiles.
-        Percentile 0: <min_value>, 100: <max_value>.
-        cnts_dict: { <value>: <count> }
-        percentiles_to_calc: iterable for percentiles to calculate; 0 <= ~ <= 100
-
-        upd: added stdev calc to have it in single-pass for mans of efficiency
-
-        :type percentiles_to_calc: list(float)
-        :type cnts_dict: collections.Counter
-        """
-        assert all(0 <= percentile <= 100 for percentile in percentiles_to_calc)
-        percentiles = []
-        if not cnts_dict:
-            return percentiles, 0
-
-        num = sum(cnts_dict.values())
-        cnts = sorted(cnts_dict.items())
-        curr_cnts_pos = 0  # current position in cnts
-        curr_pos = cnts[0][1]  # sum of freqs up to current_cnts_pos
-
-        sqr_diffs = 0
-        for percentile in sorted(percentiles_to_calc):
-            if percentile < 100:
-                percentile_pos = percentile / 100.0 * num
-                while curr_pos <= percentile_pos and curr_cnts_pos < len(cnts):
-                    sqr_diffs += cnts[curr_cnts_pos][1] * math.pow(cnts[curr_cnts_pos][0] - avg, 2)
-
-                    curr_cnts_pos += 1
-                    curr_pos += cnts[curr_cnts_pos][1]
-
-                percentiles.append((percentile, cnts[curr_cnts_pos][0]))
-            else:
-                percentiles.append((percentile, cnts[-1][0]))  # we could add a small value
-
-        while curr_cnts_pos < len(cnts):
-            sqr_diffs += cnts[curr_cnts_pos][1] * math.pow(cnts[curr_cnts_pos][0] - avg, 2)
-            curr_cnts_pos += 1
-
-        stdev = math.sqrt(sqr_diffs / len(cnts))
-        return percentiles, stdev
-
 
 class DataPoint(BetterDict):
     """
@@ -342,6 +826,7 @@ class DataPoint(BetterDict):
         """
         super(DataPoint, self).__init__()
         self.perc_levels = perc_levels
+        self.corrections = BetterDict()  # KPISets of late samples, to be counted in cumulative only
         self[self.SOURCE_ID] = None
         self[self.TIMESTAMP] = ts
         self[self.CUMULATIVE] = BetterDict()
@@ -352,9 +837,20 @@ class DataPoint(BetterDict):
         new = DataPoint(self[self.TIMESTAMP], self.perc_levels)
         for key in self.keys():
             new[key] = copy.deepcopy(self[key], memo)
+        new.corrections = copy.deepcopy(self.corrections, memo)
         return new
 
-    def __merge_kpis(self, src, dst, sid):
+    def add_corrections(self, kpisets, sid=None):
+        """
+        Add KPISets of samples that belong to already processed
+        seconds, they're merged into cumulative KPISets only
+
+        :type kpisets: dict
+        :type sid: int
+        """
+        self.__merge_kpis(kpisets, self.corrections, sid, with_concurrency=False)
+
+    def __merge_kpis(self, src, dst, sid, with_concurrency=True):
         """
         :param src: KPISet
         :param dst: KPISet
@@ -362,11 +858,12 @@ class DataPoint(BetterDict):
         :return:
         """
         for label, val in iteritems(src):
-            dest = dst.get(label, KPISet(self.perc_levels))
             if not isinstance(val, KPISet):
                 val = KPISet.from_dict(val)
                 val.perc_levels = self.perc_levels
-            dest.merge_kpis(val, sid)
+            dest = dst.get(label, KPISet(self.perc_levels, val.rtimes_digits, val.max_error_variety,
+                                         val.generalize_errors))
+            dest.merge_kpis(val, sid, with_concurrency)
 
     def recalculate(self):
         """
@@ -378,21 +875,110 @@ class DataPoint(BetterDict):
         for val in self[self.CUMULATIVE].values():
             val.recalculate()
 
-    def merge_point(self, src):
+    def merge_point(self, src, keep_subresult=True, with_cumulative=True):
         """
+        Merge other point into self, calculated KPIs are updated
+        on first access to them or by recalculate()
 
         :type src: DataPoint
+        :param keep_subresult: store src in SUBRESULTS list, keeping it alive
+        :param with_cumulative: merge cumulative KPISets too
         """
         if self[self.TIMESTAMP] != src[self.TIMESTAMP]:
             msg = "Cannot merge different timestamps (%s and %s)"
             raise TaurusInternalException(msg % (self[self.TIMESTAMP], src[self.TIMESTAMP]))
 
-        self[DataPoint.SUBRESULTS].append(src)
+        if keep_subresult:
+            self[DataPoint.SUBRESULTS].append(src)
 
         self.__merge_kpis(src[self.CURRENT], self[self.CURRENT], src[DataPoint.SOURCE_ID])
-        self.__merge_kpis(src[self.CUMULATIVE], self[self.CUMULATIVE], src[DataPoint.SOURCE_ID])
+        if src.corrections:
+            self.add_corrections(src.corrections, src[DataPoint.SOURCE_ID])
+        if with_cumulative:
+            self.__merge_kpis(src[self.CUMULATIVE], self[self.CUMULATIVE], src[DataPoint.SOURCE_ID])
+
+
+class LabelRegistry(object):
+    """
+    Registry of sample labels, shared by results readers of one aggregator:
+    interns labels into integer ids, caches generalized forms of raw labels
+    and limits the number of distinct labels
+
+    :param generalize: replace digit, hex and UUID sequences in labels
+    :param max_labels: labels count limit, 0 means no limit
+    :param overflow_label: label for samples with labels over the limit
+    :param cache_size: number of raw labels to remember
+    """
+    generalize_regexps = [
+        (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "U"),
+        (re.compile(r"\b[0-9a-fA-F]{2,}\b"), "U"),
+        # (re.compile(r"\b[0-9a-fA-F]{32}\b"), "U"), # implied by previous, maybe prev is too wide
+        (re.compile(r"\b\d{2,}\b"), "N")
+    ]
+
+    def __init__(self, generalize=False, max_labels=0, overflow_label="OTHER", cache_size=10000):
+        super(LabelRegistry, self).__init__()
+        self.log = logging.getLogger(self.__class__.__name__)
+        self.generalize = generalize
+        self.max_labels = max_labels
+        self.overflow_label = overflow_label
+        self.cache_size = cache_size
+        self.labels = []  # label by id
+        self.__ids = {}
+        self.__cache = OrderedDict()  # raw label -> label id, least recently used first
+
+    def get_id(self, label):
+        """
+        Get id of label as is, registering it if it's new
+
+        :type label: str
+        :rtype: int
+        """
+        label_id = self.__ids.get(label)
+        if label_id is None:
+            label_id = len(self.labels)
+            self.labels.append(label)
+            self.__ids[label] = label_id
+        return label_id
+
+    def get_label(self, label_id):
+        """
+        :type label_id: int
+        :rtype: str
+        """
+        return self.labels[label_id]
+
+    def resolve(self, raw_label):
+        """
+        Get id of label to put sample with raw label into
+
+        :type raw_label: str
+        :rtype: int
+        """
+        label_id = self.__cache.pop(raw_label, None)
+        if label_id is None:
+            label_id = self.__resolve(raw_label)
+            if len(self.__cache) >= self.cache_size:
+                self.__cache.popitem(last=False)
+
+        self.__cache[raw_label] = label_id
+        return label_id
+
+    def __resolve(self, label):
+        if label == '':
+            label = '[empty]'
 
-        self.recalculate()
+        if self.generalize:
+            for regexp, replacement in self.generalize_regexps:
+                label = regexp.sub(replacement, label)
+
+        if self.max_labels and label not in self.__ids and len(self.labels) >= self.max_labels:
+            if self.overflow_label not in self.__ids:
+                self.log.warning("Labels count reached the limit of %s, samples of new labels will go into '%s'",
+                                 self.max_labels, self.overflow_label)
+            label = self.overflow_label
+
+        return self.get_id(label)
 
 
 class ResultsProvider(object):
@@ -403,6 +989,7 @@ class ResultsProvider(object):
     def __init__(self):
         super(ResultsProvider, self).__init__()
         self.cumulative = BetterDict()
+        self._cumulative_snapshot = BetterDict()
         self.track_percentiles = []
         self.listeners = []
         self.buffer_len = 2
@@ -410,7 +997,13 @@ class ResultsProvider(object):
         self.max_buffer_len = float('inf')
         self.buffer_multiplier = 2
         self.buffer_scale_idx = None
-        self.rtimes_len = None
+        self.rtimes_digits = 3
+        self.max_error_variety = 0
+        self.generalize_errors = False
+        self.late_samples = 0  # count of samples that came after their second was processed
+        self.late_lag = 0  # max delay of late samples, seconds
+        self.with_cumulative = True  # False when consumer builds cumulative KPISets on its own
+        self._last_datapoint = None
 
     def add_listener(self, listener):
         """
@@ -420,29 +1013,89 @@ class ResultsProvider(object):
         """
         self.listeners.append(listener)
 
-    def __merge_to_cumulative(self, current):
+    def get_results_files(self):
+        """
+        Files that provider reads results from, engine wakes up when they're written
+
+        :rtype: list[str]
+        """
+        return []
+
+    def _new_kpiset(self):
+        """
+        Empty KPISet with provider's settings
+
+        :rtype: KPISet
+        """
+        return KPISet(self.track_percentiles, self.rtimes_digits, self.max_error_variety, self.generalize_errors)
+
+    def __merge_to_cumulative(self, current, with_concurrency=True):
         """
         Merge current KPISet to cumulative
         :param current: KPISet
         """
         for label, data in iteritems(current):
-            cumul = self.cumulative.get(label, KPISet(self.track_percentiles, self.rtimes_len))
-            cumul.merge_kpis(data)
-            cumul.compact_times()
+            cumul = self.cumulative.get(label, self._new_kpiset())
+            cumul.merge_kpis(data, with_concurrency=with_concurrency)
             cumul.recalculate()
 
+    def __snapshot_cumulative(self, touched_labels):
+        """
+        Copy-on-write snapshot of cumulative KPISets: only labels touched
+        since previous snapshot are copied, the rest are shared with it
+
+        :type touched_labels: collections.Iterable
+        :rtype: BetterDict
+        """
+        snapshot = BetterDict()
+        for label, kpiset in iteritems(self.cumulative):
+            if label in touched_labels or label not in self._cumulative_snapshot:
+                snapshot[label] = copy.deepcopy(kpiset)
+            else:
+                snapshot[label] = self._cumulative_snapshot[label]
+
+        self._cumulative_snapshot = snapshot
+        return snapshot
+
+    def _correct_last_datapoint(self, corrections):
+        """
+        Count late samples in cumulative KPISets of the last datapoint,
+        when there's no next datapoint to carry them as corrections.
+        Listeners keeping that datapoint see the updated values.
+
+        :type corrections: dict
+        """
+        datapoint = self._last_datapoint
+        if datapoint is None:
+            return
+
+        datapoint.add_corrections(corrections, datapoint[DataPoint.SOURCE_ID])
+        self.__merge_to_cumulative(corrections, with_concurrency=False)
+        for label in corrections:  # shared KPISets are replaced, not changed
+            datapoint[DataPoint.CUMULATIVE][label] = copy.deepcopy(self.cumulative[label])
+
     def datapoints(self, final_pass=False):
         """
         Generator object that returns datapoints from the reader
 
+        Cumulative KPISets of returned datapoints are shared with
+        previous datapoints when label had no samples, so treat them as read-only
+
         :type final_pass: bool
         """
         for datapoint in self._calculate_datapoints(final_pass):
             current = datapoint[DataPoint.CURRENT]
-            self.__merge_to_cumulative(current)
-            datapoint[DataPoint.CUMULATIVE] = copy.deepcopy(self.cumulative)
-            datapoint.recalculate()
-
+            if self.with_cumulative:
+                self.__merge_to_cumulative(current)  # recalculates both current and touched cumulative KPISets
+                touched_labels = set(current)
+                if datapoint.corrections:
+                    self.__merge_to_cumulative(datapoint.corrections, with_concurrency=False)
+                    touched_labels.update(datapoint.corrections)
+                datapoint[DataPoint.CUMULATIVE] = self.__snapshot_cumulative(touched_labels)
+            elif '' in current:  # only overall KPISet is kept, readers scale their buffers by it
+                self.__merge_to_cumulative({'': current['']})
+
+            self._last_datapoint = datapoint
             for listener in self.listeners:
                 listener.aggregated_second(datapoint)
             yield datapoint
@@ -460,19 +1113,14 @@ class ResultsReader(ResultsProvider):
     Aggregator that reads samples one by one,
     supposed to be attached to every executor
     """
-    label_generalize_regexps = [
-        (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "U"),
-        (re.compile(r"\b[0-9a-fA-F]{2,}\b"), "U"),
-        # (re.compile(r"\b[0-9a-fA-F]{32}\b"), "U"), # implied by previous, maybe prev is too wide
-        (re.compile(r"\b\d{2,}\b"), "N")
-    ]
 
     def __init__(self, perc_levels=()):
         super(ResultsReader, self).__init__()
-        self.generalize_labels = False
+        self.label_registry = LabelRegistry()
         self.ignored_labels = []
         self.log = logging.getLogger(self.__class__.__name__)
         self.buffer = {}
+        self.late_kpisets = {}  # samples for already processed seconds, by label ids
         self.min_timestamp = 0
         self.track_percentiles = perc_levels
 
@@ -486,47 +1134,119 @@ class ResultsReader(ResultsProvider):
             if result is None:
                 self.log.debug("No data from reader")
                 break
+            elif isinstance(result, SamplesBatch):
+                self.__process_batch(result)
+            elif isinstance(result, tuple) and len(result) == 3:
+                self.__process_kpiset(*result)
             elif isinstance(result, list) or isinstance(result, tuple):
                 t_stamp, label, conc, r_time, con_time, latency, r_code, error, trname, byte_count = result
 
                 if label in self.ignored_labels:
                     continue
                 if t_stamp < self.min_timestamp:
-                    self.log.debug("Putting sample %s into %s", t_stamp, self.min_timestamp)
-                    t_stamp = self.min_timestamp
-
-                if t_stamp not in self.buffer:
-                    self.buffer[t_stamp] = []
-                self.buffer[t_stamp].append((label, conc, r_time, con_time, latency, r_code, error, trname, byte_count))
+                    kpiset = self.__get_late_kpiset(t_stamp, label, 1)
+                else:
+                    kpiset = self.__get_buffered_kpiset(t_stamp, label)
+                kpiset.add_sample((conc, r_time, con_time, latency, r_code, error, trname, byte_count))
             else:
                 raise TaurusInternalException("Unsupported results from %s reader: %s" % (self, result))
 
-    def __aggregate_current(self, datapoint, samples):
+    def __process_batch(self, batch):
         """
-        :param datapoint: DataPoint
-        :param samples: list of samples
-        :return:
+        Group batch samples by (timestamp, label) and add each group at once
+
+        :type batch: SamplesBatch
         """
-        current = datapoint[DataPoint.CURRENT]
-        for sample in samples:
-            label, r_time, concur, con_time, latency, r_code, error, trname, byte_count = sample
-            if label == '':
-                label = '[empty]'
+        keys = list(zip(batch.timestamps, batch.labels))
+        indexes = sorted(range(len(keys)), key=keys.__getitem__)
+        groups = [list(group) for _, group in itertools.groupby(indexes, key=keys.__getitem__)]
+        groups.sort(key=operator.itemgetter(0))  # keep labels order the same as for one-by-one samples
+        for group in groups:
+            t_stamp, label = keys[group[0]]
+            if label in self.ignored_labels:
+                continue
+            if t_stamp < self.min_timestamp:
+                kpiset = self.__get_late_kpiset(t_stamp, label, len(group))
+            else:
+                kpiset = self.__get_buffered_kpiset(t_stamp, label)
+            kpiset.add_samples(batch, group)
 
-            if self.generalize_labels:
-                label = self.__generalize_label(label)
+    def __process_kpiset(self, t_stamp, label, src):
+        """
+        Merge KPISet of samples aggregated by tool
 
-            if label in current:
-                label = current[label]
-            else:
-                label = current.get(label, KPISet(self.track_percentiles))
+        :type t_stamp: int
+        :type label: str
+        :type src: KPISet
+        """
+        if label in self.ignored_labels:
+            return
+        if t_stamp < self.min_timestamp:
+            kpiset = self.__get_late_kpiset(t_stamp, label, src[KPISet.SAMPLE_COUNT])
+        else:
+            kpiset = self.__get_buffered_kpiset(t_stamp, label)
+        kpiset.merge_kpis(src)
+
+    def __get_buffered_kpiset(self, t_stamp, label):
+        """
+        :type t_stamp: int
+        :type label: str
+        :rtype: KPISet
+        """
+        label_id = self.label_registry.resolve(label)
+
+        if t_stamp not in self.buffer:
+            self.buffer[t_stamp] = {}
+        labels = self.buffer[t_stamp]
+
+        if label_id not in labels:
+            labels[label_id] = self._new_kpiset()
+        return labels[label_id]
+
+    def __get_late_kpiset(self, t_stamp, label, count):
+        """
+        :type t_stamp: int
+        :type label: str
+        :param count: number of late samples
+        :rtype: KPISet
+        """
+        self.log.debug("Got %s samples for already processed second %s", count, t_stamp)
+        self.late_samples += count
+        self.late_lag = max(self.late_lag, self.min_timestamp - t_stamp)
 
-            # empty means overall
-            label.add_sample((r_time, concur, con_time, latency, r_code, error, trname, byte_count))
-        overall = KPISet(self.track_percentiles)
+        label_id = self.label_registry.resolve(label)
+        if label_id not in self.late_kpisets:
+            self.late_kpisets[label_id] = self._new_kpiset()
+        return self.late_kpisets[label_id]
+
+    def __pop_corrections(self):
+        """
+        Late samples as corrections for cumulative KPISets
+
+        :rtype: BetterDict
+        """
+        corrections = BetterDict()
+        overall = self._new_kpiset()
+        for label_id, kpiset in iteritems(self.late_kpisets):
+            corrections[self.label_registry.get_label(label_id)] = kpiset
+            overall.merge_kpis(kpiset, with_concurrency=False)
+        corrections[''] = overall
+        self.late_kpisets = {}
+        return corrections
+
+    def __aggregate_current(self, datapoint, kpisets):
+        """
+        :param datapoint: DataPoint
+        :param kpisets: dict of KPISets by label ids
+        :return:
+        """
+        current = datapoint[DataPoint.CURRENT]
+        for label_id, kpiset in iteritems(kpisets):
+            current[self.label_registry.get_label(label_id)] = kpiset
+        overall = self._new_kpiset()
         for label in current.values():
             overall.merge_kpis(label, datapoint[DataPoint.SOURCE_ID])
-        current[''] = overall
+        current[''] = overall  # empty means overall
         return current
 
     def _calculate_datapoints(self, final_pass=False):
@@ -538,6 +1258,16 @@ class ResultsReader(ResultsProvider):
         """
         self.__process_readers(final_pass)
 
+        if final_pass and self.late_kpisets and not self.buffer:
+            # no more datapoints to carry corrections, count late samples in the last one
+            corrections = self.__pop_corrections()
+            if self.with_cumulative:
+                self._correct_last_datapoint(corrections)
+            else:  # consumer counts them as corrections for already reported second
+                datapoint = self.__get_new_datapoint(self.min_timestamp - 1)
+                datapoint.corrections = corrections
+                yield datapoint
+
         self.log.debug("Buffer len: %s", len(self.buffer))
         if not self.buffer:
             return
@@ -557,9 +1287,11 @@ class ResultsReader(ResultsProvider):
             timestamp = timestamps.pop(0)
             self.min_timestamp = timestamp + 1
             self.log.debug("Aggregating: %s", timestamp)
-            samples = self.buffer.pop(timestamp)
+            kpisets = self.buffer.pop(timestamp)
             datapoint = self.__get_new_datapoint(timestamp)
-            self.__aggregate_current(datapoint, samples)
+            self.__aggregate_current(datapoint, kpisets)
+            if self.late_kpisets:
+                datapoint.corrections = self.__pop_corrections()
             yield datapoint
 
             if not timestamps:
@@ -579,16 +1311,135 @@ class ResultsReader(ResultsProvider):
 
         :param final_pass: True if called from post-process stage, when reader
             should report possible rests of results
-        :rtype: list
-        :return: timestamp, label, concurrency, rt, latency, rc, error
+        :rtype: list|SamplesBatch
+        :return: timestamp, label, concurrency, rt, cn, latency, rc, error, trname, byte_count
+            or SamplesBatch with many samples
+            or timestamp, label, KPISet for tools that aggregate samples on their own
         """
         yield
 
-    def __generalize_label(self, label):
-        for regexp, replacement in self.label_generalize_regexps:
-            label = regexp.sub(replacement, label)
 
-        return label
+def read_in_process(reader, conn, interval):
+    """
+    Worker process body: reads datapoints from results reader and sends
+    their current KPISets into connection until final pass is requested
+
+    :type reader: ResultsReader
+    :type conn: multiprocessing.connection.Connection
+    :type interval: float
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # parent decides when to stop
+    reader.with_cumulative = False  # parent builds cumulative KPISets from received current ones
+    try:
+        final_pass = False
+        sent_records = None
+        while not final_pass:
+            final_pass = conn.poll(interval) and conn.recv() == ReaderProcess.FINAL_PASS
+            for point in reader.datapoints(final_pass):
+                sent_records = getattr(reader, "read_records", None)
+                conn.send((point[DataPoint.TIMESTAMP], point[DataPoint.SOURCE_ID], dict(point[DataPoint.CURRENT]),
+                           dict(point.corrections), sent_records, reader.late_samples, reader.late_lag))
+
+            read_records = getattr(reader, "read_records", None)
+            if read_records != sent_records:  # records are still buffered, but parent has to know they're there
+                sent_records = read_records
+                conn.send((None, None, {}, {}, read_records, reader.late_samples, reader.late_lag))
+        conn.send(ReaderProcess.FINISHED)
+    except BaseException:
+        conn.send(traceback.format_exc())
+    finally:
+        conn.close()
+
+
+class ReaderProcess(ResultsProvider):
+    """
+    Runs results reader in separate process, which tails results file
+    and aggregates samples into per-second datapoints on its own.
+    Process is forked by `start()`, which has to be called before engine
+    starts any threads. Until then reader works in current process.
+    Datapoints come without cumulative KPISets, as they are built
+    by consumer from current ones.
+
+    :type reader: ResultsReader
+    """
+    FINAL_PASS = "final-pass"
+    FINISHED = None
+
+    def __init__(self, reader, interval=1):
+        super(ReaderProcess, self).__init__()
+        self.reader = reader
+        self.track_percentiles = reader.track_percentiles
+        self.interval = interval
+        self.log = reader.log.getChild(self.__class__.__name__)
+        self.process = None
+        self.conn = None
+        self.finished = False
+
+    @staticmethod
+    def is_supported():
+        return hasattr(os, "fork")  # reader state is passed into process by forking
+
+    def get_results_files(self):
+        return self.reader.get_results_files()
+
+    def start(self):
+        if hasattr(multiprocessing, "get_context"):
+            context = multiprocessing.get_context("fork")
+        else:
+            context = multiprocessing
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=read_in_process, args=(self.reader, child_conn, self.interval))
+        self.process.daemon = True
+        self.process.start()
+        child_conn.close()
+        self.log.debug("Started reader process %s for %s", self.process.pid, self.reader)
+
+    def datapoints(self, final_pass=False):
+        if self.process is None:
+            for point in self.reader.datapoints(final_pass):
+                yield point
+            return
+
+        for point in self._calculate_datapoints(final_pass):
+            yield point
+
+    def _calculate_datapoints(self, final_pass=False):
+        if self.finished:
+            return
+
+        if final_pass:
+            self.conn.send(self.FINAL_PASS)
+
+        while final_pass or self.conn.poll():
+            if not self.conn.poll(self.interval):
+                if not self.process.is_alive():
+                    raise TaurusInternalException("Reader process for %s has died" % self.reader)
+                continue
+
+            message = self.conn.recv()
+            if message is self.FINISHED:
+                self.finished = True
+                self.process.join()
+                break
+            elif not isinstance(message, tuple):
+                self.finished = True
+                raise TaurusInternalException("Reader process for %s failed: %s" % (self.reader, message))
+
+            t_stamp, source_id, kpisets, corrections, read_records, self.late_samples, self.late_lag = message
+            if read_records is not None:
+                self.reader.read_records = read_records
+            self.reader.late_samples = self.late_samples
+            self.reader.late_lag = self.late_lag
+            if t_stamp is None:  # progress report without datapoint
+                continue
+
+            point = DataPoint(t_stamp, self.track_percentiles)
+            point[DataPoint.SOURCE_ID] = source_id
+            for label, kpiset in iteritems(kpisets):
+                point[DataPoint.CURRENT][label] = kpiset
+            for label, kpiset in iteritems(corrections):
+                point.corrections[label] = kpiset
+            yield point
 
 
 class ConsolidatingAggregator(Aggregator, ResultsProvider):
@@ -601,11 +1452,18 @@ class ConsolidatingAggregator(Aggregator, ResultsProvider):
     def __init__(self):
         Aggregator.__init__(self, is_functional=False)
         ResultsProvider.__init__(self)
-        self.generalize_labels = False
+        self.label_registry = LabelRegistry()
         self.ignored_labels = []
         self.underlings = []
         self.buffer = BetterDict()
-        self.rtimes_len = 1000
+        self.timestamps = []  # heap of buffer keys
+        self.min_timestamp = 0
+        self.watermarks = {}  # latest timestamp of each underling
+        self.late_points = []  # underlings' datapoints for already processed seconds
+        self.keep_subresults = False
+        self.reader_processes = False
+        self.__own_late_samples = 0
+        self.__own_late_lag = 0
 
     def prepare(self):
         """
@@ -621,7 +1479,9 @@ class ConsolidatingAggregator(Aggregator, ResultsProvider):
         self.settings['percentiles'] = percentiles
 
         self.ignored_labels = self.settings.get("ignore-labels", self.ignored_labels)
-        self.generalize_labels = self.settings.get("generalize-labels", self.generalize_labels)
+        self.label_registry.generalize = self.settings.get("generalize-labels", self.label_registry.generalize)
+        self.label_registry.max_labels = self.settings.get("max-labels", self.label_registry.max_labels)
+        self.label_registry.overflow_label = self.settings.get("overflow-label", self.label_registry.overflow_label)
 
         self.min_buffer_len = dehumanize_time(self.settings.get("min-buffer-len", self.min_buffer_len))
 
@@ -649,7 +1509,16 @@ class ConsolidatingAggregator(Aggregator, ResultsProvider):
 
         debug_str = 'Buffer scaling setup: percentile %s from %s selected'
         self.log.debug(debug_str, self.buffer_scale_idx, self.track_percentiles)
-        self.rtimes_len = self.settings.get("rtimes-len", self.rtimes_len)
+        if "rtimes-len" in self.settings:
+            self.log.warning("Option 'rtimes-len' is deprecated, use 'rtimes-digits' to set histogram precision")
+        self.rtimes_digits = self.settings.get("rtimes-digits", self.rtimes_digits)
+        self.max_error_variety = self.settings.get("max-error-variety", self.max_error_variety)
+        self.generalize_errors = self.settings.get("generalize-errors", self.generalize_errors)
+        self.keep_subresults = self.settings.get("keep-subresults", self.keep_subresults)
+        self.reader_processes = self.settings.get("reader-processes", self.reader_processes)
+        if self.reader_processes and not ReaderProcess.is_supported():
+            self.log.warning("Reading results in separate processes isn't supported on this platform")
+            self.reader_processes = False
 
     def add_underling(self, underling):
         """
@@ -660,21 +1529,30 @@ class ConsolidatingAggregator(Aggregator, ResultsProvider):
         underling.track_percentiles = self.track_percentiles
         if isinstance(underling, ResultsReader):
             underling.ignored_labels = self.ignored_labels
-            underling.generalize_labels = self.generalize_labels
+            underling.label_registry = self.label_registry
             underling.min_buffer_len = self.min_buffer_len
             underling.max_buffer_len = self.max_buffer_len
             underling.buffer_multiplier = self.buffer_multiplier
             underling.buffer_scale_idx = self.buffer_scale_idx
-            underling.rtimes_len = self.rtimes_len
+            underling.rtimes_digits = self.rtimes_digits
+            underling.max_error_variety = self.max_error_variety
+            underling.generalize_errors = self.generalize_errors
 
         self.underlings.append(underling)
 
+    def get_results_files(self):
+        filenames = []
+        for underling in self.underlings:
+            filenames.extend(underling.get_results_files())
+        return filenames
+
     def check(self):
         """
         Check if there is next aggregate data present
 
         :rtype: bool
         """
+        self.engine.watch_results_files(self.get_results_files())  # some files appear during the test
         for point in self.datapoints():
             self.log.debug("Processed datapoint: %s/%s", point[DataPoint.TIMESTAMP], point[DataPoint.SOURCE_ID])
         return super(ConsolidatingAggregator, self).check()
@@ -687,17 +1565,71 @@ class ConsolidatingAggregator(Aggregator, ResultsProvider):
         for point in self.datapoints(True):
             self.log.debug("Processed datapoint: %s/%s", point[DataPoint.TIMESTAMP], point[DataPoint.SOURCE_ID])
 
+        if self.late_samples:
+            self.log.info("%s samples came up to %ss late, they're counted in cumulative results only",
+                          self.late_samples, self.late_lag)
+
+    def startup(self):
+        """
+        Fork reader processes, executors have registered their readers at prepare stage.
+        Engine starts aggregator before other modules and postpones its update check thread
+        when reader processes are enabled, so no threads run at fork time
+        """
+        super(ConsolidatingAggregator, self).startup()
+        if self.reader_processes:
+            self.__move_readers_to_processes()
+
+    def __move_readers_to_processes(self):
+        interval = self.engine.check_interval if self.engine else 1
+        for idx, underling in enumerate(self.underlings):
+            if isinstance(underling, ResultsReader):
+                self.underlings[idx] = ReaderProcess(underling, interval)
+                self.underlings[idx].start()
+
     def _process_underlings(self, final_pass):
         for underling in self.underlings:
             for data in underling.datapoints(final_pass):
                 tstamp = data[DataPoint.TIMESTAMP]
-                if self.buffer:
-                    mints = min(self.buffer.keys())
-                    if tstamp < mints:
-                        self.log.debug("Putting datapoint %s into %s", tstamp, mints)
-                        data[DataPoint.TIMESTAMP] = mints
-                        tstamp = mints
-                self.buffer.get(tstamp, []).append(data)
+                self.watermarks[id(underling)] = max(tstamp, self.watermarks.get(id(underling), tstamp))
+                if tstamp < self.min_timestamp:
+                    self.log.debug("Datapoint %s came after its second was processed", tstamp)
+                    self.__own_late_lag = max(self.__own_late_lag, self.min_timestamp - tstamp)
+                    self.late_points.append(data)
+                else:
+                    self.__add_to_buffer(data)
+
+        self.late_samples = self.__own_late_samples
+        self.late_lag = self.__own_late_lag
+        for underling in self.underlings:
+            self.late_samples += underling.late_samples
+            self.late_lag = max(self.late_lag, underling.late_lag)
+
+    def __add_to_buffer(self, data):
+        tstamp = data[DataPoint.TIMESTAMP]
+        if tstamp not in self.buffer:
+            heapq.heappush(self.timestamps, tstamp)
+            self.buffer[tstamp] = []
+        self.buffer[tstamp].append(data)
+
+    def __get_watermark(self):
+        """
+        Latest timestamp that all underlings have passed
+
+        :rtype: int|None
+        """
+        if len(self.watermarks) < len(self.underlings):
+            return None
+        return min(self.watermarks[id(underling)] for underling in self.underlings)
+
+    def __add_corrections(self, point):
+        for data in self.late_points:
+            if '' in data[DataPoint.CURRENT]:
+                late_count = data[DataPoint.CURRENT][''][KPISet.SAMPLE_COUNT]
+                self.__own_late_samples += late_count
+                self.late_samples += late_count
+            point.add_corrections(data[DataPoint.CURRENT], data[DataPoint.SOURCE_ID])
+            point.add_corrections(data.corrections, data[DataPoint.SOURCE_ID])
+        self.late_points = []
 
     def _calculate_datapoints(self, final_pass=False):
         """
@@ -706,20 +1638,35 @@ class ConsolidatingAggregator(Aggregator, ResultsProvider):
         """
         self._process_underlings(final_pass)
 
+        if final_pass and self.late_points and not self.buffer:
+            # no more datapoints to carry corrections, count late ones in the last one
+            point = DataPoint(self.min_timestamp - 1, self.track_percentiles)
+            self.__add_corrections(point)
+            self._correct_last_datapoint(point.corrections)
+
         self.log.debug("Consolidator buffer[%s]: %s", len(self.buffer), self.buffer.keys())
         if not self.buffer:
             return
 
-        timestamps = sorted(self.buffer.keys())
-        while timestamps and (final_pass or (timestamps[-1] >= timestamps[0] + self.buffer_len)):
-            tstamp = timestamps.pop(0)
+        max_ts = max(self.timestamps)
+        watermark = self.__get_watermark()
+        while self.timestamps:
+            tstamp = self.timestamps[0]
+            passed = watermark is not None and watermark >= tstamp
+            if not (final_pass or passed or max_ts >= tstamp + self.buffer_len):
+                break
+
+            heapq.heappop(self.timestamps)
             self.log.debug("Merging into %s", tstamp)
             points_to_consolidate = self.buffer.pop(tstamp)
             point = DataPoint(tstamp, self.track_percentiles)
             for subresult in points_to_consolidate:
                 self.log.debug("Merging %s", subresult[DataPoint.TIMESTAMP])
-                point.merge_point(subresult)
+                # cumulative is calculated by ResultsProvider from merged current
+                point.merge_point(subresult, self.keep_subresults, with_cumulative=False)
+            self.__add_corrections(point)
             point.recalculate()
+            self.min_timestamp = tstamp + 1
             yield point
 
 
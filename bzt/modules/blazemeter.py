@@ -16,20 +16,24 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 import copy
+import json
 import logging
 import platform
+import random
 import sys
+import threading
 import time
 import traceback
 import zipfile
 from abc import abstractmethod
-from collections import defaultdict, OrderedDict
+from collections import defaultdict, OrderedDict, deque
 from functools import wraps
 from ssl import SSLError
 
 import os
 import yaml
 from bzt import TaurusInternalException, TaurusConfigError, TaurusException, TaurusNetworkError, NormalShutdown
+from bzt import ManualShutdown
 from requests.exceptions import ReadTimeout
 from urwid import Pile, Text
 
@@ -43,7 +47,7 @@ from bzt.modules.services import Unpacker
 from bzt.six import BytesIO, iteritems, HTTPError, r_input, URLError, b
 from bzt.utils import open_browser, get_full_path, get_files_recursive, replace_in_config, humanize_bytes, \
     ExceptionalDownloader, ProgressBarContext
-from bzt.utils import to_json, dehumanize_time, BetterDict, ensure_is_dict
+from bzt.utils import to_json, dehumanize_time, BetterDict, ensure_is_dict, ComplexEncoder
 
 TAURUS_TEST_TYPE = "taurus"
 CLOUD_CONFIG_FILTER_RULES = {
@@ -132,8 +136,13 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
         self._last_status_check = time.time()
         self.send_monitoring = True
         self.monitoring_buffer = None
+        self.monitoring_lock = threading.Lock()  # buffer is filled by engine loop while check may run in background
         self.send_custom_metrics = False
         self.send_custom_tables = False
+        self.background_send = False
+        self.send_queue_limit = 100
+        self.sender = None
+        self.serializer = DatapointSerializer(self)
         self.public_report = False
         self.last_dispatch = 0
         self.results_url = None
@@ -151,9 +160,13 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
         """
         super(BlazeMeterUploader, self).prepare()
         self.send_interval = dehumanize_time(self.settings.get("send-interval", self.send_interval))
+        self.check_period = self.send_interval
+        self.check_in_background = self.settings.get("check-in-background", self.check_in_background)
         self.send_monitoring = self.settings.get("send-monitoring", self.send_monitoring)
         self.send_custom_metrics = self.settings.get("send-custom-metrics", self.send_custom_metrics)
         self.send_custom_tables = self.settings.get("send-custom-tables", self.send_custom_tables)
+        self.background_send = self.settings.get("background-send", self.background_send)
+        self.send_queue_limit = int(self.settings.get("send-queue-limit", self.send_queue_limit))
         monitoring_buffer_limit = self.settings.get("monitoring-buffer-limit", 500)
         self.monitoring_buffer = MonitoringBuffer(monitoring_buffer_limit, self.log)
         self.browser_open = self.settings.get("browser-open", self.browser_open)
@@ -168,6 +181,7 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
         self._user.address = self.settings.get("address", self._user.address)
         self._user.data_address = self.settings.get("data-address", self._user.data_address)
         self._user.timeout = dehumanize_time(self.settings.get("timeout", self._user.timeout))
+        self._user.gzip_requests = self.settings.get("gzip-requests", self._user.gzip_requests)
 
         # direct data feeding case
         sess_id = self.parameters.get("session-id", None)
@@ -223,6 +237,12 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
                 report_link = self._master.make_report_public()
                 self.log.info("Public report link: %s", report_link)
 
+        if self.background_send:
+            spill_file = self.engine.create_artifact("bza-kpi-spill", ".ldjson")
+            session = self._session.with_own_connections()  # engine thread keeps using its own ones
+            self.sender = KPISender(self, session, self.send_queue_limit, spill_file, self.log)
+            self.sender.start()
+
     def _start_online(self):
         """
         Start online test
@@ -318,9 +338,16 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
             return
 
         self.log.debug("KPI bulk buffer len in post-proc: %s", len(self.kpi_buffer))
+        reports = []
+        if self.sender:
+            self.sender.stop()
+            reports = self.sender.get_remaining()
+            self.log.info("KPI sender made %s requests, average latency %.3fs, max queue depth %s",
+                          self.sender.sent, self.sender.get_avg_latency(), self.sender.max_queue_depth)
+
         try:
             self.log.info("Sending remaining KPI data to server...")
-            self.__send_data(self.kpi_buffer, False, True)
+            self.__send_data(self.kpi_buffer, False, True, reports)
             self.kpi_buffer = []
             if self.send_monitoring:
                 self.__send_monitoring()
@@ -366,6 +393,9 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
             self.log.debug("Failed to finish online: %s", traceback.format_exc())
             self.log.warning("Failed to finish online: %s", exc)
 
+        for line in self._user.request_stats.get_report():
+            self.log.debug("BlazeMeter API %s", line)
+
     def end_online(self):
         """
         Finish online test
@@ -400,11 +430,21 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
         Send data if any in buffer
         """
         self.log.debug("KPI bulk buffer len: %s", len(self.kpi_buffer))
-        if self.last_dispatch < (time.time() - self.send_interval):
+        if self.sender:
+            if self.sender.error:
+                raise self.sender.error
+            self.log.debug("KPI sender queue depth: %s, last send latency: %.3fs",
+                           self.sender.get_queue_depth(), self.sender.latency)
+
+        # check is scheduled once per send interval, its start jitter mustn't postpone dispatch for whole interval
+        if self.last_dispatch <= time.time() - self.send_interval + self.engine.check_interval:
             self.last_dispatch = time.time()
             if len(self.kpi_buffer):
-                self.__send_data(self.kpi_buffer)
-                self.kpi_buffer = []
+                data, self.kpi_buffer = self.kpi_buffer, []
+                if self.sender:
+                    self.sender.put(self.serializer.get_kpi_report(data))
+                else:
+                    self.__send_data(data)
                 if self.send_monitoring:
                     self.__send_monitoring()
                 if self.send_custom_metrics:
@@ -412,21 +452,27 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
         return super(BlazeMeterUploader, self).check()
 
     @send_with_retry
-    def __send_data(self, data, do_check=True, is_final=False):
+    def __send_data(self, data, do_check=True, is_final=False, reports=()):
         """
         :type data: list[bzt.modules.aggregator.DataPoint]
+        :param reports: reports compacted earlier, that weren't sent yet
         """
         if not self._session:
             return
 
-        serialized = DatapointSerializer(self).get_kpi_body(data, is_final)
-        self._session.send_kpi_data(serialized, do_check)
+        report = self.serializer.get_kpi_report(data, is_final)
+        if reports:
+            report = self.serializer.merge_reports(list(reports) + [report])
+        self._session.send_kpi_data(self.serializer.get_report_body(report, is_final), do_check)
+        self.serializer.commit_report(report)
 
     def aggregated_second(self, data):
         """
         Send online data
         :param data: DataPoint
         """
+        if self.check_in_background:  # cumulative KPISets are shared with engine thread, it recalculates them lazily
+            data = copy.deepcopy(data)
         self.kpi_buffer.append(data)
 
     def set_last_status_check(self, value):
@@ -435,19 +481,22 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
 
     def monitoring_data(self, data):
         if self.send_monitoring:
-            self.monitoring_buffer.record_data(data)
+            with self.monitoring_lock:
+                self.monitoring_buffer.record_data(data)
 
     @send_with_retry
     def __send_monitoring(self):
         engine_id = self.engine.config.get('modules').get('shellexec').get('env').get('TAURUS_INDEX_ALL', '')
         if not engine_id:
             engine_id = "0"
-        data = self.monitoring_buffer.get_monitoring_json(self._session)
+        with self.monitoring_lock:
+            data = self.monitoring_buffer.get_monitoring_json(self._session)
         self._session.send_monitoring_data(engine_id, data)
 
     @send_with_retry
     def __send_custom_metrics(self):
-        data = self.get_custom_metrics_json()
+        with self.monitoring_lock:
+            data = self.get_custom_metrics_json()
         self._master.send_custom_metrics(data)
 
     @send_with_retry
@@ -532,6 +581,144 @@ class BlazeMeterUploader(Reporter, AggregatorListener, MonitoringListener):
         return "\n".join(lines)
 
 
+class KPISender(threading.Thread):
+    """
+    Sends KPI reports of BlazeMeterUploader outside of engine loop.
+
+    Reports are compacted by uploader and put into bounded queue, all pending reports are merged into single request.
+    Failed request is retried with exponential backoff and jitter. Reports that don't fit into queue are spilled
+    into file and read back once the queue is drained, so nothing is lost while server is unavailable.
+
+    :type owner: BlazeMeterUploader
+    :type session: bzt.bza.Session
+    """
+
+    def __init__(self, owner, session, queue_limit, spill_file, parent_log):
+        super(KPISender, self).__init__(name="bza-kpi-sender")
+        self.daemon = True
+        self.log = parent_log.getChild(self.__class__.__name__)
+        self.owner = owner
+        self.session = session
+        self.queue_limit = queue_limit
+        self.spill_file = spill_file
+        self.queue = deque()
+        self.spilled = 0
+        self.spill_offset = 0
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.error = None  # to be raised in engine loop, e.g. test is stopped from Web UI
+        self.backoff_start = 1.0
+        self.backoff_limit = 60.0
+        self.failures = 0
+        self.sent = 0
+        self.latency = 0.0
+        self.total_latency = 0.0
+        self.max_queue_depth = 0
+
+    def put(self, report):
+        """
+        :type report: dict
+        """
+        with self.condition:
+            if self.spilled or len(self.queue) >= self.queue_limit:  # keep order of reports
+                self.__spill(report)
+            else:
+                self.queue.append(report)
+            self.max_queue_depth = max(self.max_queue_depth, self.get_queue_depth())
+            self.condition.notify()
+
+    def get_queue_depth(self):
+        return len(self.queue) + self.spilled
+
+    def get_avg_latency(self):
+        return self.total_latency / self.sent if self.sent else 0.0
+
+    def stop(self):
+        with self.condition:
+            self.stopping = True
+            self.condition.notify()
+        self.join()
+
+    def get_remaining(self):
+        """
+        Take reports that weren't sent, to be used after sender has stopped
+
+        :rtype: list[dict]
+        """
+        with self.condition:
+            while self.spilled:
+                self.__unspill()
+            reports = list(self.queue)
+            self.queue.clear()
+        return reports
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.spilled and not self.stopping:
+                    self.condition.wait()
+                if self.stopping:
+                    return
+                if not self.queue:
+                    self.__unspill()
+                reports = list(self.queue)
+                self.queue.clear()
+
+            report = DatapointSerializer.merge_reports(reports)
+            try:
+                self.__send(report)
+            except (IOError, TaurusNetworkError) as exc:
+                self.log.debug("Error sending data: %s", traceback.format_exc())
+                with self.condition:
+                    self.queue.appendleft(report)
+                    self.failures += 1
+                    delay = self.__get_backoff()
+                    self.log.warning("Failed to send KPI data, will retry in %.1f sec: %s", delay, exc)
+                    self.condition.wait(delay)
+            except BaseException as exc:
+                if not isinstance(exc, ManualShutdown):  # data is accepted by server in that case
+                    self.log.debug("Failed to send KPI data: %s", traceback.format_exc())
+                    with self.condition:
+                        self.queue.appendleft(report)
+                self.error = exc
+                return
+            else:
+                self.failures = 0
+
+    def __send(self, report):
+        body = self.owner.serializer.get_report_body(report, False)
+        start = time.time()
+        try:
+            self.session.send_kpi_data(body)
+        finally:
+            self.latency = time.time() - start
+        self.owner.serializer.commit_report(report)
+        self.sent += 1
+        self.total_latency += self.latency
+
+    def __get_backoff(self):
+        delay = min(self.backoff_limit, self.backoff_start * 2 ** (self.failures - 1))
+        return random.uniform(delay / 2, delay)
+
+    def __spill(self, report):
+        with open(self.spill_file, 'a') as fds:
+            fds.write(json.dumps(report) + "\n")
+        self.spilled += 1
+
+    def __unspill(self):
+        with open(self.spill_file) as fds:
+            fds.seek(self.spill_offset)
+            for _ in range(min(self.spilled, self.queue_limit)):
+                self.queue.append(json.loads(fds.readline()))
+                self.spilled -= 1
+            self.spill_offset = fds.tell()
+
+        if not self.spilled:
+            self.log.debug("All spilled reports are read back from %s", self.spill_file)
+            open(self.spill_file, 'w').close()
+            self.spill_offset = 0
+
+
 class MonitoringBuffer(object):
     def __init__(self, size_limit, parent_log):
         self.size_limit = size_limit
@@ -672,8 +859,21 @@ class DatapointSerializer(object):
         """
         super(DatapointSerializer, self).__init__()
         self.owner = owner
+        self.sent_counts = {}  # label -> cumulative samples count in last report accepted by server
 
     def get_kpi_body(self, data_buffer, is_final):
+        return self.get_report_body(self.get_kpi_report(data_buffer, is_final), is_final)
+
+    def get_kpi_report(self, data_buffer, is_final=False):
+        """
+        Compact datapoints into report items of labels, that can be merged with other reports and sent later.
+        Labels that got no samples since last sent report are skipped, unless report is final.
+        Items carry cumulative samples count, see `commit_report()`.
+
+        :type data_buffer: list[bzt.modules.aggregator.DataPoint]
+        :type is_final: bool
+        :rtype: dict
+        """
         # - reporting format:
         #   {labels: <data>,    # see below
         #    sourceID: <id of BlazeMeterClient object>,
@@ -683,32 +883,66 @@ class DatapointSerializer(object):
         #
         # - elements of 'intervals' are described in __get_interval()
         #   every interval contains info about response codes have gotten on it.
-        report_items = BetterDict()
+        report_items = {}
         if data_buffer:
             self.owner.first_ts = min(self.owner.first_ts, data_buffer[0][DataPoint.TIMESTAMP])
             self.owner.last_ts = max(self.owner.last_ts, data_buffer[-1][DataPoint.TIMESTAMP])
 
+            touched = set()
+            for dpoint in data_buffer:
+                touched.update(dpoint[DataPoint.CURRENT])
+
             # following data is received in the cumulative way
             for label, kpi_set in iteritems(data_buffer[-1][DataPoint.CUMULATIVE]):
-                report_item = self.__get_label(label, kpi_set)
-                self.__add_errors(report_item, kpi_set)  # 'Errors' tab
-                report_items[label] = report_item
+                count = kpi_set[KPISet.SAMPLE_COUNT]
+                if is_final or label in touched or self.sent_counts.get(label) != count:
+                    report_item = self.__get_label(label, kpi_set)
+                    self.__add_errors(report_item, kpi_set)  # 'Errors' tab
+                    report_items[label] = report_item
 
             # fill 'Timeline Report' tab with intervals data
             # intervals are received in the additive way
             for dpoint in data_buffer:
                 time_stamp = dpoint[DataPoint.TIMESTAMP]
                 for label, kpi_set in iteritems(dpoint[DataPoint.CURRENT]):
-                    exc = TaurusInternalException('Cumulative KPISet non-consistent')
-                    report_item = report_items.get(label, exc)
-                    report_item['intervals'].append(self.__get_interval(kpi_set, time_stamp))
+                    if label not in report_items:
+                        raise TaurusInternalException('Cumulative KPISet non-consistent')
+                    report_items[label]['intervals'].append(self.__get_interval(kpi_set, time_stamp))
+
+        return report_items
 
+    def commit_report(self, report_items):
+        """
+        Remember samples counts of labels once report is accepted by server
+
+        :type report_items: dict
+        """
+        for label, item in iteritems(report_items):
+            self.sent_counts[label] = item['n']
+
+    def get_report_body(self, report_items, is_final):
         report_items = [report_items[key] for key in sorted(report_items.keys())]  # convert dict to list
         data = {"labels": report_items, "sourceID": id(self.owner)}
         if is_final:
             data['final'] = True
 
-        return to_json(data)
+        return json.dumps(data, cls=ComplexEncoder, separators=(',', ':'))  # no indent, so C encoder is used
+
+    @staticmethod
+    def merge_reports(reports):
+        """
+        Merge reports into one: label items are cumulative, so latest one is taken, intervals are joined
+
+        :type reports: list[dict]
+        :rtype: dict
+        """
+        merged = {}
+        for report in reports:
+            for label, item in iteritems(report):
+                if label in merged:
+                    item = dict(item, intervals=merged[label]['intervals'] + item['intervals'])
+                merged[label] = item
+        return merged
 
     @staticmethod
     def __add_errors(report_item, kpi_set):
@@ -783,41 +1017,50 @@ class DatapointSerializer(object):
         #   {'n': <number of code encounters>,
         #    'f': <number of failed request (e.q. important for assertions)>
         #    'rc': <string value of response code>}
+        fails = defaultdict(list)
+        for err in item[KPISet.ERRORS]:
+            fails[str(err['rc'])].append(err['cnt'])
+
         rc_list = []
         for r_code, cnt in iteritems(item[KPISet.RESP_CODES]):
-            fails = [err['cnt'] for err in item[KPISet.ERRORS] if str(err['rc']) == r_code]
-            rc_list.append({"n": cnt, 'f': fails, "rc": r_code})
-
+            rc_list.append({"n": cnt, 'f': fails.get(r_code, []), "rc": r_code})
+
+        percentiles = item[KPISet.PERCENTILES]
+        count = item[KPISet.SAMPLE_COUNT]
+        failures = item[KPISet.FAILURES]
+        avg_rt = item[KPISet.AVG_RESP_TIME]
+        avg_lt = item[KPISet.AVG_LATENCY]
+        byte_count = item[KPISet.BYTE_COUNT]
         return {
-            "ec": item[KPISet.FAILURES],
+            "ec": failures,
             "ts": time_stamp,
             "na": item[KPISet.CONCURRENCY],
-            "n": item[KPISet.SAMPLE_COUNT],
-            "failed": item[KPISet.FAILURES],
+            "n": count,
+            "failed": failures,
             "rc": rc_list,
             "t": {
-                "min": int(1000 * item[KPISet.PERCENTILES]["0.0"]) if "0.0" in item[KPISet.PERCENTILES] else 0,
-                "max": int(1000 * item[KPISet.PERCENTILES]["100.0"]) if "100.0" in item[KPISet.PERCENTILES] else 0,
-                "sum": 1000 * item[KPISet.AVG_RESP_TIME] * item[KPISet.SAMPLE_COUNT],
-                "n": item[KPISet.SAMPLE_COUNT],
+                "min": int(1000 * percentiles["0.0"]) if "0.0" in percentiles else 0,
+                "max": int(1000 * percentiles["100.0"]) if "100.0" in percentiles else 0,
+                "sum": 1000 * avg_rt * count,
+                "n": count,
                 "std": 1000 * item[KPISet.STDEV_RESP_TIME],
-                "avg": 1000 * item[KPISet.AVG_RESP_TIME]
+                "avg": 1000 * avg_rt
             },
             "lt": {
                 "min": 0,
                 "max": 0,
-                "sum": 1000 * item[KPISet.AVG_LATENCY] * item[KPISet.SAMPLE_COUNT],
-                "n": 1000 * item[KPISet.SAMPLE_COUNT],
+                "sum": 1000 * avg_lt * count,
+                "n": 1000 * count,
                 "std": 0,
-                "avg": 1000 * item[KPISet.AVG_LATENCY]
+                "avg": 1000 * avg_lt
             },
             "by": {
                 "min": 0,
                 "max": 0,
-                "sum": item[KPISet.BYTE_COUNT],
-                "n": item[KPISet.SAMPLE_COUNT],
+                "sum": byte_count,
+                "n": count,
                 "std": 0,
-                "avg": item[KPISet.BYTE_COUNT] / float(item[KPISet.SAMPLE_COUNT])
+                "avg": byte_count / float(count)
             },
         }
 
@@ -1427,6 +1670,7 @@ class CloudProvisioning(MasterProvisioning, WidgetProvider):
         self.browser_open = self.settings.get("browser-open", self.browser_open)
         self.detach = self.settings.get("detach", self.detach)
         self.check_interval = dehumanize_time(self.settings.get("check-interval", self.check_interval))
+        self.check_in_background = self.settings.get("check-in-background", self.check_in_background)
         self.public_report = self.settings.get("public-report", self.public_report)
         self._filter_reporting()
 
@@ -1486,6 +1730,7 @@ class CloudProvisioning(MasterProvisioning, WidgetProvider):
         self.user.address = self.settings.get("address", self.user.address)
         self.user.token = self.settings.get("token", self.user.token)
         self.user.timeout = dehumanize_time(self.settings.get("timeout", self.user.timeout))
+        self.user.gzip_requests = self.settings.get("gzip-requests", self.user.gzip_requests)
         if not self.user.token:
             raise TaurusConfigError("You must provide API token to use cloud provisioning")
 
@@ -1558,6 +1803,9 @@ class CloudProvisioning(MasterProvisioning, WidgetProvider):
             if self.browser_open in ('end', 'both'):
                 open_browser(self.results_url)
 
+        for line in self.user.request_stats.get_report():
+            self.log.debug("BlazeMeter API %s", line)
+
         if self.router and self.router.master:
             full = self.router.master.get_full()
             if 'note' in full and full['note']:
@@ -72,6 +72,8 @@ class ConsoleStatusReporter(Reporter, AggregatorListener):
         self.console = None
         self.executor_widgets = []
         self.screen = DummyScreen(self.screen_size[0], self.screen_size[1])
+        self.frame_budget = 0.1
+        self.check_priority = -1  # repaint is least important
 
     def _get_screen(self):
         screen_type = self._get_screen_type()
@@ -114,6 +116,7 @@ class ConsoleStatusReporter(Reporter, AggregatorListener):
         if isinstance(self.engine.aggregator, ResultsProvider):
             self.engine.aggregator.add_listener(self)
 
+        self.frame_budget = float(self.settings.get("frame-budget", self.frame_budget))
         disable = self.settings.get('disable', 'auto')
         explicit_disable = isinstance(disable, (bool, int)) and disable
         auto_disable = str(disable).lower() == 'auto' and not sys.stdout.isatty()
@@ -149,10 +152,13 @@ class ConsoleStatusReporter(Reporter, AggregatorListener):
                 self._last_datapoint = None
             return False
 
+        start = time.time()
         self.__start_screen()
         for widget in self.executor_widgets:
             widget.update()
         self.__update_screen()
+        if self.frame_budget:  # repaint won't take more than budgeted share of time
+            self.check_period = (time.time() - start) / self.frame_budget
         return False
 
     def __print_one_line_stats(self):
@@ -58,6 +58,8 @@ class FunctionalAggregator(Aggregator):
                 listener.aggregated_results(new_results, self.cumulative_results)
 
     def check(self):
+        for reader in self.underlings:
+            self.engine.watch_results_files(reader.get_results_files())
         self.process_readers()
         return False
 
@@ -100,6 +102,10 @@ class FunctionalResultsReader(object):
         "Yields functional samples"
         yield
 
+    def get_results_files(self):
+        "Files that reader reads samples from"
+        return []
+
 
 class FunctionalAggregatorListener(object):
     @abstractmethod
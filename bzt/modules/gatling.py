@@ -22,11 +22,12 @@ import time
 
 from bzt import TaurusConfigError, ToolError
 from bzt.engine import ScenarioExecutor, Scenario, FileLister, HavingInstallableTools
-from bzt.modules.aggregator import ConsolidatingAggregator, ResultsReader
+from bzt.modules.aggregator import ConsolidatingAggregator, ResultsReader, SamplesBatch
 from bzt.modules.console import WidgetProvider, ExecutorWidget
 from bzt.requests_model import HTTPRequest
 from bzt.utils import BetterDict, TclLibrary, EXE_SUFFIX, dehumanize_time, get_full_path
 from bzt.utils import unzip, shell_exec, RequiredTool, JavaVM, shutdown_process, ensure_is_dict, is_windows
+from bzt.utils import FileReader
 
 
 class GatlingScriptBuilder(object):
@@ -457,20 +458,21 @@ class DataLogReader(ResultsReader):
         self.concurrency = 0
         self.log = parent_logger.getChild(self.__class__.__name__)
         self.basedir = basedir
-        self.filename = None
-        self.fds = None
-        self.partial_buffer = ""
+        self.file = None
         self.delimiter = "\t"
-        self.offset = 0
         self.dir_prefix = dir_prefix
         self.guessed_gatling_version = None
+        self.parser = None
 
-    def _extract_log_gatling_21(self, fields):
+    def get_results_files(self):
+        return [self.file.filename] if self.file else []  # simulation dir appears after start
+
+    def _parse_gatling_21(self, lines):
         """
         Extract stats from Gatling 2.1 format.
 
-        :param fields:
-        :return:
+        :type lines: list[str]
+        :rtype: SamplesBatch
         """
         # $scenario  $userId  ${RequestRecordHeader.value}
         # ${serializeGroups(groupHierarchy)}  $name
@@ -478,40 +480,38 @@ class DataLogReader(ResultsReader):
         # 7responseStartDate  8responseEndDate
         # 9status
         # ${serializeMessage(message)}${serializeExtraInfo(extraInfo)}$Eol"
+        samples = []
+        for line in lines:
+            if "\tREQUEST\t" not in line and "\tUSER\t" not in line:  # cheap filter before splitting
+                continue
 
-        if fields[2].strip() == "USER":
-            if fields[3].strip() == "START":
-                self.concurrency += 1
-            elif fields[3].strip() == "END":
-                self.concurrency -= 1
-
-        if fields[2].strip() != "REQUEST":
-            return None
-
-        label = fields[4]
-        t_stamp = int(fields[8]) / 1000.0
+            fields = line.strip().split(self.delimiter)
+            record_type = fields[2].strip() if len(fields) > 2 else None
+            if record_type == "REQUEST":
+                if fields[-1] == 'OK':
+                    r_code = '200'
+                else:
+                    _tmp_rc = fields[-1].split(" ")[-1]
+                    r_code = _tmp_rc if _tmp_rc.isdigit() else 'No RC'
 
-        r_time = (int(fields[8]) - int(fields[5])) / 1000.0
-        latency = (int(fields[7]) - int(fields[6])) / 1000.0
-        con_time = (int(fields[6]) - int(fields[5])) / 1000.0
+                error = fields[10] if len(fields) >= 11 and fields[10] else None
 
-        if fields[-1] == 'OK':
-            r_code = '200'
-        else:
-            _tmp_rc = fields[-1].split(" ")[-1]
-            r_code = _tmp_rc if _tmp_rc.isdigit() else 'No RC'
+                start, resp_start, resp_end, end = int(fields[5]), int(fields[6]), int(fields[7]), int(fields[8])
+                samples.append((end // 1000, fields[4], self.concurrency, (end - start) / 1000.0,
+                                (resp_start - start) / 1000.0, (resp_end - resp_start) / 1000.0, r_code, error, '', 0))
+            elif record_type == "USER":
+                self.__count_user(fields, 2)
 
-        if len(fields) >= 11 and fields[10]:
-            error = fields[10]
-        else:
-            error = None
-        return int(t_stamp), label, r_time, con_time, latency, r_code, error
+        batch = SamplesBatch()
+        batch.extend(samples)
+        return batch
 
-    def _extract_log_gatling_22(self, fields):
+    def _parse_gatling_22(self, lines):
         """
         Extract stats from Gatling 2.2 format
-        :param fields:
-        :return:
+
+        :type lines: list[str]
+        :rtype: SamplesBatch
         """
         # 0 ${RequestRecordHeader.value}
         # 1 $scenario
@@ -522,114 +522,101 @@ class DataLogReader(ResultsReader):
         # 6 $endTimestamp
         # 7 $status
         # [8] ${serializeMessage(message)}${serializeExtraInfo(extraInfo)}
+        samples = []
+        for line in lines:
+            if line.startswith("REQUEST\t"):
+                fields = line.strip().split(self.delimiter)
 
-        if fields[0].strip() == "USER":
-            if fields[3].strip() == "START":
-                self.concurrency += 1
-            elif fields[3].strip() == "END":
-                self.concurrency -= 1
-
-        if fields[0].strip() != "REQUEST":
-            return None
+                if fields[7] == 'OK':
+                    r_code = '200'
+                else:
+                    _tmp_rc = fields[-1].split(" ")[-1]
+                    r_code = _tmp_rc if _tmp_rc.isdigit() else 'No RC'
 
-        label = fields[4]
-        t_stamp = int(fields[6]) / 1000.0
+                error = fields[8] if len(fields) >= 9 and fields[8] else None
 
-        r_time = (int(fields[6]) - int(fields[5])) / 1000.0
-        latency = 0.0
-        con_time = 0.0
+                start, end = int(fields[5]), int(fields[6])
+                samples.append((end // 1000, fields[4], self.concurrency, (end - start) / 1000.0, 0.0, 0.0, r_code,
+                                error, '', 0))
+            elif line.startswith("USER\t"):
+                self.__count_user(line.split(self.delimiter), 0)
 
-        if fields[7] == 'OK':
-            r_code = '200'
-        else:
-            _tmp_rc = fields[-1].split(" ")[-1]
-            r_code = _tmp_rc if _tmp_rc.isdigit() else 'No RC'
+        batch = SamplesBatch()
+        batch.extend(samples)
+        return batch
 
-        if len(fields) >= 9 and fields[8]:
-            error = fields[8]
-        else:
-            error = None
-        return int(t_stamp), label, r_time, con_time, latency, r_code, error
+    def __count_user(self, fields, type_idx):
+        if fields[type_idx].strip() == "USER":
+            if fields[3].strip() == "START":
+                self.concurrency += 1
+            elif fields[3].strip() == "END":
+                self.concurrency -= 1
 
     def _guess_gatling_version(self, fields):
         if fields[0].strip() in ["USER", "REQUEST", "RUN"]:
             self.log.debug("Parsing Gatling 2.2 stats")
             return "2.2"
-        elif fields[2].strip() in ["USER", "REQUEST", "RUN"]:
+        elif len(fields) > 2 and fields[2].strip() in ["USER", "REQUEST", "RUN"]:
             self.log.debug("Parsing Gatling 2.1 stats")
             return "2.1"
         else:
             return None
 
-    def _extract_log_data(self, fields):
-        if self.guessed_gatling_version is None:
-            self.guessed_gatling_version = self._guess_gatling_version(fields)
+    def __get_parser(self, lines):
+        """
+        Detect format version once per file, by first recognizable line
 
-        if self.guessed_gatling_version == "2.1":
-            return self._extract_log_gatling_21(fields)
-        elif self.guessed_gatling_version == "2.2":
-            return self._extract_log_gatling_22(fields)
-        else:
-            return None
+        :type lines: list[str]
+        """
+        for idx, line in enumerate(lines):
+            self.guessed_gatling_version = self._guess_gatling_version(line.strip().split(self.delimiter))
+            if self.guessed_gatling_version == "2.1":
+                return self._parse_gatling_21, lines[idx:]
+            elif self.guessed_gatling_version == "2.2":
+                return self._parse_gatling_22, lines[idx:]
+        return None, []
 
     def _read(self, last_pass=False):
         """
-        Generator method that returns next portion of data
+        Generator method that returns next portion of data,
+        last pass reads the rest of the file in chunks to not keep it whole in memory
 
         :param last_pass:
         """
-        while not self.fds and not self.__open_fds():
+        while not self.file and not self.__open_file():
             self.log.debug("No data to start reading yet")
             yield None
 
         self.log.debug("Reading gatling results")
-        self.fds.seek(self.offset)  # without this we have a stuck reads on Mac
-        if last_pass:
-            lines = self.fds.readlines()  # unlimited
-        else:
-            lines = self.fds.readlines(1024 * 1024)  # 1MB limit to read
-        self.offset = self.fds.tell()
+        while True:
+            offset = self.file.offset
+            lines = self.file.get_text_lines()  # complete lines only, unfinished one waits for its end
+            finished = self.file.offset == offset
 
-        for line in lines:
-            if not line.endswith("\n"):
-                self.partial_buffer += line
-                continue
-
-            line = "%s%s" % (self.partial_buffer, line)
-            self.partial_buffer = ""
+            if self.parser is None:
+                self.parser, lines = self.__get_parser(lines)
 
-            line = line.strip()
-            fields = line.split(self.delimiter)
+            if lines:
+                batch = self.parser(lines)
+                if batch:
+                    yield batch
 
-            data = self._extract_log_data(fields)
-            if data is None:
-                continue
-
-            t_stamp, label, r_time, con_time, latency, r_code, error = data
-            bytes_count = None
-            yield t_stamp, label, self.concurrency, r_time, con_time, latency, r_code, error, '', bytes_count
+            if not last_pass or finished:
+                break
 
-    def __open_fds(self):
+    def __open_file(self):
         """
-        open gatling simulation.log
+        locate gatling simulation.log
         """
         prog = re.compile("^%s-[0-9]+$" % self.dir_prefix)
 
         for fname in os.listdir(self.basedir):
             if prog.match(fname):
-                self.filename = os.path.join(self.basedir, fname, "simulation.log")
-                break
-
-        if not self.filename:
-            self.log.debug("File is empty: %s", self.filename)
-            return False
+                self.file = FileReader(os.path.join(self.basedir, fname, "simulation.log"), self.log)
+                return True
 
-        self.fds = open(self.filename)
-        return True
-
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
+        self.log.debug("Simulation dir not appeared yet: %s", self.basedir)
+        return False
 
 
 class Gatling(RequiredTool):
@@ -28,7 +28,7 @@ from bzt.modules.console import WidgetProvider, ExecutorWidget
 from bzt.requests_model import HTTPRequest
 from bzt.six import iteritems
 from bzt.utils import shell_exec, MirrorsManager, dehumanize_time, get_full_path, PythonGenerator
-from bzt.utils import unzip, RequiredTool, JavaVM, shutdown_process, TclLibrary
+from bzt.utils import unzip, RequiredTool, JavaVM, shutdown_process, TclLibrary, FileReader
 
 
 class GrinderExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInstallableTools):
@@ -268,35 +268,33 @@ class DataLogReader(ResultsReader):
     def __init__(self, filename, parent_logger):
         super(DataLogReader, self).__init__()
         self.log = parent_logger.getChild(self.__class__.__name__)
-        self.filename = filename
-        self.fds = None
+        self.file = FileReader(filename, self.log)
         self.idx = {}
-        self.partial_buffer = ""
         self.delimiter = ","
-        self.offset = 0
         self.start_time = 0
         self.end_time = 0
         self.concurrency = 0
 
+    def get_results_files(self):
+        return [self.file.filename]
+
     def _read(self, last_pass=False):
         """
         Generator method that returns next portion of data
 
         :param last_pass:
         """
-        while not self.fds and not self.__open_fds():
+        while not self.file.is_ready():
             self.log.debug("No data to start reading yet")
             yield None
 
         self.log.debug("Reading grinder results...")
-        self.fds.seek(self.offset)  # without this we have a stuck reads on Mac
-        if last_pass:
-            lines = self.fds.readlines()  # unlimited
-        else:
-            lines = self.fds.readlines(1024 * 1024)  # 1MB limit to read
-        self.offset = self.fds.tell()
-
+        lines = self.file.get_text_lines(last_pass)
         for lnum, line in enumerate(lines):
+            if not self.idx:
+                self.__parse_header(line)
+                continue
+
             data_fields = self.__split(line)
             if not data_fields:
                 self.log.debug("Skipping line: %s", line)
@@ -317,13 +315,6 @@ class DataLogReader(ResultsReader):
                   latency, r_code, error_msg, source_id, bytes_count
 
     def __split(self, line):
-        if not line.endswith("\n"):
-            self.partial_buffer += line
-            return None
-
-        line = "%s%s" % (self.partial_buffer, line)
-        self.partial_buffer = ""
-
         if not line.startswith('data'):
             line_parts = line.split(' ')
             if len(line_parts) > 1:
@@ -362,38 +353,17 @@ class DataLogReader(ResultsReader):
 
         return label, error_msg
 
-    def __open_fds(self):
+    def __parse_header(self, line):
         """
-        opens grinder kpi-file
+        lines before header are skipped
         """
-        if not os.path.isfile(self.filename):
-            self.log.debug("File not appeared yet: %s", self.filename)
-            return False
-
-        if not os.path.getsize(self.filename):
-            self.log.debug("File is empty: %s", self.filename)
-            return False
-
-        self.fds = open(self.filename)
-        line = ''
-        while not line.startswith('data'):
-            line = self.fds.readline()
-            if line == '':  # end of file
-                self.fds.close()
-                self.fds = None
-                return False
+        if not line.startswith('data'):
+            return
 
-        self.offset = self.fds.tell()
         line = line[len('data '):]
-
         header_list = line.strip().split(self.delimiter)
         for _ix, field in enumerate(header_list):
             self.idx[field.strip()] = _ix
-        return True
-
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
 
 
 class Grinder(RequiredTool):
@@ -17,16 +17,19 @@ limitations under the License.
 """
 import copy
 import csv
+import errno
 import fnmatch
 import json
+import operator
 import os
 import re
 import socket
+import struct
 import subprocess
 import tempfile
 import time
 import traceback
-from collections import Counter, namedtuple
+from collections import Counter, OrderedDict, namedtuple, deque
 from distutils.version import LooseVersion
 from math import ceil
 
@@ -35,15 +38,15 @@ from cssselect import GenericTranslator
 from bzt import TaurusConfigError, ToolError, TaurusInternalException, TaurusNetworkError
 from bzt.engine import ScenarioExecutor, Scenario, FileLister, HavingInstallableTools
 from bzt.jmx import JMX
-from bzt.modules.aggregator import ConsolidatingAggregator, ResultsReader, DataPoint, KPISet
+from bzt.modules.aggregator import ConsolidatingAggregator, ResultsReader, DataPoint, KPISet, SamplesBatch
 from bzt.modules.console import WidgetProvider, ExecutorWidget
 from bzt.modules.functional import FunctionalAggregator, FunctionalResultsReader, FunctionalSample
 from bzt.modules.provisioning import Local
 from bzt.modules.soapui import SoapUIScriptConverter
 from bzt.requests_model import RequestVisitor, ResourceFilesCollector
-from bzt.six import iteritems, string_types, StringIO, etree, binary_type, parse, unicode_decode
+from bzt.six import iteritems, string_types, etree, binary_type, parse, unicode_decode
 from bzt.utils import get_full_path, EXE_SUFFIX, MirrorsManager, ExceptionalDownloader, get_uniq_name
-from bzt.utils import shell_exec, ensure_is_dict, dehumanize_time, BetterDict, guess_csv_dialect
+from bzt.utils import shell_exec, ensure_is_dict, dehumanize_time, BetterDict, guess_csv_dialect, FileReader
 from bzt.utils import unzip, RequiredTool, JavaVM, shutdown_process, ProgressBarContext, TclLibrary
 
 
@@ -73,6 +76,7 @@ class JMeterExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInstall
         self.sys_properties_file = None
         self.kpi_jtl = None
         self.log_jtl = None
+        self.results_socket = None
         self.process = None
         self.end_time = None
         self.retcode = None
@@ -172,7 +176,10 @@ class JMeterExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInstall
         self.stderr_file = open(err, "w")
 
         if isinstance(self.engine.aggregator, ConsolidatingAggregator):
-            self.reader = JTLReader(self.kpi_jtl, self.log, self.log_jtl)
+            if self.results_socket:
+                self.reader = JTLSocketReader(self.results_socket, self.log, self.log_jtl, self.kpi_jtl)
+            else:
+                self.reader = JTLReader(self.kpi_jtl, self.log, self.log_jtl)
             self.reader.is_distributed = len(self.distributed_servers) > 0
             assert isinstance(self.reader, JTLReader)
             self.engine.aggregator.add_underling(self.reader)
@@ -632,8 +639,18 @@ class JMeterExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInstall
         self.__add_listener(log_lst, jmx)
 
     def __add_result_writers(self, jmx):
-        self.kpi_jtl = self.engine.create_artifact("kpi", ".jtl")
-        kpi_lst = jmx.new_kpi_listener(self.kpi_jtl)
+        if self.__use_results_socket():
+            self.results_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.results_socket.bind(("127.0.0.1", 0))
+            self.results_socket.listen(1)
+            self.log.debug("Receiving samples on %s:%s", *self.results_socket.getsockname())
+            script = os.path.join(get_full_path(__file__, step_up=2), "resources", "jmeter-results-sender.groovy")
+            queue_size = int(self.settings.get("results-queue-size", 100000))
+            kpi_lst = jmx.new_socket_listener(script, self.results_socket.getsockname(), queue_size)
+            self.kpi_jtl = self.engine.create_artifact("kpi", ".jtl")  # written by reader from received samples
+        else:
+            self.kpi_jtl = self.engine.create_artifact("kpi", ".jtl")
+            kpi_lst = jmx.new_kpi_listener(self.kpi_jtl)
         self.__add_listener(kpi_lst, jmx)
 
         jtl_log_level = self.execution.get('write-xml-jtl', 'error')
@@ -649,6 +666,20 @@ class JMeterExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInstall
             log_lst = jmx.new_xml_listener(self.log_jtl, True, flags)
             self.__add_listener(log_lst, jmx)
 
+    def __use_results_socket(self):
+        transport = self.settings.get("results-transport", "file")
+        if transport not in ("file", "socket"):
+            raise TaurusConfigError("Unsupported results-transport for JMeter: %s" % transport)
+
+        if transport == "file" or not isinstance(self.engine.aggregator, ConsolidatingAggregator):
+            return False
+
+        if self.distributed_servers:
+            self.log.warning("Socket results transport isn't supported for distributed mode, using file")
+            return False
+
+        return True
+
     def __force_tran_parent_sample(self, jmx):
         scenario = self.get_scenario()
         if scenario.get("force-parent-sample", True):
@@ -937,6 +968,9 @@ class JMeterExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInstall
         return True
 
 
+JTLColumns = namedtuple("JTLColumns", "main connect bytes host thread")
+
+
 class JTLReader(ResultsReader):
     """
     Class to read KPI JTL
@@ -947,13 +981,22 @@ class JTLReader(ResultsReader):
         super(JTLReader, self).__init__()
         self.is_distributed = False
         self.log = parent_logger.getChild(self.__class__.__name__)
-        self.csvreader = IncrementalCSVReader(self.log, filename)
+        self.csvreader = IncrementalCSVReader(self.log, filename) if filename else None
+        self.columns = None
         self.read_records = 0
         if errors_filename:
             self.errors_reader = JTLErrorsReader(errors_filename, parent_logger)
         else:
             self.errors_reader = None
 
+    def get_results_files(self):
+        filenames = []
+        if self.csvreader:
+            filenames.append(self.csvreader.file.filename)
+        if self.errors_reader:
+            filenames.append(self.errors_reader.file.filename)
+        return filenames
+
     def _read(self, last_pass=False):
         """
         Generator method that returns next portion of data
@@ -963,38 +1006,65 @@ class JTLReader(ResultsReader):
         if self.errors_reader:
             self.errors_reader.read_file()
 
+        batch = SamplesBatch()
         for row in self.csvreader.read(last_pass):
-            label = unicode_decode(row["label"])
+            if self.columns is None:
+                self.columns = self.__get_columns()
+            tstmp, label, rtm, ltc, rcd, success, error, concur = self.columns.main(row)
+
+            label = unicode_decode(label)
+            concur = int(concur)
             if self.is_distributed:
-                concur = int(row["grpThreads"])
-                trname = row["Hostname"] + row["threadName"][:row["threadName"].rfind('-')]
+                thread_name = row[self.columns.thread]
+                trname = row[self.columns.host] + thread_name[:thread_name.rfind('-')]
             else:
-                concur = int(row["allThreads"])
                 trname = ''
 
-            rtm = int(row["elapsed"]) / 1000.0
-            ltc = int(row["Latency"]) / 1000.0
-            if "Connect" in row:
-                cnn = int(row["Connect"]) / 1000.0
+            rtm = int(rtm) / 1000.0
+            ltc = int(ltc) / 1000.0
+            if self.columns.connect is not None:
+                cnn = int(row[self.columns.connect]) / 1000.0
                 if cnn < ltc:  # this is generally bad idea...
                     ltc -= cnn  # fixing latency included into connect time
             else:
                 cnn = None
 
-            rcd = row["responseCode"]
             if rcd.endswith('Exception'):
                 rcd = rcd.split('.')[-1]
 
-            if row["success"] != "true":
-                error = row["responseMessage"]
-            else:
+            if success == "true":
                 error = None
 
-            byte_count = int(row.get("bytes", 0))
+            if self.columns.bytes is not None:
+                byte_count = int(row[self.columns.bytes])
+            else:
+                byte_count = 0
 
-            tstmp = int(int(row["timeStamp"]) / 1000)
+            tstmp = int(int(tstmp) / 1000)
             self.read_records += 1
-            yield tstmp, label, concur, rtm, cnn, ltc, rcd, error, trname, byte_count
+            batch.append(tstmp, label, concur, rtm, cnn, ltc, rcd, error, trname, byte_count)
+
+        if batch:
+            yield batch
+
+    def __get_columns(self):
+        """
+        Resolve positions of used columns from JTL header
+        """
+        indexes = self.csvreader.indexes
+        fields = ["timeStamp", "label", "elapsed", "Latency", "responseCode", "success", "responseMessage"]
+        fields.append("grpThreads" if self.is_distributed else "allThreads")
+        missing = [field for field in fields if field not in indexes]
+        if missing:
+            raise TaurusInternalException("Required fields are missing in JTL %s: %s" % (self.csvreader.filename,
+                                                                                           missing))
+
+        return JTLColumns(
+            main=operator.itemgetter(*[indexes[field] for field in fields]),
+            connect=indexes.get("Connect"),
+            bytes=indexes.get("bytes"),
+            host=indexes.get("Hostname"),
+            thread=indexes.get("threadName"))
 
     def _calculate_datapoints(self, final_pass=False):
         for point in super(JTLReader, self)._calculate_datapoints(final_pass):
@@ -1004,11 +1074,154 @@ class JTLReader(ResultsReader):
                     if label in data:
                         label_data[KPISet.ERRORS] = data[label]
                     else:
-                        label_data[KPISet.ERRORS] = {}
+                        label_data[KPISet.ERRORS] = []
 
             yield point
 
 
+class JTLSocketReader(JTLReader):
+    """
+    Reads samples that are sent by jmeter-results-sender.groovy listener instead of tailing KPI JTL.
+    Record is big-endian: timeStamp, elapsed, Latency, Connect, bytes (all int64), allThreads (int32),
+    success (bool), then label, responseCode and responseMessage as Java's writeUTF strings.
+    Record with negative timeStamp carries total count of samples dropped by sender in elapsed field.
+    Received samples are written into KPI JTL file, if it's given.
+
+    :type server: socket.socket
+    """
+    HEADER = struct.Struct(">qqqqqi?")
+    STR_LEN = struct.Struct(">H")
+    CHUNK_SIZE = 1024 * 1024
+    KPI_FIELDS = ["timeStamp", "elapsed", "Latency", "Connect", "bytes", "allThreads", "success", "label",
+                  "responseCode", "responseMessage"]
+
+    def __init__(self, server, parent_logger, errors_filename, kpi_filename=None):
+        super(JTLSocketReader, self).__init__(None, parent_logger, errors_filename)
+        self.server = server
+        self.server.setblocking(False)
+        self.conn = None
+        self.received = bytearray()
+        self.dropped = 0
+        self.kpi_filename = kpi_filename
+        self.kpi_file = None
+        self.kpi_writer = None
+
+    def _read(self, last_pass=False):
+        if self.errors_reader:
+            self.errors_reader.read_file()
+
+        self.__receive()
+        batch = self.__decode()
+        if last_pass:
+            if self.server:
+                if self.conn:
+                    self.conn.close()
+                    self.conn = None
+                self.server.close()
+                self.server = None
+            if self.kpi_file:
+                self.kpi_file.close()
+                self.kpi_file = None
+
+        if batch:
+            yield batch
+
+    def __receive(self):
+        """
+        Take everything that socket has received, so sender never waits for buffer space
+        """
+        if self.conn is None:
+            if not self.server:
+                return
+
+            try:
+                self.conn, address = self.server.accept()
+            except socket.error as exc:
+                if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+            self.conn.setblocking(False)
+            self.log.debug("JMeter connected from %s:%s", *address)
+
+        while True:
+            try:
+                data = self.conn.recv(self.CHUNK_SIZE)
+            except socket.error as exc:
+                if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+
+            if not data:
+                self.log.debug("JMeter closed results connection")
+                self.conn.close()
+                self.conn = None
+                break
+
+            self.received.extend(data)
+
+    def __write_kpi(self, rows):
+        if not self.kpi_filename or not rows:
+            return
+
+        if self.kpi_file is None:
+            self.kpi_file = open(self.kpi_filename, 'a')
+            self.kpi_writer = csv.writer(self.kpi_file, lineterminator='\n')
+            if not self.kpi_file.tell():
+                self.kpi_writer.writerow(self.KPI_FIELDS)
+        self.kpi_writer.writerows(rows)
+        self.kpi_file.flush()
+
+    def __decode(self):
+        batch = SamplesBatch()
+        rows = []
+        data = self.received
+        size = len(data)
+        pos = 0
+        while pos + self.HEADER.size <= size:
+            tstmp, rtm, ltc, cnn, byte_count, concur, success = self.HEADER.unpack_from(data, pos)
+            end = pos + self.HEADER.size
+            strings = []
+            while len(strings) < 3 and end + self.STR_LEN.size <= size:
+                length = self.STR_LEN.unpack_from(data, end)[0]
+                if end + self.STR_LEN.size + length > size:
+                    break
+                end += self.STR_LEN.size
+                strings.append(data[end:end + length].decode('utf-8', 'replace'))
+                end += length
+
+            if len(strings) < 3:
+                break  # rest of record isn't received yet
+            pos = end
+            label, rcd, error = strings
+
+            if tstmp < 0:
+                if rtm > self.dropped:
+                    self.log.warning("JMeter has dropped %s samples that Taurus couldn't receive in time", rtm)
+                    self.dropped = rtm
+                continue
+
+            rows.append((tstmp, rtm, ltc, cnn, byte_count, concur, "true" if success else "false", label, rcd, error))
+
+            rtm /= 1000.0
+            ltc /= 1000.0
+            cnn /= 1000.0
+            if cnn < ltc:
+                ltc -= cnn  # same as for JTL, latency includes connect time
+
+            if rcd.endswith('Exception'):
+                rcd = rcd.split('.')[-1]
+
+            if success:
+                error = None
+
+            self.read_records += 1
+            batch.append(tstmp // 1000, label, concur, rtm, cnn, ltc, rcd, error, '', byte_count)
+
+        del data[:pos]
+        self.__write_kpi(rows)
+        return batch
+
+
 class FuncJTLReader(FunctionalResultsReader):
     """
     Class to read trace.jtl
@@ -1023,16 +1236,13 @@ class FuncJTLReader(FunctionalResultsReader):
         self.executor_label = "JMeter"
         self.log = parent_logger.getChild(self.__class__.__name__)
         self.parser = etree.XMLPullParser(events=('end',))
-        self.offset = 0
-        self.filename = filename
         self.engine = engine
-        self.fds = None
+        self.file = FileReader(filename, self.log)
         self.failed_processing = False
         self.read_records = 0
 
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
+    def get_results_files(self):
+        return [self.file.filename]
 
     def read(self, last_pass=True):
         """
@@ -1042,13 +1252,8 @@ class FuncJTLReader(FunctionalResultsReader):
         if self.failed_processing:
             return
 
-        if not self.fds:
-            if os.path.exists(self.filename) and os.path.getsize(self.filename):
-                self.log.debug("Opening %s", self.filename)
-                self.fds = open(self.filename, 'rb')
-            else:
-                self.log.debug("File not exists: %s", self.filename)
-                return
+        if not self.file.is_ready():
+            return
 
         self.__read_next_chunk(last_pass)
 
@@ -1064,9 +1269,8 @@ class FuncJTLReader(FunctionalResultsReader):
                 yield sample
 
     def __read_next_chunk(self, last_pass):
-        self.fds.seek(self.offset)
         while True:
-            read = self.fds.read(1024 * 1024)
+            read = self.file.get_bytes(last_pass)
             if read.strip():
                 try:
                     self.parser.feed(read)
@@ -1076,9 +1280,6 @@ class FuncJTLReader(FunctionalResultsReader):
                     self.log.warning("Failed to parse errors XML: %s", exc)
             else:
                 break
-            if not last_pass:
-                continue
-        self.offset = self.fds.tell()
 
     def _write_sample_data(self, filename, contents):
         artifact = self.engine.create_artifact(filename, ".bin")
@@ -1233,19 +1434,17 @@ class FuncJTLReader(FunctionalResultsReader):
 
 class IncrementalCSVReader(object):
     """
-    JTL csv reader
+    JTL csv reader, gives rows as lists of values, use `indexes` to find columns.
+    Lines without quote char are just split, csv module parses only quoted ones.
     """
 
     def __init__(self, parent_logger, filename):
-        self.buffer = StringIO()
-        self.csv_reader = None
         self.log = parent_logger.getChild(self.__class__.__name__)
         self.indexes = {}
-        self.partial_buffer = ""
-        self.offset = 0
+        self.dialect = None
         self.filename = filename
-        self.fds = None
-        self.read_speed = 1024 * 1024
+        self.file = FileReader(filename, self.log)
+        self.quoted_lines = []  # lines of quoted record that isn't finished yet
 
     def read(self, last_pass=False):
         """
@@ -1253,73 +1452,66 @@ class IncrementalCSVReader(object):
         yield csv row
         :type last_pass: bool
         """
-        if not self.fds and not self.__open_fds():
+        if not self.file.is_ready():
             self.log.debug("No data to start reading yet")
             return
 
         self.log.debug("Reading JTL: %s", self.filename)
-        self.fds.seek(self.offset)  # without this we have stuck reads on Mac
+        text = self.file.get_text(last_pass)
+        if "\r" in text:
+            text = text.replace("\r\n", "\n")
+        lines = iter(text.split("\n")[:-1])
+
+        if self.dialect is None:
+            header = next(lines, None)
+            if header is None:
+                return
+            self.__parse_header(header)
 
-        if last_pass:
-            lines = self.fds.readlines()  # unlimited
-        else:
-            lines = self.fds.readlines(int(self.read_speed))
-        self.offset = self.fds.tell()
-        bytes_read = sum(len(line) for line in lines)
-        self.log.debug("Read lines: %s / %s bytes (at speed %s)", len(lines), bytes_read, self.read_speed)
-        if bytes_read >= self.read_speed:
-            self.read_speed = min(8 * 1024 * 1024, self.read_speed * 2)
-        elif bytes_read < self.read_speed / 2:
-            self.read_speed = max(self.read_speed / 2, 1024 * 1024)
+        delimiter = self.dialect.delimiter
+        quotechar = self.dialect.quotechar
+        if self.dialect.skipinitialspace:
+            quotechar = delimiter  # let csv module strip spaces
+        columns = len(self.indexes)
 
         for line in lines:
-            if not line.endswith("\n"):
-                self.partial_buffer += line
+            if self.quoted_lines or quotechar in line:
+                row = self.__parse_quoted(line)
+                if row is None:
+                    continue
+            elif line:
+                row = line.split(delimiter)
+            else:
                 continue
 
-            line = "%s%s" % (self.partial_buffer, line)
-            self.partial_buffer = ""
-
-            if self.csv_reader is None:
-                dialect = guess_csv_dialect(line)
-                self.csv_reader = csv.DictReader(self.buffer, [], dialect=dialect)
-                self.csv_reader.fieldnames += line.strip().split(self.csv_reader.dialect.delimiter)
-                self.log.debug("Analyzed header line: %s", self.csv_reader.fieldnames)
+            if len(row) < columns:
+                self.log.warning("Skipping incomplete JTL record: %s", row)
                 continue
 
-            self.buffer.write(line)
-
-        self.buffer.seek(0)
-        for row in self.csv_reader:
             yield row
-        self.buffer.seek(0)
-        self.buffer.truncate(0)
 
-    def __open_fds(self):
-        """
-        Opens JTL file for reading
-        """
-        if not os.path.isfile(self.filename):
-            self.log.debug("File not appeared yet: %s", self.filename)
-            return False
+    def __parse_header(self, line):
+        self.dialect = guess_csv_dialect(line)
+        self.dialect.doublequote = True  # JMeter escapes quotes this way, header has no quotes to guess it
+        fieldnames = line.strip().split(self.dialect.delimiter)
+        self.indexes = {name: idx for idx, name in enumerate(fieldnames)}
+        self.log.debug("Analyzed header line: %s", fieldnames)
 
-        fsize = os.path.getsize(self.filename)
-        if not fsize:
-            self.log.debug("File is empty: %s", self.filename)
-            return False
-
-        if fsize <= self.offset:
-            self.log.debug("Waiting file to grow larget than %s, current: %s", self.offset, fsize)
-            return False
+    def __parse_quoted(self, line):
+        """
+        Quoted values can contain line ends, so record is parsed when all quotes are closed
 
-        self.log.debug("Opening file: %s", self.filename)
-        self.fds = open(self.filename)
-        self.fds.seek(self.offset)
-        return True
+        :rtype: list|None
+        """
+        self.quoted_lines.append(line)
+        record = "\n".join(self.quoted_lines)
+        if record.count(self.dialect.quotechar) % 2:
+            return None
 
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
+        self.quoted_lines = []
+        for row in csv.reader([record], self.dialect):
+            return row
+        return None
 
 
 class JTLErrorsReader(object):
@@ -1329,25 +1521,24 @@ class JTLErrorsReader(object):
     :type filename: str
     :type parent_logger: logging.Logger
     """
-    assertionMessage = GenericTranslator().css_to_xpath("assertionResult>failureMessage")
-    url_xpath = GenericTranslator().css_to_xpath("java\\.net\\.URL")
+    BODY_TAGS = ("responseData", "samplerData", "requestHeader", "responseHeader", "queryString", "cookies")
+
+    assertionMessage = etree.XPath(GenericTranslator().css_to_xpath("assertionResult>failureMessage"))
+    url_xpath = etree.XPath(GenericTranslator().css_to_xpath("java\\.net\\.URL"))
+    success_xpath = etree.XPath("success")
 
     def __init__(self, filename, parent_logger):
         # http://stackoverflow.com/questions/9809469/python-sax-to-lxml-for-80gb-xml/9814580#9814580
         super(JTLErrorsReader, self).__init__()
         self.log = parent_logger.getChild(self.__class__.__name__)
-        self.parser = etree.XMLPullParser(events=('end',))
-        # context = etree.iterparse(self.fds, events=('end',))
-        self.offset = 0
-        self.filename = filename
-        self.fds = None
+        self.parser = etree.XMLPullParser(events=('start', 'end'), huge_tree=True)
+        self.file = FileReader(filename, self.log)
         self.buffer = BetterDict()
+        self.timestamps = deque()
+        self.depth = 0
+        self.skip_sample = False
         self.failed_processing = False
 
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
-
     def read_file(self):
         """
         Read the next part of the file
@@ -1356,64 +1547,84 @@ class JTLErrorsReader(object):
         if self.failed_processing:
             return
 
-        if not self.fds:
-            if os.path.exists(self.filename) and os.path.getsize(self.filename):  # getsize check to not stuck on mac
-                self.log.debug("Opening %s", self.filename)
-                self.fds = open(self.filename, 'rb')
-            else:
-                self.log.debug("File not exists: %s", self.filename)
-                return
-
-        self.fds.seek(self.offset)
-        read = self.fds.read(1024 * 1024)
+        read = self.file.get_bytes()
         if read.strip():
             try:
-                self.parser.feed(read)  # "Huge input lookup" error without capping :)
+                self.parser.feed(read)
             except etree.XMLSyntaxError as exc:
                 self.failed_processing = True
                 self.log.debug("Error reading errors.jtl: %s", traceback.format_exc())
                 self.log.warning("Failed to parse errors XML: %s", exc)
 
-        self.offset = self.fds.tell()
-        for _action, elem in self.parser.read_events():
-            del _action
-            if elem.getparent() is not None and elem.getparent().tag == 'testResults':
-                if elem.get('s'):
-                    result = elem.get('s')
-                else:
-                    result = elem.xpath('success')[0].text
-                if result == 'false':
-                    if elem.items():
-                        self.__extract_standard(elem)
-                    else:
-                        self.__extract_nonstandard(elem)
+        for action, elem in self.parser.read_events():
+            if action == 'start':
+                if self.depth == 1:  # sample start tag, its attributes are already known
+                    self.skip_sample = elem.get('s') == 'true'
+                self.depth += 1
+                continue
+
+            self.depth -= 1
+            if self.depth == 1:
+                if not self.skip_sample:
+                    self.__extract(elem)
 
                 # cleanup processed from the memory
                 elem.clear()
                 while elem.getprevious() is not None:
                     del elem.getparent()[0]
+            elif self.skip_sample or elem.tag in self.BODY_TAGS:
+                elem.clear()  # drop children of successful samples and bodies of failed ones as they come
+
+    def __extract(self, elem):
+        result = elem.get('s')
+        if result is None:
+            success = self.success_xpath(elem)
+            result = success[0].text if success else None
+
+        if result == 'false':
+            if elem.items():
+                self.__extract_standard(elem)
+            else:
+                self.__extract_nonstandard(elem)
 
     def get_data(self, max_ts):
         """
         Get accumulated errors data up to specified timestamp
         """
-        result = BetterDict()
-        for t_stamp in sorted(self.buffer.keys()):
-            if t_stamp > max_ts:
-                break
-            labels = self.buffer.pop(t_stamp)
+        indexes = BetterDict()
+        while self.timestamps and self.timestamps[0] <= max_ts:
+            labels = self.buffer.pop(self.timestamps.popleft())
             for label, label_data in iteritems(labels):
-                res = result.get(label, [])
-                for err_item in label_data:
-                    KPISet.inc_list(res, ('msg', err_item['msg']), err_item)
+                res = indexes.get(label, OrderedDict())
+                for err_item in label_data.values():
+                    KPISet.inc_index(res, err_item)
 
+        result = BetterDict()
+        for label, index in iteritems(indexes):
+            result[label] = list(index.values())
         return result
 
+    def __get_labels(self, t_stamp):
+        if t_stamp not in self.buffer:
+            # samples are written on finish, so timestamps of start are almost ordered
+            shift = 0
+            while shift < len(self.timestamps) and self.timestamps[-1] > t_stamp:
+                self.timestamps.rotate(1)
+                shift += 1
+            self.timestamps.append(t_stamp)
+            self.timestamps.rotate(-shift)
+        return self.buffer.get(t_stamp)
+
+    def __add_error(self, t_stamp, label, err_item):
+        labels = self.__get_labels(t_stamp)
+        KPISet.inc_index(labels.get(label, OrderedDict()), err_item)
+        KPISet.inc_index(labels.get('', OrderedDict()), err_item)
+
     def __extract_standard(self, elem):
         t_stamp = int(elem.get("ts")) / 1000
         label = elem.get("lb")
         r_code = elem.get("rc")
-        urls = elem.xpath(self.url_xpath)
+        urls = self.url_xpath(elem)
         if urls:
             url = Counter({urls[0].text: 1})
         else:
@@ -1428,8 +1639,7 @@ class JTLErrorsReader(object):
         if message is None:
             message = elem.get('rm')
         err_item = KPISet.error_item_skel(message, r_code, 1, errtype, url)
-        KPISet.inc_list(self.buffer.get(t_stamp).get(label, []), ("msg", message), err_item)
-        KPISet.inc_list(self.buffer.get(t_stamp).get('', []), ("msg", message), err_item)
+        self.__add_error(t_stamp, label, err_item)
 
     def __extract_nonstandard(self, elem):
         t_stamp = int(self.__get_child(elem, 'timeStamp')) / 1000  # NOTE: will it be sometimes EndTime?
@@ -1437,19 +1647,18 @@ class JTLErrorsReader(object):
         message = self.__get_child(elem, "responseMessage")
         r_code = self.__get_child(elem, "responseCode")
 
-        urls = elem.xpath(self.url_xpath)
+        urls = self.url_xpath(elem)
         if urls:
             url = Counter({urls[0].text: 1})
         else:
             url = Counter()
         errtype = KPISet.ERRTYPE_ERROR
-        massert = elem.xpath(self.assertionMessage)
+        massert = self.assertionMessage(elem)
         if massert:
             errtype = KPISet.ERRTYPE_ASSERT
             message = massert[0].text
         err_item = KPISet.error_item_skel(message, r_code, 1, errtype, url)
-        KPISet.inc_list(self.buffer.get(t_stamp).get(label, []), ("msg", message), err_item)
-        KPISet.inc_list(self.buffer.get(t_stamp).get('', []), ("msg", message), err_item)
+        self.__add_error(t_stamp, label, err_item)
 
     def get_failure_message(self, element):
         """
@@ -20,25 +20,24 @@ import math
 import os
 import sys
 import time
-from collections import OrderedDict
+from collections import OrderedDict, Counter
 from imp import find_module
 from subprocess import STDOUT
 
 from bzt import ToolError, TaurusConfigError
 from bzt.engine import ScenarioExecutor, FileLister, Scenario, HavingInstallableTools
-from bzt.modules.aggregator import ConsolidatingAggregator, ResultsProvider, DataPoint, KPISet
+from bzt.modules.aggregator import ConsolidatingAggregator, ResultsReader, KPISet
 from bzt.modules.console import WidgetProvider, ExecutorWidget
-from bzt.modules.jmeter import JTLReader
 from bzt.requests_model import HTTPRequest
 from bzt.six import PY3, iteritems
 from bzt.utils import shutdown_process, RequiredTool, BetterDict, dehumanize_time
-from bzt.utils import get_full_path, ensure_is_dict, PythonGenerator
+from bzt.utils import get_full_path, ensure_is_dict, PythonGenerator, FileReader
 
 
 class LocustIOExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInstallableTools):
     def __init__(self):
         super(LocustIOExecutor, self).__init__()
-        self.kpi_jtl = None
+        self.stats_ldjson = None
         self.process = None
         self.__out = None
         self.is_master = False
@@ -64,8 +63,8 @@ class LocustIOExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInsta
             self.slaves_ldjson = self.engine.create_artifact("locust-slaves", ".ldjson")
             self.reader = SlavesReader(self.slaves_ldjson, self.expected_slaves, self.log)
         else:
-            self.kpi_jtl = self.engine.create_artifact("kpi", ".jtl")
-            self.reader = JTLReader(self.kpi_jtl, self.log, None)
+            self.stats_ldjson = self.engine.create_artifact("locust-stats", ".ldjson")
+            self.reader = StatsReader(self.stats_ldjson, self.log)
 
         if isinstance(self.engine.aggregator, ConsolidatingAggregator):
             self.engine.aggregator.add_underling(self.reader)
@@ -103,7 +102,7 @@ class LocustIOExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInsta
             args.extend(["--master", '--expect-slaves=%s' % self.expected_slaves])
             env["SLAVES_LDJSON"] = self.slaves_ldjson
         else:
-            env["JTL"] = self.kpi_jtl
+            env["STATS_LDJSON"] = self.stats_ldjson
 
         host = self.get_scenario().get("default-address", None)
         if host is None:
@@ -167,9 +166,7 @@ class LocustIOExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInsta
                 self.__out.close()
 
     def has_results(self):
-        master_results = self.is_master and self.reader.cumulative
-        local_results = not self.is_master and self.reader and self.reader.buffer
-        if master_results or local_results:
+        if self.reader and self.reader.read_records:
             return True
         else:
             return False
@@ -196,7 +193,7 @@ class LocustIO(RequiredTool):
         raise ToolError(msg)
 
 
-class SlavesReader(ResultsProvider):
+class SlavesReader(ResultsReader):
     def __init__(self, filename, num_slaves, parent_logger):
         """
         :type filename: str
@@ -205,39 +202,50 @@ class SlavesReader(ResultsProvider):
         """
         super(SlavesReader, self).__init__()
         self.log = parent_logger.getChild(self.__class__.__name__)
-        self.filename = filename
+        self.file = FileReader(filename, self.log)
         self.join_buffer = {}
         self.num_slaves = num_slaves
-        self.fds = None
-        self.read_buffer = ""
+        self.read_records = 0
 
-    def _calculate_datapoints(self, final_pass=False):
-        if not self.fds:
-            self.__open_file()
+    def get_results_files(self):
+        return [self.file.filename]
 
-        if self.fds:
-            self.read_buffer += self.fds.read(1024 * 1024)
-            while "\n" in self.read_buffer:
-                _line = self.read_buffer[:self.read_buffer.index("\n") + 1]
-                self.read_buffer = self.read_buffer[len(_line):]
-                self.fill_join_buffer(json.loads(_line))
+    def _read(self, final_pass=False):
+        for line in self.file.get_text_lines(final_pass):
+            self.read_records += 1
+            self.fill_join_buffer(json.loads(line))
 
         max_full_ts = self.get_max_full_ts()
 
         if max_full_ts is not None:
-            for point in self.merge_datapoints(max_full_ts):
-                yield point
+            for result in self.merge_kpisets(max_full_ts):
+                yield result
 
-    def merge_datapoints(self, max_full_ts):
+    def merge_kpisets(self, max_full_ts):
+        """
+        Merge KPISets of slaves for complete seconds
+
+        :type max_full_ts: int
+        :return: timestamp, label, KPISet
+        """
         for key in sorted(self.join_buffer.keys(), key=int):
             if int(key) <= max_full_ts:
                 sec_data = self.join_buffer.pop(key)
                 self.log.debug("Processing complete second: %s", key)
-                point = DataPoint(int(key))
+                kpisets = OrderedDict()
                 for sid, item in iteritems(sec_data):
-                    point.merge_point(self.point_from_locust(key, sid, item))
-                point.recalculate()
-                yield point
+                    if 'labels' in item:
+                        slave_kpisets = StatsReader.kpisets_from_stats(item, self.rtimes_digits)
+                    else:
+                        slave_kpisets = self.kpisets_from_locust(key, item, self.rtimes_digits)
+                    for label, kpiset in iteritems(slave_kpisets):
+                        merged = kpisets.get(label, None)
+                        if merged is None:
+                            merged = kpisets[label] = KPISet(rtimes_digits=self.rtimes_digits, max_error_variety=0)
+                        merged.merge_kpis(kpiset, sid)
+
+                for label, kpiset in iteritems(kpisets):
+                    yield int(key), label, kpiset
 
     def get_max_full_ts(self):
         max_full_ts = None
@@ -246,19 +254,13 @@ class SlavesReader(ResultsProvider):
                 max_full_ts = int(key)
         return max_full_ts
 
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
-
-    def __open_file(self):
-        if os.path.exists(self.filename):
-            self.log.debug("Opening %s", self.filename)
-            self.fds = open(self.filename, 'rt')
-        else:
-            self.log.debug("File not exists: %s", self.filename)
-
     def fill_join_buffer(self, data):
         self.log.debug("Got slave data: %s", data)
+        if data.get('taurus') is not None:  # slave runs with our wrapper, it sends per-second records
+            for record in data['taurus']:
+                self.join_buffer.setdefault(str(record['ts']), {})[data['client_id']] = record
+            return
+
         for stats_item in data['stats']:
             for timestamp in stats_item['num_reqs_per_sec'].keys():
                 if timestamp not in self.join_buffer:
@@ -266,33 +268,88 @@ class SlavesReader(ResultsProvider):
                 self.join_buffer[timestamp][data['client_id']] = data
 
     @staticmethod
-    def point_from_locust(timestamp, sid, data):
+    def kpisets_from_locust(timestamp, data, rtimes_digits=3):
         """
         :type timestamp: str
-        :type sid: str
         :type data: dict
-        :rtype: DataPoint
+        :type rtimes_digits: int
+        :rtype: dict[str, KPISet]
         """
-        point = DataPoint(int(timestamp))
-        point[DataPoint.SOURCE_ID] = sid
-        overall = KPISet()
+        kpisets = OrderedDict()
         for item in data['stats']:
             if timestamp not in item['num_reqs_per_sec']:
                 continue
 
-            kpiset = KPISet()
+            kpiset = KPISet(rtimes_digits=rtimes_digits, max_error_variety=0)
             kpiset[KPISet.SAMPLE_COUNT] = item['num_reqs_per_sec'][timestamp]
             kpiset[KPISet.CONCURRENCY] = data['user_count']
             kpiset[KPISet.BYTE_COUNT] = item['total_content_length']
             if item['num_requests']:
                 avg_rt = (item['total_response_time'] / 1000.0) / item['num_requests']
                 kpiset.sum_rt = item['num_reqs_per_sec'][timestamp] * avg_rt
-            point[DataPoint.CURRENT][item['name']] = kpiset
-            overall.merge_kpis(kpiset)
+            kpisets[item['name']] = kpiset
+
+        return kpisets
+
+
+class StatsReader(ResultsReader):
+    """
+    Reads per-second records written by locust wrapper, each record has
+    counts, response codes, errors, bytes and histogram of response times for every label
+    """
+
+    def __init__(self, filename, parent_logger):
+        """
+        :type filename: str
+        :type parent_logger: logging.Logger
+        """
+        super(StatsReader, self).__init__()
+        self.log = parent_logger.getChild(self.__class__.__name__)
+        self.file = FileReader(filename, self.log)
+        self.read_records = 0
+
+    def get_results_files(self):
+        return [self.file.filename]
 
-        point[DataPoint.CURRENT][''] = overall
-        point.recalculate()
-        return point
+    def _read(self, final_pass=False):
+        for line in self.file.get_text_lines(final_pass):
+            self.read_records += 1
+            record = json.loads(line)
+            for label, kpiset in iteritems(self.kpisets_from_stats(record, self.rtimes_digits)):
+                yield record['ts'], label, kpiset
+
+    @staticmethod
+    def kpisets_from_stats(record, rtimes_digits=3):
+        """
+        KPISets of labels from wrapper record, errors aren't limited here
+        as they're folded by KPISets of reader according to its settings
+
+        :type record: dict
+        :type rtimes_digits: int
+        :rtype: dict[str, KPISet]
+        """
+        kpisets = OrderedDict()
+        for label, stats in iteritems(record['labels']):
+            kpiset = KPISet(rtimes_digits=rtimes_digits, max_error_variety=0)
+            kpiset[KPISet.SAMPLE_COUNT] = stats['count']
+            kpiset[KPISet.FAILURES] = stats['fail']
+            kpiset[KPISet.SUCCESSES] = stats['count'] - stats['fail']
+            kpiset[KPISet.CONCURRENCY] = record['user_count']
+            kpiset[KPISet.BYTE_COUNT] = stats['bytes']
+            kpiset[KPISet.RESP_CODES].update(stats['rc'])
+
+            r_times = Counter()
+            for r_time, count in iteritems(stats['rt']):
+                r_times[int(r_time) / 1000.0] += count
+            kpiset[KPISet.RESP_TIMES].update(r_times)
+            kpiset.sum_rt = sum(r_time * count for r_time, count in iteritems(r_times))
+
+            for msg, r_code, count in stats['errors']:
+                kpiset.inc_error(KPISet.error_item_skel(msg, r_code, count, KPISet.ERRTYPE_ERROR, Counter()))
+
+            kpisets[label] = kpiset
+
+        return kpisets
 
 
 class LocustIOScriptBuilder(PythonGenerator):
@@ -27,6 +27,7 @@ class Monitoring(Service, WidgetProvider):
 
     def __init__(self):
         super(Monitoring, self).__init__()
+        self.check_period = 1  # metrics are per-second, no need to poll more often
         self.listeners = []
         self.clients = []
         self.client_classes = {
@@ -158,6 +159,8 @@ class LocalClient(MonitoringClient):
                 item['disk-space'] = metric_values.disk_usage
             elif metric_name == 'engine-loop':
                 item['engine-loop'] = metric_values.engine_loop
+            elif metric_name == 'engine-loop-misses':
+                item['engine-loop-misses'] = metric_values.loop_misses
             elif metric_name == 'bytes-recv':
                 item['bytes-recv'] = metric_values.rx
             elif metric_name == 'bytes-sent':
@@ -168,6 +171,14 @@ class LocalClient(MonitoringClient):
                 item['disk-write'] = metric_values.dwu
             elif metric_name == 'conn-all':
                 item['conn-all'] = metric_values.conn_all
+            elif metric_name == 'late-samples':
+                item['late-samples'] = metric_values.late_samples
+            elif metric_name == 'late-lag':
+                item['late-lag'] = metric_values.late_lag
+            elif metric_name == 'kpi-send-queue':
+                item['kpi-send-queue'] = metric_values.send_queue
+            elif metric_name == 'kpi-send-latency':
+                item['kpi-send-latency'] = metric_values.send_latency
             else:
                 self.log.warning('Wrong metric: %s', metric_name)
 
@@ -222,7 +233,8 @@ class LocalMonitor(object):
         :return: namedtuple
         """
         stats = namedtuple("ResourceStats", ('cpu', 'disk_usage', 'mem_usage',
-                                             'rx', 'tx', 'dru', 'dwu', 'engine_loop', 'conn_all'))
+                                             'rx', 'tx', 'dru', 'dwu', 'engine_loop', 'loop_misses', 'conn_all',
+                                             'late_samples', 'late_lag', 'send_queue', 'send_latency'))
 
         net = psutil.net_io_counters()
         tx_bytes = (net.bytes_sent - self.__net_counters.bytes_sent) / interval
@@ -236,10 +248,19 @@ class LocalMonitor(object):
 
         if self.engine:
             engine_loop = self.engine.engine_loop_utilization
+            loop_misses = self.engine.engine_loop_misses
             disk_usage = psutil.disk_usage(self.engine.artifacts_dir).percent
+            late_samples = getattr(self.engine.aggregator, 'late_samples', None)
+            late_lag = getattr(self.engine.aggregator, 'late_lag', None)
+            send_queue, send_latency = self.__get_kpi_send_stats()
         else:
             engine_loop = None
+            loop_misses = None
             disk_usage = None
+            late_samples = None
+            late_lag = None
+            send_queue = None
+            send_latency = None
 
         if platform == 'darwin':   # TODO: add MacOS support
             connections = []
@@ -253,9 +274,25 @@ class LocalMonitor(object):
             disk_usage=disk_usage,
             mem_usage=psutil.virtual_memory().percent,
             rx=rx_bytes, tx=tx_bytes, dru=dru, dwu=dwu,
-            engine_loop=engine_loop, conn_all=len(connections)
+            engine_loop=engine_loop, loop_misses=loop_misses, conn_all=len(connections),
+            late_samples=late_samples, late_lag=late_lag, send_queue=send_queue, send_latency=send_latency
         )
 
+    def __get_kpi_send_stats(self):
+        """
+        Queue depth and last request latency of reporters' background KPI senders
+
+        :rtype: (int, float)
+        """
+        send_queue = None
+        send_latency = None
+        for reporter in self.engine.reporters:
+            sender = getattr(reporter, 'sender', None)
+            if sender is not None:
+                send_queue = (send_queue or 0) + sender.get_queue_depth()
+                send_latency = max(send_latency or 0.0, sender.latency)
+        return send_queue, send_latency
+
     def __get_disk_counters(self):
         try:
             return psutil.disk_io_counters()
@@ -13,31 +13,33 @@ WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 See the License for the specific language governing permissions and
 limitations under the License.
 """
-import csv
+import hashlib
 import json
 import math
 import os
+import shutil
 import socket
 import string
-import struct
 import subprocess
 import sys
 import time
 from abc import abstractmethod
+from array import array
 from os import strerror
 from subprocess import CalledProcessError
 
 import datetime
 import psutil
 
+import bzt
 from bzt import resources, TaurusConfigError, ToolError, TaurusInternalException
 from bzt.engine import ScenarioExecutor, FileLister, Scenario, HavingInstallableTools
-from bzt.modules.aggregator import ResultsReader, DataPoint, KPISet, ConsolidatingAggregator
+from bzt.modules.aggregator import ResultsReader, DataPoint, KPISet, ConsolidatingAggregator, SamplesBatch
 from bzt.modules.console import WidgetProvider, ExecutorWidget
 from bzt.requests_model import HTTPRequest
 from bzt.six import string_types, urlencode, iteritems, parse, StringIO, b, viewvalues
-from bzt.utils import RequiredTool, IncrementableProgressBar
-from bzt.utils import shell_exec, shutdown_process, BetterDict, dehumanize_time
+from bzt.utils import RequiredTool, IncrementableProgressBar, FileReader
+from bzt.utils import shell_exec, shutdown_process, BetterDict, dehumanize_time, get_full_path
 
 
 class PBenchExecutor(ScenarioExecutor, WidgetProvider, FileLister, HavingInstallableTools):
@@ -259,6 +261,13 @@ class PBenchTool(object):
         self.schedule_file = self.execution.get("schedule-file", None)
         if self.schedule_file is None:
             self.schedule_file = self.engine.create_artifact("pbench", '.sched')
+            cache = self._get_schedule_cache()
+            if cache:
+                key = cache.get_key(self.payload_file, self.__class__.__name__, load)
+                if cache.fetch(key, self.schedule_file):
+                    self.log.info("Using cached request schedule file: %s", self.schedule_file)
+                    return
+
             self.log.info("Generating request schedule file: %s", self.schedule_file)
             with open(self.payload_file, 'rb') as pfd:
                 scheduler = Scheduler(load, pfd, self.log)
@@ -266,6 +275,18 @@ class PBenchTool(object):
                     self._write_schedule_file(load, scheduler, sfd)
             self.log.info("Done generating schedule file")
 
+            if cache:
+                cache.store(key, self.schedule_file)
+
+    def _get_schedule_cache(self):
+        settings = self.settings.get("schedule-cache")
+        if not settings.get("enabled", False):
+            return None
+
+        path = get_full_path(settings.get("path", "~/.bzt/pbench-cache"))
+        max_size = float(settings.get("max-size", 10 * 1024)) * 1024 * 1024
+        return ScheduleCache(path, max_size, self.log)
+
     def check_config(self):
         cmdline = [self.path, 'check', self.config_file]
         self.log.debug("Check pbench config with command: %s", cmdline)
@@ -415,45 +436,67 @@ class OriginalPBenchTool(PBenchTool):
 
 class TaurusPBenchTool(PBenchTool):
     def _write_schedule_file(self, load, scheduler, sfd):
+        """
+        Records are `type_and_delay|len|offset` structs (uint32, uint32, uint64, little-endian),
+        each chunk of them is packed as array of uint32 quadruples and written at once
+        """
+        index = scheduler.read_payload_index()
+        lengths = array('I', [payload_len + meta_len for payload_len, _, _, _, meta_len in index])
+        offsets_low = array('I', [payload_offset & 0xFFFFFFFF for _, payload_offset, _, _, _ in index])
+        offsets_high = array('I', [payload_offset >> 32 for _, payload_offset, _, _, _ in index])
+
         prev_offset = 0
         accum_interval = 0.0
         cnt = 0
         payload_entry_count = None
         pbar = None
         start_time = time.time()
-        for item in scheduler.generate():
-            # item : (time_offset, payload_len, payload_offset, payload, marker, record_type, overall_len)
-            time_offset, _, payload_offset, _, _, record_type, overall_len = item
-
+        for time_offsets, first_entry, loop_start in scheduler.generate_chunks():
             if scheduler.iterations > 1 and payload_entry_count is None:
                 payload_entry_count = scheduler.count
-                estimated_size = self._estimate_schedule_size(load, payload_entry_count)
+                estimated_size = self._estimate_schedule_size(load, len(index))
                 self.log.debug("Estimated schedule size: %s", estimated_size)
                 if estimated_size:
                     pbar = IncrementableProgressBar(maxval=estimated_size)
                     pbar.catchup(start_time, cnt)
 
-            if time_offset >= 0:
-                accum_interval += 1000 * (time_offset - prev_offset)
-                interval = int(math.floor(accum_interval))
-                accum_interval -= interval
-            else:
-                interval = 0xFFFFFF
-
-            type_and_delay = struct.pack("I", interval)[:-1] + b(chr(record_type))
-            payload_len_bytes = struct.pack('I', overall_len)
-            payload_offset_bytes = struct.pack('Q', payload_offset)
-
-            sfd.write(type_and_delay + payload_len_bytes + payload_offset_bytes)
-
+            delays = []
+            append = delays.append
+            for time_offset in time_offsets:
+                if time_offset >= 0:
+                    accum_interval += 1000 * (time_offset - prev_offset)
+                    interval = int(math.floor(accum_interval))
+                    accum_interval -= interval
+                    append(interval & 0xFFFFFF)
+                else:
+                    append(0xFFFFFF)
+                prev_offset = time_offset
+
+            if loop_start is not None:
+                delays[loop_start] |= Scheduler.REC_TYPE_LOOP_START << 24
+
+            size = len(delays)
+            records = array('I', [0]) * (4 * size)
+            records[0::4] = array('I', delays)
+            records[1::4] = self.__loop_over(lengths, first_entry, size)
+            records[2::4] = self.__loop_over(offsets_low, first_entry, size)
+            records[3::4] = self.__loop_over(offsets_high, first_entry, size)
+            if sys.byteorder != 'little':
+                records.byteswap()
+            records.tofile(sfd)
+
+            cnt += size
             if pbar:
-                pbar.increment()
-            cnt += 1
-            prev_offset = time_offset
+                pbar.increment(size)
         self.log.debug("Actual schedule size: %s", cnt)
         if pbar:
             pbar.finish()
 
+    @staticmethod
+    def __loop_over(values, start, size):
+        repeats = (start + size) // len(values) + 1
+        return (values * repeats)[start:start + size]
+
     def _get_source(self, load):
         tpl = 'source_t source_log = taurus_source_t { ammo = "%s"\n schedule = "%s"\n %s\n }'
         if load.duration:
@@ -467,17 +510,109 @@ class TaurusPBenchTool(PBenchTool):
         return res
 
 
+class ScheduleCache(object):
+    """
+    Content-addressed storage of generated schedule files, shared between runs.
+    Generated files are copied into cache, cached files are read-only and hard-linked into artifacts dir
+    (copied if linking is impossible), least recently used ones are removed when cache grows above max size.
+    """
+
+    def __init__(self, path, max_size, parent_logger):
+        super(ScheduleCache, self).__init__()
+        self.log = parent_logger.getChild(self.__class__.__name__)
+        self.path = path
+        self.max_size = max_size
+
+    @staticmethod
+    def get_key(payload_file, flavour, load):
+        """
+        Payload is built from scenario each time, so its content identifies requests with no need
+        to normalize scenario itself. It also covers payload files given as 'script'.
+        """
+        digest = hashlib.sha1()
+        with open(payload_file, 'rb') as fds:
+            for chunk in iter(lambda: fds.read(1024 * 1024), b('')):
+                digest.update(chunk)
+
+        load_profile = {key: getattr(load, key) for key in
+                        ("concurrency", "throughput", "ramp_up", "steps", "hold", "iterations", "duration")}
+        digest.update(b(json.dumps([bzt.VERSION, flavour, load_profile], sort_keys=True)))
+        return digest.hexdigest()
+
+    def __get_filename(self, key):
+        return os.path.join(self.path, key + ".sched")
+
+    def fetch(self, key, dest):
+        filename = self.__get_filename(key)
+        if not os.path.exists(filename):
+            self.log.debug("Schedule is not cached yet: %s", filename)
+            return False
+
+        try:
+            os.utime(filename, None)  # mark as recently used
+            self.__link(filename, dest)
+        except (OSError, IOError) as exc:  # evicted by concurrent run or no permissions
+            self.log.debug("Failed to take schedule from cache: %s", exc)
+            return False
+
+        return True
+
+    def store(self, key, src):
+        size = os.path.getsize(src)
+        if size > self.max_size:
+            self.log.debug("Schedule file is too big to be cached: %s", size)
+            return
+
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path)
+
+            filename = self.__get_filename(key)
+            tmp_filename = "%s.%s.tmp" % (filename, os.getpid())
+            shutil.copyfile(src, tmp_filename)  # artifact file stays writable and independent of cache
+            os.chmod(tmp_filename, 0o444)  # protect cache from changes made via artifacts linked to it
+            os.rename(tmp_filename, filename)
+            self.log.debug("Schedule file is cached: %s", filename)
+            self._evict()
+        except (OSError, IOError) as exc:
+            self.log.warning("Failed to cache schedule file: %s", exc)
+
+    def _evict(self):
+        entries = []
+        for fname in os.listdir(self.path):
+            if fname.endswith(".sched"):
+                stat = os.stat(os.path.join(self.path, fname))
+                entries.append((stat.st_mtime, stat.st_size, fname))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, fname in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            self.log.debug("Removing least recently used schedule from cache: %s", fname)
+            os.remove(os.path.join(self.path, fname))
+            total_size -= size
+
+    @staticmethod
+    def __link(src, dest):
+        try:
+            os.link(src, dest)
+        except (OSError, AttributeError):  # different filesystems or no hard links support
+            shutil.copyfile(src, dest)
+
+
 class Scheduler(object):
     REC_TYPE_SCHEDULE = 0
     REC_TYPE_LOOP_START = 1
     REC_TYPE_STOP = 2
+    CHUNK_SIZE = 64 * 1024
 
     def __init__(self, load, payload_fhd, logger):
         super(Scheduler, self).__init__()
-        self.need_start_loop = None
+        self.steady_since = None
         self.log = logger
         self.load = load
         self.payload_fhd = payload_fhd
+        self.payload_index = None
         if not load.duration and not load.iterations:
             self.iteration_limit = 1
         else:
@@ -497,40 +632,54 @@ class Scheduler(object):
         self.time_offset = 0.0
         self.iterations = 0
 
-    def _payload_reader(self):
-        self.iterations = 1
-        rec_type = self.REC_TYPE_SCHEDULE
-        while True:
-            payload_offset = self.payload_fhd.tell()
-            line = self.payload_fhd.readline()
-            if not line:  # rewind
-                self.payload_fhd.seek(0)
-                self.iterations += 1
-
-                if self.need_start_loop is not None and self.need_start_loop and not self.iteration_limit:
-                    self.need_start_loop = False
-                    self.iteration_limit = self.iterations
-                    rec_type = self.REC_TYPE_LOOP_START
-
-                if self.iteration_limit and self.iterations > self.iteration_limit:
-                    self.log.debug("Schedule iterations limit reached: %s", self.iteration_limit)
+    def read_payload_index(self):
+        """
+        Parse payload file once, schedule iterations loop over its entries
+
+        :return: list of (payload_len, payload_offset, payload, marker, meta_len)
+        """
+        if self.payload_index is None:
+            self.payload_index = []
+            while True:
+                payload_offset = self.payload_fhd.tell()
+                line = self.payload_fhd.readline()
+                if not line:
                     break
 
-                continue
+                if not line.strip():  # we're fine to skip empty lines between records
+                    continue
+
+                parts = line.split(b(' '))
+                if len(parts) < 2:
+                    raise TaurusInternalException("Wrong format for meta-info line: %s" % line)
+
+                payload_len, marker = parts
+                payload_len = int(payload_len)
+                payload = self.payload_fhd.read(payload_len).decode()
+                self.payload_index.append((payload_len, payload_offset, payload, marker.decode().strip(), len(line)))
+
+            if not self.payload_index:
+                self.log.warning("No requests found in payload file, schedule is empty")
+
+        return self.payload_index
 
-            if not line.strip():  # we're fine to skip empty lines between records
-                continue
+    def _payload_reader(self):
+        self.iterations = 1
+        rec_type = self.REC_TYPE_SCHEDULE
+        index = self.read_payload_index()
+        while index:
+            for payload_len, payload_offset, payload, marker, meta_len in index:
+                yield payload_len, payload_offset, payload, marker, meta_len, rec_type
+                rec_type = self.REC_TYPE_SCHEDULE
 
-            parts = line.split(b(' '))
-            if len(parts) < 2:
-                raise TaurusInternalException("Wrong format for meta-info line: %s" % line)
+            self.iterations += 1  # rewind
+            if self.steady_since is not None and not self.iteration_limit:
+                self.iteration_limit = self.iterations
+                rec_type = self.REC_TYPE_LOOP_START
 
-            payload_len, marker = parts
-            marker = marker.decode()
-            payload_len = int(payload_len)
-            payload = self.payload_fhd.read(payload_len).decode()
-            yield payload_len, payload_offset, payload, marker.strip(), len(line), rec_type
-            rec_type = self.REC_TYPE_SCHEDULE
+            if self.iteration_limit and self.iterations > self.iteration_limit:
+                self.log.debug("Schedule iterations limit reached: %s", self.iteration_limit)
+                break
 
     def generate(self):
         for payload_len, payload_offset, payload, marker, meta_len, record_type in self._payload_reader():
@@ -546,10 +695,55 @@ class Scheduler(object):
             yield self.time_offset, payload_len, payload_offset, payload, marker, record_type, overall_len
             self.count += 1
 
+    def generate_chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        Same schedule as generate() makes, computed in bulk.
+        Each chunk is (time_offsets, first_entry, loop_start), where records loop over payload index
+        starting from `first_entry` and `loop_start` is position of REC_TYPE_LOOP_START record or None.
+        """
+        entries = len(self.read_payload_index())
+        self.iterations = 1
+        while entries:
+            size = min(chunk_size, max(entries, int(self.count)))  # small schedules don't need whole chunk
+            if self.iteration_limit:
+                size = min(size, int(self.iteration_limit * entries - self.count))
+
+            if self.load.throughput:
+                time_offsets = self.__get_time_offsets_rps(size)
+                finished = self.time_offset > self.load.duration
+                if finished:
+                    self.log.debug("Duration limit reached: %s", self.time_offset)
+            else:
+                time_offsets = self.__get_time_offsets_concurrency(size)
+                finished = False
+
+            start = int(self.count)
+            end = start + len(time_offsets)
+            loop_start = None
+            if self.steady_since is not None and not self.iteration_limit:
+                rewind = (self.steady_since // entries + 1) * entries  # first rewind after steady load reached
+                if rewind < end:
+                    self.iteration_limit = rewind // entries + 1
+                    loop_start = rewind - start
+
+            if self.iteration_limit and self.iteration_limit * entries < end:
+                self.log.debug("Schedule iterations limit reached: %s", self.iteration_limit)
+                end = int(self.iteration_limit * entries)
+                del time_offsets[end - start:]
+                finished = True
+
+            self.count += len(time_offsets)
+            self.iterations = max(1, (end - 1) // entries + 1)
+            if time_offsets:
+                yield time_offsets, start % entries, loop_start
+
+            if finished or not time_offsets:
+                break
+
     def __get_time_offset_concurrency(self):
         if not self.load.ramp_up or self.count >= self.concurrency:
-            if self.need_start_loop is None:
-                self.need_start_loop = True
+            if self.steady_since is None:
+                self.steady_since = int(self.count)
             return -1  # special case, means no delay
         elif self.load.steps:
             step = math.floor(self.count / self.step_size)
@@ -557,12 +751,30 @@ class Scheduler(object):
         else:  # ramp-up case
             return self.count * self.load.ramp_up / self.concurrency
 
+    def __get_time_offsets_concurrency(self, size):
+        offsets = []
+        count = self.count
+        ramp_up_count = self.concurrency if self.load.ramp_up else 0
+        while count < ramp_up_count and len(offsets) < size:
+            if self.load.steps:
+                offsets.append(math.floor(count / self.step_size) * self.step_len)
+            else:
+                offsets.append(count * self.load.ramp_up / self.concurrency)
+            count += 1
+
+        if len(offsets) < size:
+            if self.steady_since is None:
+                self.steady_since = int(count)
+            offsets.extend([-1] * (size - len(offsets)))  # special case, means no delay
+
+        return offsets
+
     def __get_time_offset_rps(self):
         if not self.load.ramp_up or self.time_offset > self.load.ramp_up:
             # limit iterations
             rps = self.load.throughput
-            if self.need_start_loop is None:
-                self.need_start_loop = True
+            if self.steady_since is None:
+                self.steady_since = int(self.count)
         elif self.load.steps:
             rps = self.step_size * (math.floor(self.time_offset / self.step_len) + 1)
         else:  # ramp-up case
@@ -571,68 +783,129 @@ class Scheduler(object):
 
         return 1.0 / rps if rps else 0
 
+    def __get_time_offsets_rps(self, size):
+        offsets = []
+        count = self.count
+        time_offset = self.time_offset
+        duration = self.load.duration
+        ramp_up = self.load.ramp_up
+        while ramp_up and time_offset <= ramp_up and len(offsets) < size:
+            if self.load.steps:
+                rps = self.step_size * (math.floor(time_offset / self.step_len) + 1)
+            else:
+                rps = math.sqrt(2 * count / self.ramp_up_slope) * self.ramp_up_slope
+
+            time_offset += 1.0 / rps if rps else 0
+            if time_offset > duration:
+                self.time_offset = time_offset
+                return offsets
+
+            offsets.append(time_offset)
+            count += 1
+
+        if len(offsets) < size:  # constant rate, no need to recalculate it for each record
+            if self.steady_since is None:
+                self.steady_since = int(count)
+            delay = 1.0 / self.load.throughput
+            append = offsets.append
+            for _ in range(size - len(offsets)):
+                time_offset += delay
+                if time_offset > duration:
+                    break
+                append(time_offset)
+
+        self.time_offset = time_offset
+        return offsets
+
 
 class PBenchKPIReader(ResultsReader):
     """
     Class to read KPI
     :type stats_reader: PBenchStatsReader
     """
+    FIELDS = ("timeStamp", "label", "elapsed",
+              "Connect", "Send", "Latency", "Receive",
+              "internal",
+              "bsent", "brecv",
+              "opretcode", "responseCode")
 
     def __init__(self, filename, parent_logger, stats_filename):
         super(PBenchKPIReader, self).__init__()
         self.log = parent_logger.getChild(self.__class__.__name__)
-        self.filename = filename
-        self.csvreader = None
-        self.offset = 0
-        self.fds = None
+        self.file = FileReader(filename, self.log)
+        self.errors = {}
         if stats_filename:
             self.stats_reader = PBenchStatsReader(stats_filename, parent_logger)
         else:
             self.stats_reader = None
 
+    def get_results_files(self):
+        filenames = [self.file.filename]
+        if self.stats_reader:
+            filenames.append(self.stats_reader.file.filename)
+        return filenames
+
     def _read(self, last_pass=False):
         """
         Generator method that returns next portion of data
 
         :type last_pass: bool
         """
-
-        def mcs2sec(val):
-            return int(int(val) / 1000.0) / 1000.0
-
         if self.stats_reader:
             self.stats_reader.read_file(last_pass)
 
-        if not self.csvreader and not self.__open_fds():
+        if not self.file.is_ready():
             self.log.debug("No data to start reading yet")
             return
 
-        self.log.debug("Reading: %s", self.filename)
-        self.fds.seek(self.offset)  # not only Mac has this issue, DictReader on Linux also suffers from it
-        for row in self.csvreader:
-            label = row["label"]
+        self.log.debug("Reading: %s", self.file.filename)
+        batch = self._parse_lines(self.file.get_text_lines(last_pass))
+        if len(batch):
+            yield batch
+
+    def _parse_lines(self, lines):
+        """
+        Positional parsing of phout lines, see FIELDS for their order
+
+        :type lines: list[str]
+        :rtype: SamplesBatch
+        """
+        samples = []
+        append = samples.append
+        for line in lines:
+            fields = line.split("\t")
+            if len(fields) != len(self.FIELDS):
+                if not line.strip():
+                    continue
+                fields = (fields + [None])[:len(self.FIELDS)]  # no response code or extra fields
 
             try:
-                rtm = mcs2sec(row["elapsed"])
-                ltc = mcs2sec(row["Latency"])
-                cnn = mcs2sec(row["Connect"])
+                tstmp, label, elapsed, connect, _, latency, _, _, _, brecv, opretcode, rcd = fields
+                rtm = int(int(elapsed) / 1000.0) / 1000.0
+                cnn = int(int(connect) / 1000.0) / 1000.0
+                ltc = int(int(latency) / 1000.0) / 1000.0
                 # NOTE: actually we have precise send and receive time here...
-            except:
-                raise ToolError("PBench reader: failed record: %s" % row)
+                tstmp = int(float(tstmp) + rtm)
+                byte_count = int(brecv)
+            except (ValueError, TypeError):
+                raise ToolError("PBench reader: failed record: %s" % line)
 
-            if row["opretcode"] != "0":
-                error = strerror(int(row["opretcode"]))
+            if opretcode != "0":
+                error = self.__get_error(opretcode)
                 rcd = error
             else:
                 error = None
-                rcd = row["responseCode"]
 
-            tstmp = int(float(row["timeStamp"]) + rtm)
-            byte_count = int(row["brecv"])
-            concur = 0
-            yield tstmp, label, concur, rtm, cnn, ltc, rcd, error, '', byte_count
+            append((tstmp, label, 0, rtm, cnn, ltc, rcd, error, '', byte_count))
 
-        self.offset = self.fds.tell()
+        batch = SamplesBatch()
+        batch.extend(samples)
+        return batch
+
+    def __get_error(self, opretcode):
+        if opretcode not in self.errors:
+            self.errors[opretcode] = strerror(int(opretcode))
+        return self.errors[opretcode]
 
     def _calculate_datapoints(self, final_pass=False):
         for point in super(PBenchKPIReader, self)._calculate_datapoints(final_pass):
@@ -646,82 +919,76 @@ class PBenchKPIReader(ResultsReader):
 
             yield point
 
-    def __open_fds(self):
-        """
-        Opens JTL file for reading
-        """
-        if not os.path.isfile(self.filename):
-            self.log.debug("File not appeared yet: %s", self.filename)
-            return False
-
-        fsize = os.path.getsize(self.filename)
-        if not fsize:
-            self.log.debug("File is empty: %s", self.filename)
-            return False
-
-        self.log.debug("Opening file: %s", self.filename)
-        self.fds = open(self.filename)
-        fields = ("timeStamp", "label", "elapsed",
-                  "Connect", "Send", "Latency", "Receive",
-                  "internal",
-                  "bsent", "brecv",
-                  "opretcode", "responseCode")
-        dialect = csv.excel_tab()
-        self.csvreader = csv.DictReader(self.fds, fields, dialect=dialect)
-        return True
-
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
 
 
 class PBenchStatsReader(object):
-    MARKER = "\n},"
+    """
+    Reads phantom's monitor log incrementally, its records are separated with MARKER.
+    Search for the marker starts where previous one has stopped, so no data is scanned twice.
+    """
+    MARKER = b("\n},")
 
     def __init__(self, filename, parent_logger):
         super(PBenchStatsReader, self).__init__()
         self.log = parent_logger.getChild(self.__class__.__name__)
-        self.filename = filename
-        self.buffer = ''
-        self.fds = None
+        self.file = FileReader(filename, self.log)
+        self.buffer = b("")
+        self.scan_offset = 0
+        self.minutes = {}
         self.data = {}
         self.last_data = 0
 
     def read_file(self, last_pass=False):
         del last_pass
 
-        if not os.path.isfile(self.filename):
-            self.log.debug("File not appeared yet: %s", self.filename)
+        if not self.file.is_ready():
             return False
 
-        if not self.fds:
-            self.log.debug("Opening file: %s", self.filename)
-            self.fds = open(self.filename)
+        self.buffer += self.file.get_bytes(last_pass=True)  # stats are small, read them all
+        start = 0
+        while True:
+            idx = self.buffer.find(self.MARKER, self.scan_offset)
+            if idx < 0:
+                self.scan_offset = max(start, len(self.buffer) - len(self.MARKER) + 1)
+                break
+
+            idx += len(self.MARKER)
+            chunk_str = self.buffer[start:idx - 1].decode(self.file.encoding, "replace")
+            start = idx + 1  # comma is followed by newline
+            self.scan_offset = start
+            self.__parse_chunk(json.loads("{%s}" % chunk_str))
+
+        self.buffer = self.buffer[start:]
+        self.scan_offset -= min(start, self.scan_offset)
 
-        self.buffer += self.fds.read()
-        while self.MARKER in self.buffer:
-            idx = self.buffer.find(self.MARKER) + len(self.MARKER)
-            chunk_str = self.buffer[:idx - 1]
-            self.buffer = self.buffer[idx + + 1:]
-            chunk = json.loads("{%s}" % chunk_str)
+    def __parse_chunk(self, chunk):
+        for date_str in chunk.keys():
+            statistics = chunk[date_str]
 
-            for date_str in chunk.keys():
-                statistics = chunk[date_str]
+            date = self.__get_epoch(date_str)
+            self.data[date] = 0
 
-                date_obj = datetime.datetime.strptime(date_str.split(".")[0], '%Y-%m-%d %H:%M:%S')
-                date = int(time.mktime(date_obj.timetuple()))
-                self.data[date] = 0
+            for benchmark_name in statistics.keys():
+                if not benchmark_name.startswith("benchmark_io"):
+                    continue
+                benchmark = statistics[benchmark_name]
+                for method in benchmark:
+                    meth_obj = benchmark[method]
+                    if "mmtasks" in meth_obj:
+                        self.data[date] += meth_obj["mmtasks"][2]
 
-                for benchmark_name in statistics.keys():
-                    if not benchmark_name.startswith("benchmark_io"):
-                        continue
-                    benchmark = statistics[benchmark_name]
-                    for method in benchmark:
-                        meth_obj = benchmark[method]
-                        if "mmtasks" in meth_obj:
-                            self.data[date] += meth_obj["mmtasks"][2]
+            self.log.debug("Active instances stats for %s: %s", date, self.data[date])
 
-                self.log.debug("Active instances stats for %s: %s", date, self.data[date])
+    def __get_epoch(self, date_str):
+        """
+        Converts 'YYYY-mm-dd HH:MM:SS.fff' local time to epoch seconds,
+        conversion is done once per minute and cached, seconds are just added
+        """
+        minute_str = date_str[:16]
+        if minute_str not in self.minutes:
+            date_obj = datetime.datetime.strptime(minute_str, '%Y-%m-%d %H:%M')
+            self.minutes[minute_str] = int(time.mktime(date_obj.timetuple()))
+        return self.minutes[minute_str] + int(date_str[17:19])
 
     def get_data(self, tstmp):
         if tstmp in self.data:
@@ -731,10 +998,6 @@ class PBenchStatsReader(object):
             self.log.debug("No active instances info for %s", tstmp)
             return self.last_data
 
-    def __del__(self):
-        if self.fds:
-            self.fds.close()
-
 
 class PBench(RequiredTool):
     def __init__(self, parent_logger, tool_path):
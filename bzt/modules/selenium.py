@@ -34,6 +34,7 @@ from bzt.modules.functional import FunctionalResultsReader, FunctionalAggregator
 from bzt.six import string_types, parse, iteritems
 from bzt.utils import RequiredTool, shell_exec, shutdown_process, JavaVM, TclLibrary, PythonGenerator, Node
 from bzt.utils import dehumanize_time, MirrorsManager, is_windows, BetterDict, get_full_path, get_files_recursive
+from bzt.utils import FileReader
 
 try:
     from pyvirtualdisplay.smartdisplay import SmartDisplay as Display
@@ -1429,44 +1430,16 @@ class JUnitMirrorsManager(MirrorsManager):
 class LDJSONReader(object):
     def __init__(self, filename, parent_log):
         self.log = parent_log.getChild(self.__class__.__name__)
-        self.filename = filename
-        self.fds = None
-        self.partial_buffer = ""
-        self.offset = 0
+        self.file = FileReader(filename, self.log)
 
     def read(self, last_pass=False):
-        if not self.fds and not self.__open_fds():
+        if not self.file.is_ready():
             self.log.debug("No data to start reading yet")
             return
 
-        self.fds.seek(self.offset)
-        if last_pass:
-            lines = self.fds.readlines()  # unlimited
-        else:
-            lines = self.fds.readlines(1024 * 1024)
-        self.offset = self.fds.tell()
-
-        for line in lines:
-            if not line.endswith("\n"):
-                self.partial_buffer += line
-                continue
-            line = "%s%s" % (self.partial_buffer, line)
-            self.partial_buffer = ""
+        for line in self.file.get_text_lines(last_pass):
             yield json.loads(line)
 
-    def __open_fds(self):
-        if not os.path.isfile(self.filename):
-            return False
-        fsize = os.path.getsize(self.filename)
-        if not fsize:
-            return False
-        self.fds = open(self.filename, 'rt', buffering=1)
-        return True
-
-    def __del__(self):
-        if self.fds is not None:
-            self.fds.close()
-
 
 class SeleniumReportReader(object):
     REPORT_ITEM_KEYS = ["test_case", "test_suite", "status", "start_time", "duration",
@@ -1480,6 +1453,9 @@ class SeleniumReportReader(object):
         self.json_reader = LDJSONReader(filename, self.log)
         self.translation_table = translation_table or {}
 
+    def get_results_files(self):
+        return [self.json_reader.file.filename]
+
     def process_label(self, label):
         if label in self.translation_table:
             return self.translation_table[label]
@@ -1515,6 +1491,9 @@ class LoadSamplesReader(ResultsReader):
         self.report_reader = SeleniumReportReader(filename, parent_logger, translation_table)
         self.read_records = 0
 
+    def get_results_files(self):
+        return self.report_reader.get_results_files()
+
     def extract_sample(self, item):
         tstmp = int(item["start_time"])
         label = item["test_case"]
@@ -1540,6 +1519,9 @@ class FuncSamplesReader(FunctionalResultsReader):
         self.report_reader = SeleniumReportReader(filename, parent_logger, translation_table)
         self.read_records = 0
 
+    def get_results_files(self):
+        return self.report_reader.get_results_files()
+
     def read(self, last_pass=False):
         for row in self.report_reader.read(last_pass):
             self.read_records += 1
@@ -0,0 +1,106 @@
+// Taurus results sender: streams every sample to Taurus as compact binary record, see JTLSocketReader.
+// Sampler threads only put records into bounded queue and never wait for the socket, records that don't fit
+// into full queue are dropped and their total count is sent as record with negative timestamp.
+// Single writer thread sends queued records, shutdown hook sends the rest when JMeter exits.
+// Parameters: <host> <port> <queue size>
+import java.io.BufferedOutputStream
+import java.io.ByteArrayOutputStream
+import java.io.DataOutputStream
+import java.io.IOException
+import java.net.Socket
+import java.util.concurrent.ArrayBlockingQueue
+import java.util.concurrent.TimeUnit
+import java.util.concurrent.atomic.AtomicLong
+
+class TaurusResultsSender implements Runnable {
+    static final byte[] EMPTY_STRINGS = new byte[6]  // three empty writeUTF() strings
+
+    final ArrayBlockingQueue<byte[]> queue
+    final DataOutputStream stream
+    final AtomicLong dropped = new AtomicLong()
+    long sentDropped = 0
+    boolean failed = false
+
+    TaurusResultsSender(String host, int port, int queueSize) {
+        queue = new ArrayBlockingQueue<byte[]>(queueSize)
+        stream = new DataOutputStream(new BufferedOutputStream(new Socket(host, port).getOutputStream(), 65536))
+    }
+
+    void offer(byte[] record) {
+        if (!queue.offer(record)) {
+            dropped.incrementAndGet()
+        }
+    }
+
+    void run() {
+        while (!failed) {
+            send(100)
+        }
+    }
+
+    synchronized void send(long timeout) {
+        try {
+            byte[] record = queue.poll(timeout, TimeUnit.MILLISECONDS)
+            List<byte[]> records = new ArrayList<byte[]>()
+            if (record != null) {
+                records.add(record)
+            }
+            queue.drainTo(records)
+            for (byte[] item : records) {
+                stream.write(item)
+            }
+
+            long droppedNow = dropped.get()
+            if (droppedNow > sentDropped) {
+                stream.writeLong(-1)
+                stream.writeLong(droppedNow)
+                stream.write(new byte[29])  // rest of header: three int64, int32 and bool
+                stream.write(EMPTY_STRINGS)
+                sentDropped = droppedNow
+            }
+            stream.flush()
+        } catch (IOException ignored) {
+            failed = true  // Taurus has closed connection, further records are dropped
+        } catch (InterruptedException ignored) {
+            failed = true
+        }
+    }
+}
+
+def key = "taurus.results.sender." + args[1]
+def sender = props.get(key)
+if (sender == null) {
+    synchronized (props) {
+        sender = props.get(key)
+        if (sender == null) {
+            sender = new TaurusResultsSender(args[0], args[1] as int, args[2] as int)
+            def writer = new Thread(sender, "taurus-results-sender")
+            writer.setDaemon(true)
+            writer.start()
+            def finalSender = sender
+            Runtime.getRuntime().addShutdownHook(new Thread({ finalSender.send(0) } as Runnable))
+            props.put(key, sender)
+        }
+    }
+}
+
+def writeString = { DataOutputStream data, String value ->
+    value = value == null ? "" : value
+    data.writeUTF(value.length() > 1024 ? value.substring(0, 1024) : value)
+}
+
+def res = sampleResult
+def buffer = new ByteArrayOutputStream(256)
+def data = new DataOutputStream(buffer)
+data.writeLong(res.getTimeStamp())
+data.writeLong(res.getTime())
+data.writeLong(res.getLatency())
+data.writeLong(res.getConnectTime())
+data.writeLong(res.getBytesAsLong())
+data.writeInt(res.getAllThreads())
+data.writeBoolean(res.isSuccessful())
+writeString(data, res.getSampleLabel())
+writeString(data, res.getResponseCode())
+writeString(data, res.getResponseMessage())
+
+sender.offer(buffer.toByteArray())
@@ -1,20 +1,26 @@
 #! /usr/bin/env python2
-import csv
 import json
 import os
+import sys
 import time
-from collections import OrderedDict
+from collections import Counter
 
+import gevent
 from locust import main, events, runners
 from locust.exception import StopLocust
 from requests.exceptions import HTTPError
 
 
 class LocustStarter(object):
+    """
+    Aggregates samples in-process per second and label, one record per second is written.
+    Record contains counts, response codes, errors, bytes and histogram of response times in ms.
+    """
+
     def __init__(self):
         super(LocustStarter, self).__init__()
         self.fhd = None
-        self.writer = None
+        self.seconds = {}
         if os.getenv("LOCUST_DURATION"):
             self.locust_start_time = time.time()
             self.locust_duration = float(os.getenv("LOCUST_DURATION"))
@@ -28,68 +34,107 @@ class LocustStarter(object):
                 raise StopLocust('Duration limit reached')
 
     @staticmethod
-    def __getrec(request_type, name, response_time, response_length, exc=None):
+    def __get_error(exc):
         rcode = '200' if exc is None else '500'
-        rmsg = 'OK' if exc is None else '%s' % exc
+        rmsg = None if exc is None else '%s' % exc
         if isinstance(exc, HTTPError):
             rcode = exc.message[:exc.message.index(' ')]
             rmsg = exc.message[exc.message.index(':') + 2:]
-
-        return OrderedDict([
-            ('timeStamp', "%d" % (time.time() * 1000)),
-            ('label', name),
-            ('method', request_type),
-            ('elapsed', response_time),
-            ('bytes', response_length),
-            ('responseCode', rcode),
-            ('responseMessage', rmsg),
-            ('success', 'true' if exc is None else 'false'),
-
-            # NOTE: might be resource-consuming
-            ('allThreads', runners.locust_runner.user_count if runners.locust_runner else 0),
-            ('Latency', 0),
-        ])
+        return rcode, rmsg
+
+    def __add_sample(self, name, response_time, response_length, exc=None):
+        labels = self.seconds.setdefault(int(time.time()), {})
+        stats = labels.get(name)
+        if stats is None:
+            stats = labels[name] = {"count": 0, "fail": 0, "bytes": 0, "rt": Counter(), "rc": Counter(),
+                                    "errors": Counter()}
+
+        rcode, rmsg = self.__get_error(exc)
+        stats["count"] += 1
+        stats["bytes"] += response_length or 0
+        stats["rt"][int(round(response_time or 0))] += 1
+        stats["rc"][rcode] += 1
+        if exc is not None:
+            stats["fail"] += 1
+            stats["errors"][(rmsg, rcode)] += 1
 
     def __on_request_success(self, request_type, name, response_time, response_length):
-        self.writer.writerow(self.__getrec(request_type, name, response_time, response_length))
-        self.fhd.flush()
+        self.__add_sample(name, response_time, response_length)
         self.__check_duration()
 
     def __on_request_failure(self, request_type, name, response_time, exception):
-        self.writer.writerow(self.__getrec(request_type, name, response_time, 0, exception))
-        self.fhd.flush()
+        self.__add_sample(name, response_time, 0, exception)
         self.__check_duration()
 
     def __on_slave_report(self, client_id, data):
-        if data['stats'] or data['errors']:
+        if data['stats'] or data['errors'] or data.get('taurus'):
             data['client_id'] = client_id
             self.fhd.write("%s\n" % json.dumps(data))
             self.fhd.flush()
 
+    def __on_report_to_master(self, client_id, data):
+        data['taurus'] = self.__pop_records(int(time.time()))
+
+    def __pop_records(self, before=None):
+        records = []
+        user_count = runners.locust_runner.user_count if runners.locust_runner else 0
+        for tstmp in sorted(self.seconds.keys()):
+            if before is not None and tstmp >= before:
+                break
+
+            labels = {}
+            for label, stats in self.seconds.pop(tstmp).items():
+                labels[label] = {
+                    "count": stats["count"],
+                    "fail": stats["fail"],
+                    "bytes": stats["bytes"],
+                    "rt": stats["rt"],
+                    "rc": stats["rc"],
+                    "errors": [[msg, rcode, cnt] for (msg, rcode), cnt in stats["errors"].items()],
+                }
+            records.append({"ts": tstmp, "user_count": user_count, "labels": labels})
+        return records
+
+    def __write_records(self, before=None):
+        for record in self.__pop_records(before):
+            self.fhd.write("%s\n" % json.dumps(record))
+        self.fhd.flush()
+
+    def __write_loop(self):
+        while True:
+            gevent.sleep(1)
+            self.__write_records(int(time.time()))
+
     def execute(self):
+        if '--slave' in sys.argv:  # records are sent to master within regular reports
+            events.request_success += self.__on_request_success
+            events.request_failure += self.__on_request_failure
+            events.report_to_master += self.__on_report_to_master
+            main.main()
+            return
+
         if os.getenv("SLAVES_LDJSON"):
             fname = os.getenv("SLAVES_LDJSON")
-            is_csv = False
-        elif os.getenv("JTL"):
-            fname = os.getenv("JTL")
-            is_csv = True
+            is_master = True
+        elif os.getenv("STATS_LDJSON"):
+            fname = os.getenv("STATS_LDJSON")
+            is_master = False
         else:
-            raise ValueError("Please specify JTL or SLAVES_LDJSON environment variable")
+            raise ValueError("Please specify STATS_LDJSON or SLAVES_LDJSON environment variable")
 
         with open(fname, 'wt') as self.fhd:
-            if is_csv:
-                self.writer = csv.DictWriter(self.fhd, self.__getrec(None, None, None, None).keys())
-                self.writer.writeheader()
-                self.fhd.flush()
+            if is_master:
+                events.slave_report += self.__on_slave_report
             else:
-                self.writer = None  # FIXME: bad code design, have zero object for it
-
-            events.request_success += self.__on_request_success
-            events.request_failure += self.__on_request_failure
-            events.slave_report += self.__on_slave_report
-
-            main.main()
-            self.fhd.flush()
+                events.request_success += self.__on_request_success
+                events.request_failure += self.__on_request_failure
+                gevent.spawn(self.__write_loop)
+
+            try:
+                main.main()
+            finally:
+                if not is_master:
+                    self.__write_records()
 
 
 if __name__ == '__main__':
@@ -91,3 +91,10 @@ def unicode_decode(string):
         return string.decode('utf-8')
     else:
         return string
+
+
+def accumulate(iterable):
+    total = 0
+    for element in iterable:
+        total += element
+        yield total
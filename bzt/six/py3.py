@@ -23,6 +23,7 @@ import collections
 import traceback
 import urllib
 from io import IOBase
+from itertools import accumulate
 
 import urllib.error
 import urllib.request
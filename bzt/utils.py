@@ -17,6 +17,9 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 import csv
+import ctypes
+import ctypes.util
+import errno
 import fnmatch
 import itertools
 import json
@@ -26,12 +29,14 @@ import os
 import platform
 import random
 import re
+import select
 import shlex
 import signal
 import socket
 import stat
 import subprocess
 import sys
+import struct
 import tempfile
 import time
 import webbrowser
@@ -50,7 +55,7 @@ from psutil import Popen
 from urwid import BaseScreen
 
 from bzt import TaurusInternalException, TaurusNetworkError, ToolError
-from bzt.six import string_types, iteritems, binary_type, text_type, b, integer_types, request, file_type, etree
+from bzt.six import string_types, iteritems, binary_type, text_type, b, integer_types, request, file_type, etree, PY2
 
 
 def get_full_path(path, step_up=0):
@@ -482,6 +487,20 @@ class JSONDumpable(object):
     pass
 
 
+class JSONConvertible(object):
+    """
+    Base class for objects that provide their own json representation
+    """
+    __slots__ = ()
+
+    @abstractmethod
+    def __json__(self):
+        """
+        :return: object of basic types to dump instead of self
+        """
+        pass
+
+
 class ComplexEncoder(json.JSONEncoder):
     """
     Magic class to help serialize in JSON any object.
@@ -496,7 +515,9 @@ class ComplexEncoder(json.JSONEncoder):
         :return:
         """
 
-        if self.__dumpable(obj):
+        if isinstance(obj, JSONConvertible):
+            return obj.__json__()
+        elif self.__dumpable(obj):
             res = {}
             for key, val in iteritems(obj.__dict__):
                 if not self.__dumpable(val):
@@ -788,8 +809,8 @@ class IncrementableProgressBar(ProgressBarContext):
     def __init__(self, maxval):
         super(IncrementableProgressBar, self).__init__(maxval=maxval)
 
-    def increment(self):
-        incremented = self.currval + 1
+    def increment(self, count=1):
+        incremented = self.currval + count
         if incremented < self.maxval:
             super(IncrementableProgressBar, self).update(incremented)
 
@@ -1007,6 +1028,292 @@ def is_piped(file_obj):
     return stat.S_ISFIFO(mode) or stat.S_ISREG(mode)
 
 
+class FileReader(object):
+    """
+    Incremental reader of a file that is being written by some tool.
+
+    Reads binary chunks from raw file descriptor, chunk size adapts to the speed of file growth.
+    Survives file truncation (reads it from the start) and rotation (reads old file to the end,
+    then switches to the new one). Unfinished last line is kept until the rest of it is written.
+
+    :type filename: str
+    """
+    MIN_CHUNK = 1024 * 1024
+    MAX_CHUNK = 8 * 1024 * 1024
+
+    def __init__(self, filename, parent_logger, encoding="utf-8"):
+        self.log = parent_logger.getChild(self.__class__.__name__)
+        self.filename = filename
+        self.encoding = encoding
+        self.fds = None
+        self.offset = 0
+        self.chunk_size = self.MIN_CHUNK
+        self.partial_line = b""
+
+    def is_ready(self):
+        """
+        Open file when it appears and has some data
+
+        :rtype: bool
+        """
+        if self.fds is not None:
+            return True
+
+        if not os.path.isfile(self.filename):
+            self.log.debug("File not appeared yet: %s", self.filename)
+            return False
+
+        if not os.path.getsize(self.filename):
+            self.log.debug("File is empty: %s", self.filename)
+            return False
+
+        self.log.debug("Opening file: %s", self.filename)
+        self.fds = os.open(self.filename, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+        return True
+
+    def get_bytes(self, last_pass=False):
+        """
+        Read next chunk of file, unlimited one on last pass
+
+        :rtype: bytes
+        """
+        if not self.is_ready():
+            return b""
+
+        available = self.__get_available()
+        size = available if last_pass else min(available, self.chunk_size)
+        if size <= 0:
+            return b""
+
+        if hasattr(os, "pread"):
+            data = os.pread(self.fds, size, self.offset)
+        else:
+            os.lseek(self.fds, self.offset, os.SEEK_SET)
+            data = os.read(self.fds, size)
+        self.offset += len(data)
+
+        if len(data) >= self.chunk_size:
+            self.chunk_size = min(self.MAX_CHUNK, self.chunk_size * 2)
+        elif len(data) < self.chunk_size / 2:
+            self.chunk_size = max(self.chunk_size // 2, self.MIN_CHUNK)
+        self.log.debug("Read %s bytes from %s (chunk size %s)", len(data), self.filename, self.chunk_size)
+        return data
+
+    def get_text(self, last_pass=False):
+        """
+        Read complete lines and decode them at once
+
+        :rtype: str
+        """
+        data, end = self.__get_complete_lines(last_pass)
+        if PY2:
+            return data[:end]
+        return data[:end].decode(self.encoding, "replace")
+
+    def get_text_lines(self, last_pass=False):
+        """
+        Read complete lines, line ends are removed
+
+        :rtype: list[str]
+        """
+        return self.get_text(last_pass).split("\n")[:-1]
+
+    def close(self):
+        if self.fds is not None:
+            os.close(self.fds)
+            self.fds = None
+
+    def __get_complete_lines(self, last_pass):
+        data = self.get_bytes(last_pass)
+        if self.partial_line:
+            data = self.partial_line + data
+        end = data.rfind(b"\n") + 1
+        self.partial_line = data[end:]
+        return data, end
+
+    def __get_available(self):
+        """
+        Size of data left to read, handles truncation and rotation
+        """
+        size = os.fstat(self.fds).st_size
+        if size < self.offset:
+            self.log.info("File was truncated, reading it from the start: %s", self.filename)
+            self.offset = 0
+            self.partial_line = b""
+        elif size == self.offset and self.__is_rotated():
+            self.log.info("File was rotated, switching to new one: %s", self.filename)
+            if self.partial_line:
+                self.log.debug("Dropping unfinished line: %s", self.partial_line)
+            self.close()
+            self.offset = 0
+            self.partial_line = b""
+            if not self.is_ready():
+                return 0
+            size = os.fstat(self.fds).st_size
+        return size - self.offset
+
+    def __is_rotated(self):
+        try:
+            new_stat = os.stat(self.filename)
+        except OSError:
+            return False  # not created yet
+        old_stat = os.fstat(self.fds)
+        return (new_stat.st_dev, new_stat.st_ino) != (old_stat.st_dev, old_stat.st_ino)
+
+    def __del__(self):
+        self.close()
+
+
+class INotify(object):
+    """
+    Minimal ctypes binding to Linux inotify API
+    """
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, name length
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fds = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fds < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    @staticmethod
+    def is_available():
+        return sys.platform.startswith("linux")
+
+    def fileno(self):
+        return self.fds
+
+    def add_watch(self, path, mask):
+        """
+        :return: watch descriptor
+        :rtype: int
+        """
+        wdes = self.libc.inotify_add_watch(self.fds, path.encode(sys.getfilesystemencoding()), mask)
+        if wdes < 0:
+            raise OSError(ctypes.get_errno(), "Failed to watch %s" % path)
+        return wdes
+
+    def read_events(self):
+        """
+        Read pending events
+
+        :return: list of (watch descriptor, mask, file name) tuples
+        """
+        events = []
+        while True:
+            try:
+                data = os.read(self.fds, 64 * 1024)
+            except OSError as exc:
+                if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return events
+                raise
+
+            pos = 0
+            while pos < len(data):
+                wdes, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, pos)
+                pos += self.EVENT_HEADER.size
+                name = data[pos:pos + name_len].rstrip(b"\0").decode(sys.getfilesystemencoding())
+                pos += name_len
+                events.append((wdes, mask, name))
+
+    def close(self):
+        if self.fds >= 0:
+            os.close(self.fds)
+            self.fds = -1
+
+
+class FileChangesWaiter(object):
+    """
+    Sleeps until some of watched files are written or timeout passes.
+
+    Uses inotify where available, otherwise just sleeps. Files are watched via their
+    directories, so files that don't exist yet or get rotated are noticed as well.
+    """
+    WATCH_MASK = INotify.IN_MODIFY | INotify.IN_CLOSE_WRITE | INotify.IN_MOVED_TO | INotify.IN_CREATE
+
+    def __init__(self, parent_logger):
+        self.log = parent_logger.getChild(self.__class__.__name__)
+        self.inotify = None
+        self.watches = {}  # dir name -> watch descriptor
+        self.watched_names = {}  # watch descriptor -> file names in dir
+        if INotify.is_available():
+            try:
+                self.inotify = INotify()
+            except (OSError, AttributeError) as exc:  # no inotify in libc
+                self.log.debug("Can't use inotify, falling back to polling: %s", exc)
+
+    def watch(self, filenames):
+        """
+        Watch for given files, directory watches are added as directories appear
+        """
+        if not self.inotify:
+            return
+
+        self.watched_names = {}
+        for filename in filenames:
+            dirname, name = os.path.split(os.path.abspath(filename))
+            if dirname not in self.watches:
+                if not os.path.isdir(dirname):
+                    continue
+                try:
+                    self.watches[dirname] = self.inotify.add_watch(dirname, self.WATCH_MASK)
+                except OSError as exc:
+                    self.log.debug("Can't watch %s: %s", dirname, exc)
+                    continue
+                self.log.debug("Watching directory: %s", dirname)
+            self.watched_names.setdefault(self.watches[dirname], set()).add(name)
+
+    def wait(self, timeout, min_delay=0):
+        """
+        Sleep until some watched file is written, but not less than `min_delay`, so bursts
+        of writes cause single wake up. Without inotify sleeps for whole `timeout`.
+
+        :type timeout: float
+        :type min_delay: float
+        :return: True if woken up by file change
+        :rtype: bool
+        """
+        if not self.inotify:
+            time.sleep(timeout)
+            return False
+
+        start = time.time()
+        deadline = start + timeout
+        while True:
+            left = deadline - time.time()
+            if left <= 0:
+                return False
+
+            readable, _, _ = select.select([self.inotify], [], [], left)
+            if readable and self.__has_watched_changes():
+                break
+
+        coalesce = min(start + min_delay, deadline) - time.time()
+        if coalesce > 0:
+            time.sleep(coalesce)
+        self.inotify.read_events()  # the rest of burst
+        return True
+
+    def __has_watched_changes(self):
+        for wdes, _, name in self.inotify.read_events():
+            if name in self.watched_names.get(wdes, ()):
+                return True
+        return False
+
+    def close(self):
+        if self.inotify:
+            self.inotify.close()
+            self.inotify = None
+        self.watches = {}
+        self.watched_names = {}
+
+
 class PythonGenerator(object):
     IMPORTS = ''
 
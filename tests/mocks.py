@@ -13,7 +13,7 @@ from tests import random_sample
 
 from bzt.engine import Engine, Configuration, FileLister, HavingInstallableTools
 from bzt.engine import Provisioning, ScenarioExecutor, Reporter
-from bzt.modules.aggregator import ResultsReader, AggregatorListener
+from bzt.modules.aggregator import ResultsReader, AggregatorListener, SamplesBatch
 from bzt.modules.functional import FunctionalResultsReader
 from bzt.six import u
 from bzt.utils import load_class, to_json
@@ -194,6 +194,26 @@ class MockReader(ResultsReader, AggregatorListener):
         self.results.append(data)
 
 
+class MockBatchReader(MockReader):
+    """
+    test
+    """
+
+    def _read(self, final_pass=False):
+        """
+        Emulating read samples in batches
+
+        :type final_pass: bool
+        :return:
+        """
+        batch = SamplesBatch()
+        for sample in self.data:
+            batch.append(*sample)
+        del self.data[:]
+        if batch:
+            yield batch
+
+
 class MockFunctionalReader(FunctionalResultsReader):
     def __init__(self):
         super(MockFunctionalReader, self).__init__()
@@ -408,6 +408,20 @@ class TestDataLogReader(BZTestCase):
         self.assertEqual(len(list_of_values), 23)
         self.assertEqual(obj.guessed_gatling_version, "2.1")
 
+    def test_read_21_record_types(self):
+        obj = DataLogReader("", logging.getLogger(''), 'gatling-0')
+        lines = [
+            "REQUEST\tREQUEST\tUSER\tSTART\t1452080822967\t0",  # names look like record types
+            "Scenario\t1-0\tUSER\tSTART\t1452080822968\t0",
+            "Scenario\t1-0\tREQUEST\t\tUSER\t1452080822987\t1452080822996\t1452080822998\t1452080822998\tOK\t ",
+            "Scenario\t1-0\tUSER\tEND\t1452080822968\t1452080823000",
+        ]
+        batch = obj._parse_gatling_21(lines)
+        self.assertEqual(1, len(batch))
+        self.assertEqual(["USER"], batch.labels)
+        self.assertEqual([2], list(batch.concurrencies))
+        self.assertEqual(1, obj.concurrency)
+
     def test_read_220_format(self):
         log_path = os.path.join(os.path.dirname(__file__), '..', 'gatling')
         obj = DataLogReader(log_path, logging.getLogger(''), 'gatling-220')
@@ -3,6 +3,8 @@ import json
 import logging
 import os
 import shutil
+import socket
+import struct
 import sys
 import time
 from math import ceil
@@ -14,7 +16,7 @@ from bzt.jmx import JMX
 from bzt.modules.aggregator import ConsolidatingAggregator, DataPoint
 from bzt.modules.blazemeter import CloudProvisioning
 from bzt.modules.functional import FunctionalAggregator
-from bzt.modules.jmeter import JMeterExecutor, JTLErrorsReader, JTLReader, FuncJTLReader
+from bzt.modules.jmeter import JMeterExecutor, JTLErrorsReader, JTLReader, FuncJTLReader, JTLSocketReader
 from bzt.modules.jmeter import JMeterScenarioBuilder
 from bzt.modules.provisioning import Local
 from bzt.six import etree, u
@@ -582,6 +584,32 @@ class TestJMeterExecutor(BZTestCase):
         values = obj.get_data(sys.maxsize)
         self.assertEquals(3, len(values))
 
+    def test_errors_streaming(self):
+        errors_jtl = self.obj.engine.create_artifact("errors", ".jtl")
+        obj = JTLErrorsReader(errors_jtl, logging.getLogger(''))
+        sample = '<httpSample t="1" ts="%s" s="%s" lb="%s" rc="500" rm="%s">' \
+                 '<responseData class="java.lang.String">%s</responseData></httpSample>\n'
+        with open(errors_jtl, 'w') as fds:
+            fds.write('<?xml version="1.0" encoding="UTF-8"?>\n<testResults version="1.2">\n')
+            fds.write(sample % (3000, "false", "first", "late", "x" * 100))
+            fds.write(sample % (1000, "true", "ok", "", "x" * 100))
+            fds.write(sample % (2000, "false", "second", "early", "x" * 100))
+            fds.write(sample % (1000, "false", "second", "earliest", "x" * 100))
+            fds.flush()
+
+            obj.read_file()
+            self.assertEqual([1, 2, 3], list(obj.timestamps))
+            self.assertEqual(['earliest', 'early'], [err['msg'] for err in obj.get_data(2)['']])
+            self.assertNotIn('ok', obj.get_data(sys.maxsize))
+
+            fds.write(sample % (4000, "false", "third", "last", "x" * 100))
+            fds.write('</testResults>\n')
+
+        obj.read_file()
+        values = obj.get_data(sys.maxsize)
+        self.assertEqual(['last'], [err['msg'] for err in values['']])
+        self.assertFalse(obj.failed_processing)
+
     def test_tranctl_jtl(self):
         obj = JTLReader(__dir__() + "/../jmeter/jtl/tranctl.jtl", logging.getLogger(''), None)
         values = [x for x in obj.datapoints(True)]
@@ -592,6 +620,78 @@ class TestJMeterExecutor(BZTestCase):
         values = [x for x in obj.datapoints(True)]
         self.assertEquals(4, len(values))
 
+    def test_quoted_distributed_jtl(self):
+        jtl = self.obj.engine.create_artifact("kpi", ".jtl")
+        with open(jtl, 'w') as fds:
+            fds.write("timeStamp,elapsed,label,responseCode,responseMessage,threadName,success,bytes,"
+                      "grpThreads,allThreads,Latency,Connect,Hostname\n")
+            fds.write('1431534938725,264,first,200,OK,TG 1-1,true,100,1,2,10,5,host1\n')
+            fds.write('1431534938734,998,"second, quoted",500,"multi\nline, ""message""",TG 1-2,false,100,'
+                      '1,2,10,5,host2\n')
+            fds.write('1431534938734,998,third,200,OK,TG 1-1,true,100,1,2,10,5,host1\n')
+
+        obj = JTLReader(jtl, logging.getLogger(''), None)
+        obj.is_distributed = True
+        samples = list(obj._read(True))[0]
+        self.assertEqual(['first', 'second, quoted', 'third'], samples.labels)
+        self.assertEqual(['host1TG 1', 'host2TG 1', 'host1TG 1'], samples.trnames)
+        self.assertEqual([None, 'multi\nline, "message"', None], samples.errors)
+        self.assertEqual([1, 1, 1], list(samples.concurrencies))
+
+    def test_socket_reader(self):
+        def record(tstmp, label, success, rcd, msg):
+            strings = b"".join(struct.pack(">H", len(val)) + val for val in (label, rcd, msg))
+            return struct.pack(">qqqqqi?", tstmp, 264, 10, 5, 100, 2, success) + strings
+
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        kpi_jtl = self.obj.engine.create_artifact("kpi", ".jtl")
+        obj = JTLSocketReader(server, logging.getLogger(''), None, kpi_jtl)
+        client = socket.create_connection(server.getsockname())
+        try:
+            first = record(1431534938725, b"first", True, b"200", b"OK")
+            dropped = record(-1, b"", False, b"", b"")  # count of samples dropped by sender
+            data = first + dropped + record(1431534938734, u("\u0441econd").encode('utf-8'), False, b"java.net.ConnectException",
+                           b"refused")
+            client.sendall(data[:-3])
+            time.sleep(0.1)
+            samples = list(obj._read())[0]
+            self.assertEqual(['first'], samples.labels)
+            self.assertEqual(len(data) - len(first) - len(dropped) - 3, len(obj.received))
+
+            client.sendall(data[-3:])
+            client.close()
+            time.sleep(0.1)
+            samples = list(obj._read(True))[0]
+        finally:
+            client.close()
+        self.assertEqual([u("\u0441econd")], samples.labels)
+        self.assertEqual(['ConnectException'], samples.r_codes)
+        self.assertEqual(['refused'], samples.errors)
+        self.assertEqual([1431534938], list(samples.timestamps))
+        self.assertEqual([0.005], list(samples.latencies))
+        self.assertEqual(2, obj.read_records)
+        self.assertEqual(264, obj.dropped)
+        self.assertIsNone(obj.server)
+
+        jtl_reader = JTLReader(kpi_jtl, logging.getLogger(''), None)  # received samples are kept on disk
+        points = list(jtl_reader.datapoints(True))
+        self.assertEqual(2, jtl_reader.read_records)
+        self.assertEqual(['', 'first', u("\u0441econd")], sorted(points[-1][DataPoint.CUMULATIVE].keys()))
+
+    def test_socket_transport(self):
+        self.obj.engine.aggregator = ConsolidatingAggregator()
+        self.obj.settings.merge({"results-transport": "socket"})
+        self.obj.execution.merge({"scenario": {"script": __dir__() + "/../jmeter/jmx/http.jmx"}})
+        self.obj.prepare()
+        self.assertIsInstance(self.obj.reader, JTLSocketReader)
+        self.assertEqual(self.obj.kpi_jtl, self.obj.reader.kpi_filename)
+        jmx = JMX(self.obj.modified_jmx)
+        self.assertEqual(jmx.get('ResultCollector[testname="KPI Writer"]'), [])
+        params = jmx.get('JSR223Listener[testname="KPI Sender"]>stringProp[name="parameters"]')[0].text
+        self.assertEqual("127.0.0.1 %s 100000" % self.obj.results_socket.getsockname()[1], params)
+
     def test_distributed_th_hostnames(self):
         self.obj.execution.merge({"scenario": {"script": __dir__() + "/../jmeter/jmx/http.jmx"}})
         self.obj.distributed_servers = ["127.0.0.1", "127.0.0.1"]
@@ -13,7 +13,6 @@ from bzt.engine import ScenarioExecutor
 from bzt.modules.provisioning import Local
 from bzt.modules.selenium import NoseTester, JavaTestRunner, JUnitTester, TestNGTester
 from bzt.modules.selenium import SeleniumExecutor, JUnitJar, LoadSamplesReader, LDJSONReader, FuncSamplesReader
-from bzt.six import StringIO
 from bzt.utils import is_windows, get_full_path
 from tests import BZTestCase, local_paths_config, __dir__
 from tests.mocks import EngineEmul
@@ -1196,14 +1195,17 @@ class TestReportReader(BZTestCase):
     def test_reader_buffering(self):
         first_part = '{"a": 1, "b": 2}\n{"a": 2,'
         second_part = '"b": 3}\n{"a": 3, "b": 4}\n'
-        reader = LDJSONReader("yip", logging.getLogger())
-        buffer = StringIO(first_part)
-        reader.fds = buffer
+        engine = EngineEmul()
+        filename = engine.create_artifact("report", ".ldjson")
+        reader = LDJSONReader(filename, logging.getLogger())
+        with open(filename, 'w') as fds:
+            fds.write(first_part)
 
         items = list(reader.read(last_pass=False))
         self.assertEqual(len(items), 1)
 
-        buffer.write(second_part)
+        with open(filename, 'a') as fds:
+            fds.write(second_part)
         items = list(reader.read(last_pass=False))
         self.assertEqual(len(items), 2)
 
@@ -2,6 +2,7 @@ import json
 import logging
 import math
 import shutil
+import threading
 import time
 from io import BytesIO
 
@@ -11,8 +12,8 @@ from tests import BZTestCase, random_datapoint, __dir__
 from bzt.bza import Master, Session
 from bzt.modules.aggregator import DataPoint, KPISet
 from bzt.modules.blazemeter import BlazeMeterUploader, ResultsFromBZA
-from bzt.modules.blazemeter import MonitoringBuffer
-from bzt.six import HTTPError
+from bzt.modules.blazemeter import MonitoringBuffer, DatapointSerializer
+from bzt.six import HTTPError, BaseHTTPServer
 from bzt.six import iteritems, viewvalues
 from tests.mocks import EngineEmul, RecordingHandler, BZMock
 
@@ -390,6 +391,218 @@ class TestBlazeMeterUploader(BZTestCase):
         self.assertEquals('POST', mock.requests[6]['method'])
 
 
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.server.failures:
+            self.server.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        if 'submit.php' in self.path:
+            self.server.bodies.append(json.loads(body.decode('utf-8')))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class StandInServer(BaseHTTPServer.HTTPServer):
+    """ Local stand-in for BlazeMeter data server, fails first requests """
+
+    def __init__(self, failures):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StandInHandler)
+        self.failures = failures
+        self.bodies = []
+        self.address = 'http://127.0.0.1:%s' % self.server_address[1]
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+class TestKPISender(BZTestCase):
+    def test_background_send(self):
+        server = StandInServer(failures=2)
+        obj = BlazeMeterUploader()
+        obj.engine = EngineEmul()
+        obj.parameters['session-id'] = 'direct'
+        obj.parameters['signature'] = 'sign'
+        obj.settings['address'] = server.address
+        obj.settings['data-address'] = server.address
+        obj.settings['send-monitoring'] = False
+        obj.settings['background-send'] = True
+        obj.settings['send-queue-limit'] = 2
+        obj.settings['gzip-requests'] = True
+        try:
+            obj.prepare()
+            self.assertTrue(obj._session.gzip_requests)
+            obj.startup()
+            self.assertIsNot(obj._session.http_session, obj.sender.session.http_session)
+            self.assertIs(obj._session.request_stats, obj.sender.session.request_stats)
+            self.assertEqual('sign', obj.sender.session.data_signature)
+            obj.sender.backoff_start = 0.05
+            for num in range(10):
+                obj.aggregated_second(random_datapoint(num))
+                obj.last_dispatch = 0
+                obj.check()  # doesn't wait for failing server
+
+            self.assertGreater(obj.sender.max_queue_depth, 2)  # reports were spilled
+            deadline = time.time() + 5
+            while not server.bodies and time.time() < deadline:
+                time.sleep(0.01)
+            self.assertTrue(server.bodies)
+
+            obj.aggregated_second(random_datapoint(10))
+            obj.shutdown()
+            obj.post_process()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertLess(len(server.bodies), 11)  # pending reports are sent together
+        self.assertTrue(server.bodies[-1]['final'])
+        timestamps = [interval['ts'] for body in server.bodies for item in body['labels'] for interval in item['intervals']]
+        self.assertEqual(list(range(11)), timestamps)  # nothing is lost or duplicated
+        self.assertEqual(0, obj.sender.get_queue_depth())
+        self.assertGreater(obj.sender.get_avg_latency(), 0)
+
+    def test_check_in_background(self):
+        server = StandInServer(failures=0)
+        obj = BlazeMeterUploader()
+        obj.engine = EngineEmul()
+        obj.parameters['session-id'] = 'direct'
+        obj.parameters['signature'] = 'sign'
+        obj.settings['address'] = server.address
+        obj.settings['data-address'] = server.address
+        obj.settings['send-monitoring'] = False
+        obj.settings['check-in-background'] = True
+        try:
+            obj.prepare()
+            self.assertTrue(obj.check_in_background)
+            obj.startup()
+            point = random_datapoint(1)
+            obj.aggregated_second(point)
+            cumulative = obj.kpi_buffer[0][DataPoint.CUMULATIVE]['']
+            self.assertIsNot(point[DataPoint.CUMULATIVE][''], cumulative)  # engine thread keeps using its own one
+            self.assertEqual(point[DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT], cumulative[KPISet.SAMPLE_COUNT])
+
+            obj.last_dispatch = time.time() - obj.send_interval + 0.1  # check is started a bit before deadline
+            obj.check()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual([1], [interval['ts'] for interval in server.bodies[0]['labels'][0]['intervals']])
+
+    def test_merge_reports(self):
+        obj = BlazeMeterUploader()
+        serializer = DatapointSerializer(obj)
+        reports = [serializer.get_kpi_report([random_datapoint(num)]) for num in range(3)]
+        merged = serializer.merge_reports(reports)
+        self.assertEqual([0, 1, 2], [interval['ts'] for interval in merged['']['intervals']])
+        self.assertEqual(reports[-1]['']['summary'], merged['']['summary'])
+        self.assertEqual(1, len(reports[-1]['']['intervals']))  # merged reports are kept intact
+
+
+class TestDatapointSerializer(BZTestCase):
+    @staticmethod
+    def get_datapoint(timestamp, labels, prev=None):
+        """ datapoint with samples for given labels only, cumulative KPIs of other labels are kept from prev """
+        point = random_datapoint(timestamp)
+        overall = point[DataPoint.CURRENT]['']
+        cumulative = point[DataPoint.CUMULATIVE]['']
+        point[DataPoint.CURRENT].clear()
+        point[DataPoint.CUMULATIVE].clear()
+        if prev is not None:
+            point[DataPoint.CUMULATIVE].update(prev[DataPoint.CUMULATIVE])
+        for label in labels:
+            point[DataPoint.CURRENT][label] = overall
+            point[DataPoint.CUMULATIVE][label] = cumulative
+        return point
+
+    def test_delta(self):
+        obj = DatapointSerializer(BlazeMeterUploader())
+        first = self.get_datapoint(1, ['', 'label1', 'label2'])
+        report = obj.get_kpi_report([first])
+        data = json.loads(obj.get_report_body(report, False))
+        self.assertEqual(['ALL', 'label1', 'label2'], [item['name'] for item in data['labels']])
+
+        second = self.get_datapoint(2, ['label2'], first)
+        data = json.loads(obj.get_kpi_body([second], False))
+        self.assertEqual(3, len(data['labels']))  # first report wasn't sent yet
+
+        obj.commit_report(report)
+        data = json.loads(obj.get_kpi_body([second], False))
+        self.assertEqual(['label2'], [item['name'] for item in data['labels']])  # untouched labels are skipped
+        self.assertEqual([2], [interval['ts'] for interval in data['labels'][0]['intervals']])
+
+        third = self.get_datapoint(3, [], second)
+        data = json.loads(obj.get_kpi_body([third], True))
+        self.assertEqual(['ALL', 'label1', 'label2'], [item['name'] for item in data['labels']])
+        self.assertTrue(data['final'])
+
+    def test_failed_send(self):
+        server = StandInServer(failures=2)
+        obj = BlazeMeterUploader()
+        obj.engine = EngineEmul()
+        obj.parameters['session-id'] = 'direct'
+        obj.parameters['signature'] = 'sign'
+        obj.settings['address'] = server.address
+        obj.settings['data-address'] = server.address
+        obj.settings['send-monitoring'] = False
+        obj.settings['timeout'] = 0.1
+        try:
+            obj.prepare()
+            obj.startup()
+            first = self.get_datapoint(1, ['', 'label1'])
+            obj.aggregated_second(first)
+            obj.check()  # request and its retry fail
+            self.assertEqual({}, obj.serializer.sent_counts)
+
+            obj.aggregated_second(self.get_datapoint(2, [''], first))
+            obj.last_dispatch = 0
+            obj.check()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(['ALL', 'label1'], [item['name'] for item in server.bodies[0]['labels']])
+        self.assertEqual(['', 'label1'], sorted(obj.serializer.sent_counts))
+
+    def test_rc_fails(self):
+        obj = DatapointSerializer(BlazeMeterUploader())
+        point = self.get_datapoint(1, [''])
+        kpi_set = point[DataPoint.CURRENT]['']
+        kpi_set[KPISet.RESP_CODES].clear()
+        kpi_set[KPISet.RESP_CODES].update({'200': 5, '404': 3, '500': 2})
+        kpi_set[KPISet.ERRORS] = [
+            {'msg': 'Not Found', 'cnt': 2, 'type': KPISet.ERRTYPE_ERROR, 'urls': [], 'rc': '404'},
+            {'msg': 'Bad', 'cnt': 1, 'type': KPISet.ERRTYPE_ASSERT, 'urls': [], 'rc': '404'},
+            {'msg': 'Fail', 'cnt': 2, 'type': KPISet.ERRTYPE_ERROR, 'urls': [], 'rc': 500}]
+        data = json.loads(obj.get_kpi_body([point], False))
+        rc_list = sorted(data['labels'][0]['intervals'][0]['rc'], key=lambda x: x['rc'])
+        self.assertEqual([{'n': 5, 'f': [], 'rc': '200'}, {'n': 3, 'f': [2, 1], 'rc': '404'},
+                          {'n': 2, 'f': [2], 'rc': '500'}], rc_list)
+
+    def test_speed(self):
+        labels = ['label%s' % num for num in range(1000)]
+        buffer = []
+        for timestamp in range(30):
+            buffer.append(self.get_datapoint(timestamp, labels, buffer[-1] if buffer else None))
+
+        obj = DatapointSerializer(BlazeMeterUploader())
+        start = time.time()
+        body = obj.get_kpi_body(buffer, False)
+        elapsed = time.time() - start
+        logging.info("KPI body for %s labels and %s seconds: %sKB in %.3fs", len(labels), len(buffer),
+                     len(body) // 1024, elapsed)
+        self.assertEqual(len(labels), len(json.loads(body)['labels']))
+
+
 class TestBlazeMeterClientUnicode(BZTestCase):
     def test_unicode_request(self):
         """
@@ -27,6 +27,7 @@ class TestCloudProvisioning(BZTestCase):
     def setUp(self):
         engine = EngineEmul()
         engine.aggregator = ConsolidatingAggregator()
+        engine.aggregator.engine = engine
         self.obj = CloudProvisioning()
         self.obj.settings.merge({'delete-test-files': False})
         self.obj.engine = engine
@@ -1,8 +1,24 @@
+import copy
+import json
+import logging
+import math
+import os
+import pickle
+import tempfile
+import time
+from collections import Counter
 from random import random
 
-from bzt.modules.aggregator import ConsolidatingAggregator, DataPoint, KPISet, AggregatorListener
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from bzt.modules.aggregator import ConsolidatingAggregator, DataPoint, KPISet, AggregatorListener, RespTimesCounter, \
+    ResultsProvider, ResultsReader, ReaderProcess
+from bzt.utils import to_json, BetterDict
 from tests import BZTestCase, r
-from tests.mocks import MockReader
+from tests.mocks import MockReader, EngineEmul
 from bzt.modules.reporting import Reporter
 
 
@@ -61,7 +77,8 @@ class TestConsolidatingAggregator(BZTestCase):
                 self.assertGreater(overall[KPISet.AVG_RESP_TIME], 0)
                 cnt += 1
 
-        self.assertEquals(2, cnt)
+        # seconds passed by both underlings are emitted without waiting for buffer
+        self.assertEquals(4, cnt)
 
     @staticmethod
     def get_success_reader(offset=0):
@@ -109,9 +126,87 @@ class TestConsolidatingAggregator(BZTestCase):
             total_errors_count = sum(err['cnt'] for err in data['errors'])
             self.assertEqual(data['fail'], total_errors_count)
 
-    def test_set_rtimes_len(self):
+    def test_cumulative_snapshots(self):
         obj = ConsolidatingAggregator()
-        obj.settings['rtimes-len'] = 42
+        obj.track_percentiles = [50]
+        obj.prepare()
+        obj.add_underling(self.get_fail_reader())
+        listener = MockListener()
+        obj.add_listener(listener)
+        obj.shutdown()
+        obj.post_process()
+
+        points = listener.results
+        self.assertEqual([1, 2, 3, 5, 6, 7], [point[DataPoint.TIMESTAMP] for point in points])
+        for prev, point in zip(points, points[1:]):
+            self.assertEqual([], point[DataPoint.SUBRESULTS])
+            for label, kpiset in point[DataPoint.CUMULATIVE].items():
+                if label in point[DataPoint.CURRENT]:
+                    if label in prev[DataPoint.CUMULATIVE]:
+                        self.assertIsNot(prev[DataPoint.CUMULATIVE][label], kpiset)
+                else:
+                    self.assertIs(prev[DataPoint.CUMULATIVE][label], kpiset)
+
+        # values of shared sets are not affected by later updates
+        self.assertEqual(1, points[0][DataPoint.CUMULATIVE]['first'][KPISet.SAMPLE_COUNT])
+        self.assertEqual(4, points[-1][DataPoint.CUMULATIVE]['first'][KPISet.SAMPLE_COUNT])
+        self.assertEqual(6, points[-1][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+
+    def test_kpiset_memory(self):
+        if tracemalloc is None:
+            return
+
+        def footprint(factory, count):
+            tracemalloc.start()
+            kpisets = {"http://host/label%s" % label: factory() for label in range(count)}
+            for kpiset in kpisets.values():
+                kpiset[KPISet.SAMPLE_COUNT] += 1
+                kpiset[KPISet.SUCCESSES] += 1
+                kpiset[KPISet.RESP_TIMES].add(0.123)
+                kpiset[KPISet.RESP_CODES]['200'] += 1
+            size = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            return size / float(count)
+
+        for count in (1000, 10000):
+            before = footprint(DictKPISet, count)
+            after = footprint(KPISet, count)
+            logging.info("Per-label footprint for %s labels: %d bytes before, %d bytes after", count, before, after)
+            self.assertLess(after, before)
+
+    def test_kpiset_mapping(self):
+        kpiset = KPISet([50.0])
+        self.assertEqual(set(KPISet.SCALARS + KPISet.VECTORS), set(kpiset.keys()))
+        self.assertEqual(0, kpiset[KPISet.SAMPLE_COUNT])
+        self.assertEqual([], kpiset.get(KPISet.ERRORS))
+        self.assertRaises(KeyError, lambda: kpiset["unknown"])
+        self.assertEqual("default", kpiset.get("unknown", "default"))
+        self.assertIn("unknown", kpiset)
+        kpiset.add_sample((1, 0.5, 0.1, 0.2, '200', None, '', 10))
+        kpiset.recalculate()
+        copied = copy.deepcopy(kpiset)
+        self.assertEqual(dict(kpiset.items())[KPISet.PERCENTILES], copied[KPISet.PERCENTILES])
+        self.assertEqual(0.5, copied[KPISet.AVG_RESP_TIME])
+        self.assertEqual(10, json.loads(to_json({"": copied}))[""][KPISet.BYTE_COUNT])
+
+    def test_kpiset_rtimes_dirty(self):
+        kpiset = KPISet([50.0])
+        kpiset.add_sample((1, 0.5, 0.1, 0.2, '200', None, '', 10))
+        kpiset.recalculate()
+        self.assertFalse(kpiset._dirty)
+        kpiset[KPISet.RESP_TIMES]  # reads have no side effects
+        self.assertFalse(kpiset._dirty)
+
+        for inst in (kpiset, copy.deepcopy(kpiset), pickle.loads(pickle.dumps(kpiset))):
+            inst[KPISet.RESP_TIMES].add(1.5)
+            self.assertTrue(inst._dirty)
+            self.assertAlmostEqual(1.5, inst[KPISet.PERCENTILES]["50.0"], delta=0.01)
+            self.assertFalse(inst._dirty)
+
+    def test_set_rtimes_digits(self):
+        obj = ConsolidatingAggregator()
+        obj.engine = EngineEmul()
+        obj.settings['rtimes-digits'] = 2
         obj.prepare()
         reader = self.get_fail_reader()
         obj.add_underling(reader)
@@ -119,21 +214,386 @@ class TestConsolidatingAggregator(BZTestCase):
         obj.add_listener(listener)
         obj.check()
         for dp in listener.results:
-            for kpiset in dp['cumulative'].values():
-                self.assertEqual(42, kpiset.rtimes_len)
-            for kpiset in dp['current'].values():
-                self.assertNotEqual(42, kpiset.rtimes_len)
+            for kpiset in list(dp['cumulative'].values()) + list(dp['current'].values()):
+                self.assertEqual(2, kpiset.rtimes_digits)
+                self.assertEqual(2, kpiset[KPISet.RESP_TIMES].sign_figures)
+
+    def test_labels_not_limited_by_default(self):
+        obj = ConsolidatingAggregator()
+        obj.prepare()
+        self.assertEqual(0, obj.label_registry.max_labels)
+        for label in range(2000):
+            obj.label_registry.resolve("label%s" % label)
+        self.assertEqual(2000, len(obj.label_registry.labels))
+
+    def test_errors_generalized(self):
+        kpiset = KPISet()
+        kpiset.add_sample((1, 0.5, 0.1, 0.2, '500', 'No user /users/1', '', 10))
+        kpiset.add_sample((1, 0.5, 0.1, 0.2, '500', 'No user /users/2', '', 10))
+        self.assertEqual(2, len(kpiset[KPISet.ERRORS]))  # messages are compared as is by default
+
+        kpiset = KPISet(generalize_errors=True)
+        for user in range(1000):
+            kpiset.add_sample((1, 0.5, 0.1, 0.2, '500', 'No user /users/%s' % user, '', 10))
+            kpiset.add_sample((1, 0.5, 0.1, 0.2, '404', 'No user /users/%s' % user, '', 10))
+        kpiset.add_sample((1, 0.5, 0.1, 0.2, '500', 'Session 6f1c2a3b4d5e6f70 expired', '', 10))
+        kpiset.add_sample((1, 0.5, 0.1, 0.2, '500', 'Session 0a1b2c3d4e5f6a7b expired', '', 10))
+        errors = kpiset[KPISet.ERRORS]
+        self.assertEqual(3, len(errors))
+        self.assertEqual('No user /users/0', errors[0]['msg'])
+        self.assertEqual([1000, 1000, 2], [err['cnt'] for err in errors])
+        self.assertEqual(['500', '404', '500'], [err['rc'] for err in errors])
+
+        dst = KPISet(generalize_errors=True)
+        dst[KPISet.ERRORS] = [KPISet.error_item_skel('No user /users/42', '500', 5, KPISet.ERRTYPE_ERROR, {})]
+        dst.merge_kpis(kpiset)
+        self.assertEqual([1005, 1000, 2], [err['cnt'] for err in dst[KPISet.ERRORS]])
+
+    def test_errors_variety_limited(self):
+        results = []
+        for max_variety in (0, 5):
+            obj = ConsolidatingAggregator()
+            obj.engine = EngineEmul()
+            if max_variety:
+                obj.settings['max-error-variety'] = max_variety
+            obj.prepare()
+            reader = MockReader()
+            for second in range(1, 10):
+                for error in range(20):
+                    for _ in range(error + 1):
+                        r_code = '500' if error % 2 else '404'
+                        reader.data.append((second, "label", 1, r(), r(), r(), r_code, 'error%s' % (error + second),
+                                            '', 0))
+            obj.add_underling(reader)
+            listener = MockListener()
+            obj.add_listener(listener)
+            obj.check()
+            obj.post_process()
+            results.append(listener.results)
+
+        unlimited, limited = results
+        self.assertEqual(20, len(unlimited[0][DataPoint.CURRENT]['label'][KPISet.ERRORS]))  # no limit by default
+        for point in limited:
+            for kpiset in list(point[DataPoint.CURRENT].values()) + list(point[DataPoint.CUMULATIVE].values()):
+                errors = kpiset[KPISet.ERRORS]
+                self.assertEqual(7, len(errors))
+                self.assertEqual([KPISet.OTHER_ERRORS] * 2, [err['msg'] for err in errors[-2:]])
+                self.assertEqual(kpiset[KPISet.FAILURES], sum(err['cnt'] for err in errors))
+                for r_code in ('404', '500'):  # other errors are counted by their response codes
+                    self.assertEqual(kpiset[KPISet.RESP_CODES][r_code],
+                                     sum(err['cnt'] for err in errors if err['rc'] == r_code))
+
+        current = limited[0][DataPoint.CURRENT]['label'][KPISet.ERRORS]
+        self.assertEqual(['error20', 'error19', 'error18', 'error17', 'error16'], [err['msg'] for err in current[:5]])
+
+    def test_consolidation_speed(self):
+        for underlings_count in (10, 25, 50):
+            obj = ConsolidatingAggregator()
+            obj.track_percentiles = [50.0, 90.0, 99.0]
+            for _ in range(underlings_count):
+                obj.add_underling(PointsProvider(5, 200))
+            obj.prepare()
+
+            start = time.time()
+            obj.post_process()
+            elapsed = time.time() - start
+            logging.info("Consolidation of %s underlings x 200 labels x 5s took %.3fs",
+                         underlings_count, elapsed)
+            overall = obj.cumulative['']
+            self.assertEqual(underlings_count * 200 * 5 * 10, overall[KPISet.SAMPLE_COUNT])
+            self.assertEqual(underlings_count, overall[KPISet.CONCURRENCY])
+
+    def test_late_underling_points(self):
+        obj = ConsolidatingAggregator()
+        obj.prepare()
+        underlings = [PointsProvider(3, 1), PointsProvider(3, 1)]
+        for underling in underlings:
+            obj.add_underling(underling)
+
+        points = list(obj.datapoints())
+        self.assertEqual([1, 2, 3], [point[DataPoint.TIMESTAMP] for point in points])
+
+        late_point = PointsProvider(2, 1).points[-1]
+        underlings[1].points.append(late_point)
+        self.assertEqual([], list(obj.datapoints()))
+
+        for underling in underlings:
+            point = PointsProvider(4, 1).points[-1]
+            point[DataPoint.SOURCE_ID] = id(underling)
+            underling.points.append(point)
+        points = list(obj.datapoints(True))
+        self.assertEqual([4], [point[DataPoint.TIMESTAMP] for point in points])
+
+        self.assertEqual(20, points[0][DataPoint.CURRENT][''][KPISet.SAMPLE_COUNT])
+        self.assertEqual(90, points[0][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+        self.assertEqual(90, points[0][DataPoint.CUMULATIVE]['label0'][KPISet.SAMPLE_COUNT])
+        self.assertEqual(10, obj.late_samples)
+        self.assertEqual(2, obj.late_lag)
+
+        underlings[0].points.append(PointsProvider(3, 1).points[-1])
+        self.assertEqual([], list(obj.datapoints(True)))  # counted in the last point
+        self.assertEqual(100, points[0][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+        self.assertEqual(20, obj.late_samples)
+
+    def test_reader_processes(self):
+        fds, filename = tempfile.mkstemp()
+        os.close(fds)
+        results = []
+        for reader_processes in (False, True):
+            with open(filename, 'w') as fds:
+                fds.write("".join("%s,label%s,0.1\n" % (1 + idx // 10, idx % 3) for idx in range(25)))
+                fds.write("3,label1,")  # incomplete line
+
+            obj = ConsolidatingAggregator()
+            obj.engine = EngineEmul()
+            obj.settings['reader-processes'] = reader_processes
+            obj.prepare()
+            readers = [LinesReader(filename), LinesReader(filename)]
+            for reader in readers:
+                obj.add_underling(reader)
+            listener = MockListener()
+            obj.add_listener(listener)
+            obj.startup()
+            self.assertEqual(reader_processes, all(isinstance(und, ReaderProcess) for und in obj.underlings))
+            obj.check()
+            time.sleep(1)
+
+            with open(filename, 'a') as fds:
+                fds.write("0.3\n")
+                fds.write("".join("%s,label%s,0.2\n" % (4 + idx // 10, idx % 5) for idx in range(20)))
+            obj.check()
+            obj.post_process()
+            results.append(listener.results)
+            self.assertEqual([46, 46], [reader.read_records for reader in readers])
+
+        in_process, in_processes = results
+        self.assertEqual(len(in_process), len(in_processes))
+        for point, point_from_processes in zip(in_process, in_processes):
+            for kind in (DataPoint.CURRENT, DataPoint.CUMULATIVE):
+                self.assertEqual(sorted(point[kind].keys()), sorted(point_from_processes[kind].keys()))
+                for label, kpiset in point[kind].items():
+                    kpiset_from_processes = point_from_processes[kind][label]
+                    for key in (KPISet.SAMPLE_COUNT, KPISet.CONCURRENCY, KPISet.RESP_CODES, KPISet.PERCENTILES):
+                        self.assertEqual(kpiset[key], kpiset_from_processes[key])
+        self.assertEqual(92, in_processes[-1][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+        os.remove(filename)
+
+    def test_percentiles_speed(self):
+        def sorting_perc_and_stdev(rtimes, percentiles, avg):
+            # former way: sort all buckets and walk over them for each recalculation
+            items = sorted(rtimes.items())
+            num = sum(cnt for _, cnt in items)
+            result = []
+            for percentile in percentiles:
+                position = percentile / 100.0 * num
+                passed = 0
+                for value, cnt in items:
+                    passed += cnt
+                    if passed > position or percentile == 100:
+                        if percentile < 100:
+                            break
+                result.append((percentile, value))
+            stdev = math.sqrt(sum(cnt * (value - avg) ** 2 for value, cnt in items) / num)
+            return result, stdev
+
+        percentiles = [0.0, 50.0, 90.0, 95.0, 99.0, 99.9, 100.0]
+        labels = []
+        for _ in range(100):
+            rtimes = RespTimesCounter()
+            for _ in range(1000):
+                rtimes.add(random() * 10)
+            labels.append(rtimes)
+
+        timings = {}
+        for name in ("incremental", "sorting"):
+            start = time.time()
+            for second in range(10):
+                for rtimes in labels:
+                    rtimes.add(random() * 10)
+                    if name == "incremental":
+                        rtimes.get_perc_and_stdev(percentiles, 5.0)
+                    else:
+                        sorting_perc_and_stdev(rtimes, percentiles, 5.0)
+            timings[name] = time.time() - start
+        logging.info("Percentiles for 100 labels x 1000 times x 10s: %.3fs incremental, %.3fs with sorting",
+                     timings["incremental"], timings["sorting"])
+
+        for rtimes in labels:
+            perc, stdev = rtimes.get_perc_and_stdev(percentiles, 5.0)
+            expected_perc, expected_stdev = sorting_perc_and_stdev(rtimes, percentiles, 5.0)
+            self.assertEqual(expected_perc, perc)
+            self.assertAlmostEqual(expected_stdev, stdev)
 
     def test_kpiset_merge_many_rtimes(self):
         vals = {round(random() * 20 + 0.1, int(random() * 3) + 2): int(random() * 3 + 1) for _ in range(1000)}
         src = KPISet()
         src[KPISet.RESP_TIMES].update(vals)
-        dst = KPISet()
-        dst.rtimes_len = 100
+        dst = KPISet(rtimes_digits=2)
         for _ in range(100):
             dst.merge_kpis(src)
-            dst.compact_times()
-            self.assertEqual(100, len(dst[KPISet.RESP_TIMES]))
+            # 128 buckets per power of two, 20s is under 2^25us
+            self.assertLessEqual(len(dst[KPISet.RESP_TIMES]), 128 * 18)
+        self.assertEqual(100 * sum(vals.values()), sum(dst[KPISet.RESP_TIMES].values()))
+
+    def test_rtimes_precision(self):
+        rtimes = RespTimesCounter(3)
+        vals = [random() * 60 for _ in range(10000)]
+        for val in vals:
+            rtimes.add(val)
+            self.assertIn(val, rtimes)
+
+        for val, cnt in rtimes.items():
+            self.assertGreater(cnt, 0)
+            self.assertEqual(cnt, rtimes[val])
+
+        vals.sort()
+        perc, _ = rtimes.get_perc_and_stdev([0, 50, 90, 100])
+        self.assertAlmostEqual(vals[0], perc[0][1], delta=vals[0] * 0.0005 + 0.000001)
+        self.assertAlmostEqual(vals[5000], perc[1][1], delta=vals[5000] * 0.0005)
+        self.assertAlmostEqual(vals[9000], perc[2][1], delta=vals[9000] * 0.0005)
+        self.assertAlmostEqual(vals[-1], perc[3][1], delta=vals[-1] * 0.0005)
+
+    def test_rtimes_exact_ms(self):
+        rtimes = RespTimesCounter(3)
+        for val in (0.001, 0.002, 0.002, 0.0015):
+            rtimes.add(val)
+        self.assertEqual([(0.001, 1), (0.0015, 1), (0.002, 2)], rtimes.items())
+
+    def test_stdev(self):
+        kpiset = KPISet()
+        for rtime in (1.0, 1.0, 1.0, 3.0):
+            kpiset.add_sample((1, rtime, 0, 0, '200', None, '', 0))
+        self.assertEqual(1.5, kpiset[KPISet.AVG_RESP_TIME])
+        # population stdev over all samples, not over distinct response times
+        self.assertAlmostEqual(math.sqrt(0.75), kpiset[KPISet.STDEV_RESP_TIME], places=3)
+
+    def test_rtimes_serialization(self):
+        kpiset = KPISet([50.0, 100.0])
+        for val in (0.1, 0.2, 0.2, 3.5):
+            kpiset.add_sample((1, val, 0.01, 0.02, '200', None, '', 0))
+        kpiset.recalculate()
+        restored = KPISet.from_dict(json.loads(to_json(kpiset)))
+        self.assertEqual(kpiset[KPISet.RESP_TIMES].items(), restored[KPISet.RESP_TIMES].items())
+        restored.recalculate()
+        self.assertEqual(kpiset[KPISet.PERCENTILES], restored[KPISet.PERCENTILES])
+        self.assertAlmostEqual(kpiset[KPISet.STDEV_RESP_TIME], restored[KPISet.STDEV_RESP_TIME])
+
+
+class DictKPISet(BetterDict):
+    """ former dict-based layout of KPISet, to compare memory footprint """
+
+    def __init__(self):
+        super(DictKPISet, self).__init__()
+        self.sum_rt = 0
+        self.sum_lt = 0
+        self.sum_cn = 0
+        self.perc_levels = ()
+        self.rtimes_digits = 3
+        for key in KPISet.SCALARS:
+            self[key] = 0
+        self[KPISet.ERRORS] = []
+        self[KPISet.RESP_TIMES] = RespTimesCounter()
+        self[KPISet.RESP_CODES] = Counter()
+        self[KPISet.PERCENTILES] = BetterDict()
+        self._concurrencies = BetterDict()
+
+
+    def test_reader_processes_buffered_records(self):
+        fds, filename = tempfile.mkstemp()
+        os.close(fds)
+        with open(filename, 'w') as fds:
+            fds.write("".join("1,label%s,0.1\n" % idx for idx in range(5)))
+
+        obj = ConsolidatingAggregator()
+        obj.engine = EngineEmul()
+        obj.settings['reader-processes'] = True
+        obj.prepare()
+        reader = LinesReader(filename)
+        obj.add_underling(reader)
+        listener = MockListener()
+        obj.add_listener(listener)
+        obj.startup()
+        for _ in range(50):
+            obj.check()
+            if reader.read_records:
+                break
+            time.sleep(0.1)
+
+        self.assertEqual(5, reader.read_records)  # known in parent while still buffered in reader process
+        self.assertEqual([], listener.results)
+        obj.post_process()
+        self.assertEqual(5, listener.results[-1][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+        os.remove(filename)
+
+    def test_watch_results_files(self):
+        filenames = []
+        for _ in range(2):
+            fds, filename = tempfile.mkstemp()
+            os.close(fds)
+            filenames.append(filename)
+
+        obj = ConsolidatingAggregator()
+        obj.engine = EngineEmul()
+        obj.prepare()
+        obj.add_underling(LinesReader(filenames[0]))
+        obj.add_underling(ReaderProcess(LinesReader(filenames[1])))
+        obj.add_underling(self.get_success_reader())  # reads no files
+        obj.engine.watch_results_files(["other.jtl"])
+        self.assertEqual(filenames, obj.get_results_files())
+        obj.check()
+        self.assertEqual(set(filenames + ["other.jtl"]), obj.engine.results_files)
+        for filename in filenames:
+            os.remove(filename)
+
+
+class LinesReader(ResultsReader):
+    """ reads 'ts,label,rt' lines, keeping the offset between calls """
+
+    def __init__(self, filename):
+        super(LinesReader, self).__init__()
+        self.filename = filename
+        self.offset = 0
+        self.read_records = 0
+
+    def get_results_files(self):
+        return [self.filename]
+
+    def _read(self, final_pass=False):
+        with open(self.filename) as fds:
+            fds.seek(self.offset)
+            for line in fds:
+                if not line.endswith("\n"):
+                    break
+                self.offset += len(line)
+                self.read_records += 1
+                t_stamp, label, r_time = line.strip().split(",")
+                yield int(t_stamp), label, 1, float(r_time), 0.0, 0.0, '200', None, '', 0
+
+
+class PointsProvider(ResultsProvider):
+    """ gives prepared datapoints to measure consolidation only """
+
+    def __init__(self, seconds, labels):
+        super(PointsProvider, self).__init__()
+        self.points = []
+        for second in range(1, seconds + 1):
+            point = DataPoint(second)
+            point[DataPoint.SOURCE_ID] = id(self)
+            overall = point[DataPoint.CURRENT].get('', KPISet())
+            for label in range(labels):
+                kpiset = point[DataPoint.CURRENT].get("label%s" % label, KPISet())
+                for _ in range(10):
+                    kpiset.add_sample((1, r(), r(), r(), '200', None, '', 0))
+                overall.merge_kpis(kpiset, id(self))
+            point.recalculate()
+            self.points.append(point)
+
+    def datapoints(self, final_pass=False):
+        while self.points:
+            yield self.points.pop(0)
+
+    def _calculate_datapoints(self, final_pass=False):
+        pass
 
 
 class MockListener(AggregatorListener):
@@ -1,10 +1,11 @@
 """ test """
 import logging
 import time
+from random import random
 
-from bzt.modules.aggregator import ResultsReader, DataPoint, KPISet
+from bzt.modules.aggregator import ResultsReader, DataPoint, KPISet, LabelRegistry
 from tests import BZTestCase, r, rc, err
-from tests.mocks import MockReader
+from tests.mocks import MockReader, MockBatchReader
 
 
 class TestDefaultAggregator(BZTestCase):
@@ -120,3 +121,116 @@ class TestDefaultAggregator(BZTestCase):
         points = list(mock.datapoints())
         points = list(mock.datapoints())
         self.assertTrue(mock.buffer_len < buffer_len)
+
+    def test_labels_generalized(self):
+        mock = MockReader()
+        mock.label_registry = LabelRegistry(generalize=True, cache_size=10)
+        for user in range(100):
+            mock.data.append((1, "/users/%s/profile" % (user + 100), 1, r(), r(), r(), 200, None, '', 0))
+        mock.data.append((1, "", 1, r(), r(), r(), 200, None, '', 0))
+        point = list(mock.datapoints(True))[0]
+        self.assertEqual(['/users/U/profile', '[empty]', ''], list(point[DataPoint.CURRENT].keys()))
+        self.assertEqual(100, point[DataPoint.CURRENT]['/users/U/profile'][KPISet.SAMPLE_COUNT])
+
+    def test_labels_limit(self):
+        registry = LabelRegistry(max_labels=3, overflow_label="other")
+        readers = [MockReader(), MockBatchReader()]
+        for mock in readers:
+            mock.label_registry = registry
+            for label in range(5):
+                mock.data.append((1, "label%s" % label, 1, r(), r(), r(), 200, None, '', 0))
+
+        for mock in readers:
+            current = list(mock.datapoints(True))[0][DataPoint.CURRENT]
+            self.assertEqual(['label0', 'label1', 'label2', 'other', ''], list(current.keys()))
+            self.assertEqual(2, current['other'][KPISet.SAMPLE_COUNT])
+        self.assertEqual(['label0', 'label1', 'label2', 'other'], registry.labels)
+
+    def test_late_samples(self):
+        for mock in (MockReader(), MockBatchReader()):
+            mock.buffer_scale_idx = '100.0'
+            for second in range(1, 6):
+                mock.data.append((second, "", 1, r(), r(), r(), 200, None, '', 0))
+            points = list(mock.datapoints())
+            self.assertEqual(0, mock.late_samples)
+
+            mock.data.append((1, "", 1, r(), r(), r(), 200, None, '', 0))
+            mock.data.append((2, "", 1, r(), r(), r(), 200, None, '', 0))
+            mock.data.append((6, "", 1, r(), r(), r(), 200, None, '', 0))
+            points += list(mock.datapoints(True))
+
+            self.assertEqual(list(range(1, 7)), [point[DataPoint.TIMESTAMP] for point in points])
+            self.assertTrue(all(point[DataPoint.CURRENT][''][KPISet.SAMPLE_COUNT] == 1 for point in points))
+            self.assertEqual(8, points[-1][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+            self.assertEqual(2, mock.late_samples)
+            self.assertLessEqual(1, mock.late_lag)
+
+    def test_late_samples_after_last_point(self):
+        for mock in (MockReader(), MockBatchReader()):
+            for second in range(1, 6):
+                mock.data.append((second, "", 1, r(), r(), r(), 200, None, '', 0))
+            points = list(mock.datapoints(True))
+
+            mock.data.append((2, "", 1, r(), r(), r(), 200, None, '', 0))
+            self.assertEqual([], list(mock.datapoints(True)))  # no synthetic second for late samples
+            self.assertEqual(6, points[-1][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+            self.assertEqual(1, points[-1].corrections[''][KPISet.SAMPLE_COUNT])
+            self.assertEqual(4, points[-2][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+            self.assertEqual(1, mock.late_samples)
+
+            mock.with_cumulative = False  # like in reader process, consumer gets corrections for reported second
+            mock.listeners = []
+            mock.data.append((3, "", 1, r(), r(), r(), 200, None, '', 0))
+            corrections = list(mock.datapoints(True))
+            self.assertEqual([5], [point[DataPoint.TIMESTAMP] for point in corrections])
+            self.assertEqual({}, dict(corrections[0][DataPoint.CURRENT]))
+            self.assertEqual(1, corrections[0].corrections[''][KPISet.SAMPLE_COUNT])
+
+    def test_batch_same_as_tuples(self):
+        samples = []
+        for ts in range(1, 6):
+            for _ in range(200):
+                label = "label%s" % int(5 * random())
+                samples.append((ts, label, 1 + int(3 * random()), r(1000), r(), r(), rc(), err(), 'tg', 10))
+        samples.append((2, "ignored", 1, r(), r(), r(), None, None, '', None))
+        samples.append((3, "", 0, r(), None, r(), None, "no rc", '', None))
+
+        results = []
+        for mock in (MockReader(), MockBatchReader()):
+            mock.ignored_labels = ["ignored"]
+            mock.data.extend(samples)
+            results.append(list(mock.datapoints(True)))
+
+        tuple_points, batch_points = results
+        self.assertEqual(5, len(batch_points))
+        for tuple_point, batch_point in zip(tuple_points, batch_points):
+            for kind in (DataPoint.CURRENT, DataPoint.CUMULATIVE):
+                self.assertEqual(sorted(tuple_point[kind].keys()), sorted(batch_point[kind].keys()))
+                self.assertNotIn("ignored", batch_point[kind])
+                for label, kpiset in tuple_point[kind].items():
+                    batch_kpiset = batch_point[kind][label]
+                    for key in (KPISet.SAMPLE_COUNT, KPISet.SUCCESSES, KPISet.FAILURES, KPISet.CONCURRENCY,
+                                KPISet.BYTE_COUNT, KPISet.RESP_CODES, KPISet.PERCENTILES, KPISet.ERRORS):
+                        self.assertEqual(kpiset[key], batch_kpiset[key])
+                    self.assertEqual(kpiset[KPISet.RESP_TIMES].items(), batch_kpiset[KPISet.RESP_TIMES].items())
+                    for key in (KPISet.AVG_RESP_TIME, KPISet.AVG_LATENCY, KPISet.AVG_CONN_TIME):
+                        self.assertAlmostEqual(kpiset[key], batch_kpiset[key])
+
+    def test_batch_speed(self):
+        class TupleReader(MockReader):
+            def _read(self, final_pass=False):
+                samples, self.data = self.data, []
+                for sample in samples:
+                    yield sample
+
+        res = {}
+        for mock in (TupleReader(), MockBatchReader()):
+            mock.buffer_scale_idx = '100.0'
+            for ts in range(10):
+                for _ in range(10000):
+                    mock.data.append((ts, "label%s" % int(10 * random()), 1, r(1000), r(), r(), rc(), err(), '', 0))
+            before = time.time()
+            for _ in mock.datapoints(True):
+                pass
+            res[mock.__class__.__name__] = time.time() - before
+        logging.info("Times for 100K samples: %s", res)
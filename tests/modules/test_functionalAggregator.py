@@ -1,7 +1,7 @@
 from bzt.modules.functional import FunctionalAggregator, FunctionalAggregatorListener, FunctionalSample
 
 from tests import BZTestCase
-from tests.mocks import MockFunctionalReader
+from tests.mocks import MockFunctionalReader, EngineEmul
 
 
 class MockListener(FunctionalAggregatorListener):
@@ -56,6 +56,7 @@ class TestFunctionalAggregator(BZTestCase):
     def test_listeners(self):
         listener = MockListener()
         obj = FunctionalAggregator()
+        obj.engine = EngineEmul()
         obj.prepare()
         obj.add_underling(self.get_reader())
         obj.add_listener(listener)
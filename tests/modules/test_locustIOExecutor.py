@@ -1,14 +1,15 @@
+import json
 import logging
 import os
 import sys
 import time
 
 from bzt import six, ToolError
-from bzt.modules.aggregator import DataPoint, KPISet
-from bzt.modules.locustio import LocustIOExecutor, SlavesReader
+from bzt.modules.aggregator import DataPoint, KPISet, ConsolidatingAggregator
+from bzt.modules.locustio import LocustIOExecutor, SlavesReader, StatsReader
 from bzt.modules.provisioning import Local
 from tests import BZTestCase, __dir__
-from tests.mocks import EngineEmul
+from tests.mocks import EngineEmul, ResultChecker
 
 
 class TestLocustIOExecutor(BZTestCase):
@@ -101,6 +102,67 @@ class TestLocustIOExecutor(BZTestCase):
             self.assertGreater(point[DataPoint.CURRENT][''][KPISet.AVG_RESP_TIME], 0)
             self.assertGreater(point[DataPoint.CURRENT][''][KPISet.BYTE_COUNT], 0)
 
+    def test_locust_slave_stats(self):
+        obj = SlavesReader(__dir__() + "/../locust/locust-slaves-stats.ldjson", 2, logging.getLogger(""))
+        points = [x for x in obj.datapoints(True)]
+        self.assertEqual(5, len(points))
+        for point in points:
+            overall = point[DataPoint.CURRENT]['']
+            self.assertEqual(26, overall[KPISet.SAMPLE_COUNT])
+            self.assertEqual(4, overall[KPISet.FAILURES])
+            self.assertEqual(6, overall[KPISet.CONCURRENCY])
+            self.assertEqual(10, overall[KPISet.RESP_TIMES][0.044])
+            self.assertEqual(2, overall[KPISet.RESP_TIMES][0.25])
+            self.assertEqual(4, overall[KPISet.ERRORS][0]['cnt'])
+
+    def test_locust_stats(self):
+        obj = StatsReader(__dir__() + "/../locust/locust-stats.ldjson", logging.getLogger(""))
+        points = [x for x in obj.datapoints(True)]
+        self.assertEqual(5, len(points))
+        for point in points:
+            about = point[DataPoint.CURRENT]['/about/']
+            self.assertEqual(3, about[KPISet.SAMPLE_COUNT])
+            self.assertEqual(1, about[KPISet.SUCCESSES])
+            self.assertEqual({'200': 1, '404': 2}, dict(about[KPISet.RESP_CODES]))
+            self.assertAlmostEqual(0.019 / 3, about[KPISet.AVG_RESP_TIME])
+            r_times = sorted(about[KPISet.RESP_TIMES].items())
+            self.assertEqual([2, 1], [count for _, count in r_times])
+            self.assertAlmostEqual(0.015, r_times[-1][0], places=4)
+            self.assertEqual('Not Found', about[KPISet.ERRORS][0]['msg'])
+            self.assertEqual(13, point[DataPoint.CURRENT][''][KPISet.SAMPLE_COUNT])
+
+        self.assertEqual(65, points[-1][DataPoint.CUMULATIVE][''][KPISet.SAMPLE_COUNT])
+
+    def test_has_results_buffered(self):
+        with open(__dir__() + "/../locust/locust-stats.ldjson") as fds:
+            first_record = fds.readline()
+        filename = self.obj.engine.create_artifact("locust-stats", ".ldjson")
+        with open(filename, 'w') as fds:
+            fds.write(first_record)
+
+        self.obj.reader = StatsReader(filename, logging.getLogger(""))
+        self.assertFalse(self.obj.has_results())
+        self.assertEqual([], list(self.obj.reader.datapoints()))  # record stays in buffer
+        self.assertFalse(self.obj.reader.cumulative)
+        self.assertTrue(self.obj.has_results())
+
+    def test_locust_stats_settings(self):
+        aggregator = ConsolidatingAggregator()
+        aggregator.settings.merge({"ignore-labels": ["/"], "max-error-variety": 1, "rtimes-digits": 2})
+        aggregator.prepare()
+        reader = StatsReader(__dir__() + "/../locust/locust-stats.ldjson", logging.getLogger(""))
+        aggregator.add_underling(reader)
+        points = []
+        aggregator.add_listener(ResultChecker(points.append))
+        aggregator.post_process()
+
+        self.assertEqual(5, len(points))
+        for point in points:
+            self.assertEqual(['/about/', ''], list(point[DataPoint.CURRENT].keys()))
+            self.assertEqual(3, point[DataPoint.CURRENT][''][KPISet.SAMPLE_COUNT])
+            self.assertEqual(2, point[DataPoint.CURRENT][''][KPISet.RESP_TIMES].sign_figures)
+        self.assertEqual(['/about/'], aggregator.label_registry.labels)
+
     def test_locust_resource_files(self):
         if six.PY3:
             logging.warning("No locust available for python 3")
@@ -251,7 +313,7 @@ class TestLocustIOExecutor(BZTestCase):
 
         self.assertEqual(gen_contents, sample_contents)
 
-    def test_jtl_key_order(self):
+    def test_stats_file(self):
         self.obj.execution.merge({
             "concurrency": 1,
             "iterations": 1,
@@ -270,11 +332,9 @@ class TestLocustIOExecutor(BZTestCase):
         self.obj.shutdown()
         self.obj.post_process()
 
-        kpi_path = os.path.join(self.obj.engine.artifacts_dir, "kpi.jtl")
-        if os.path.exists(kpi_path):
-            with open(kpi_path) as fds:
-                jtl = fds.readlines()
+        if os.path.exists(self.obj.stats_ldjson) and os.path.getsize(self.obj.stats_ldjson):
+            with open(self.obj.stats_ldjson) as fds:
+                record = json.loads(fds.readline())
 
-            header_line = jtl[0].strip()
-            expected_header = "timeStamp,label,method,elapsed,bytes,responseCode,responseMessage,success,allThreads,Latency"
-            self.assertEqual(header_line, expected_header)
+            self.assertEqual(["labels", "ts", "user_count"], sorted(record.keys()))
+            self.assertEqual(["bytes", "count", "errors", "fail", "rc", "rt"], sorted(record["labels"]["/"].keys()))
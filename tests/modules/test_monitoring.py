@@ -2,6 +2,7 @@ import logging
 import random
 import time
 
+from bzt.modules.blazemeter import BlazeMeterUploader, KPISender
 from bzt.modules.monitoring import Monitoring, MonitoringListener, MonitoringCriteria
 from bzt.modules.monitoring import ServerAgentClient, GraphiteClient, LocalClient, LocalMonitor
 from bzt.utils import BetterDict
@@ -88,7 +89,7 @@ class TestMonitoring(BZTestCase):
         obj.post_process()
 
     def test_local_with_engine(self):
-        config = {'metrics': ['cpu', 'engine-loop']}
+        config = {'metrics': ['cpu', 'engine-loop', 'engine-loop-misses', 'late-samples', 'late-lag']}
         obj = LocalClient(logging.getLogger(''), 'label', config)
         obj.engine = EngineEmul()
         obj.connect()
@@ -96,6 +97,27 @@ class TestMonitoring(BZTestCase):
         self.assertTrue(all('source' in item.keys() and 'ts' in item.keys() for item in data))
         return data
 
+    def test_local_kpi_sender_metrics(self):
+        engine = EngineEmul()
+        reporter = BlazeMeterUploader()
+        reporter.sender = KPISender(reporter, None, 1, engine.create_artifact("spill", ".ldjson"), logging.getLogger(''))
+        for num in range(3):
+            reporter.sender.put({"num": num})
+        reporter.sender.latency = 0.5
+        engine.reporters.append(reporter)
+
+        obj = LocalClient(logging.getLogger(''), 'label', {'metrics': ['kpi-send-queue', 'kpi-send-latency']})
+        obj.engine = engine
+        obj.connect()
+        prev_engine, obj.monitor.engine = obj.monitor.engine, engine  # monitor is singleton
+        try:
+            obj.monitor.resource_stats()
+            stats = obj.monitor.calc_resource_stats(1.0)
+        finally:
+            obj.monitor.engine = prev_engine
+        self.assertEqual(3, stats.send_queue)
+        self.assertEqual(0.5, stats.send_latency)
+
     def test_local_without_engine(self):
         config = {'metrics': ['cpu']}
         obj = LocalClient(logging.getLogger(''), 'label', config)
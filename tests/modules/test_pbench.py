@@ -1,8 +1,10 @@
+import filecmp
 import io
 import logging
 import math
 import os
 import pprint
+import struct
 import time
 
 import urwid
@@ -11,7 +13,7 @@ import yaml
 from bzt import TaurusConfigError, ToolError
 from bzt.engine import ScenarioExecutor
 from bzt.modules.aggregator import ConsolidatingAggregator, DataPoint, KPISet, AggregatorListener
-from bzt.modules.pbench import PBenchExecutor, Scheduler, TaurusPBenchTool
+from bzt.modules.pbench import PBenchExecutor, Scheduler, TaurusPBenchTool, PBenchKPIReader, PBenchStatsReader
 from bzt.six import parse, b
 from bzt.utils import BetterDict, is_windows
 from tests import BZTestCase, __dir__
@@ -23,6 +25,7 @@ if not is_windows():
             obj = PBenchExecutor()
             obj.engine = EngineEmul()
             obj.engine.aggregator = ConsolidatingAggregator()
+            obj.engine.aggregator.engine = obj.engine
             obj.engine.aggregator.add_listener(DataPointLogger())
             obj.engine.config.merge({"provisioning": "test"})
 
@@ -299,6 +302,58 @@ if not is_windows():
             obj.prepare()
 
 
+        def test_stats_reader(self):
+            engine = EngineEmul()
+            filename = engine.create_artifact("pbench-additional", ".ldjson")
+            records = []
+            for sec in range(3):
+                records.append('"2015-05-28 18:31:3%s.000" : {\n'
+                               '"benchmark_io" : { "method_stream_ipv4" : { "mmtasks" : [ 0, 0, %s ] } },\n'
+                               '"benchmark_io1" : { "method_stream_ipv4" : { "mmtasks" : [ 0, 0, 1 ] } },\n'
+                               '"monitor" : { "mmtasks" : [ 0, 0, 100 ] }\n},\n' % (sec, sec + 5))
+            content = "".join(records)
+
+            obj = PBenchStatsReader(filename, logging.getLogger(''))
+            with open(filename, 'w') as fds:
+                for pos in range(0, len(content), 10):  # records come in pieces
+                    fds.write(content[pos:pos + 10])
+                    fds.flush()
+                    obj.read_file()
+
+            first = int(time.mktime(time.strptime("2015-05-28 18:31:30", "%Y-%m-%d %H:%M:%S")))
+            self.assertEqual({first: 6, first + 1: 7, first + 2: 8}, obj.data)
+            self.assertEqual(b(""), obj.buffer)
+            self.assertEqual(7, obj.get_data(first + 1))
+            self.assertEqual(7, obj.get_data(first + 10))
+
+        def test_kpi_reader(self):
+            engine = EngineEmul()
+            filename = engine.create_artifact("pbench-kpi", ".txt")
+            with open(filename, 'w') as fds:
+                fds.write("1432827097.000\tlabel1\t1500\t100\t10\t500\t390\t0\t100\t2000\t0\t200\n")
+                fds.write("1432827097.500\tlabel2\t1000000\t100\t10\t500\t390\t0\t100\t0\t110\t0\n\n")
+                fds.write("1432827098.500\tlabel2\t1000")
+
+            obj = PBenchKPIReader(filename, logging.getLogger(''), None)
+            batch, = list(obj._read())
+            self.assertEqual(2, len(batch))
+            self.assertEqual([1432827097, 1432827098], list(batch.timestamps))
+            self.assertEqual(["label1", "label2"], batch.labels)
+            self.assertEqual([0.001, 1.0], list(batch.r_times))
+            self.assertEqual(["200", os.strerror(110)], batch.r_codes)
+            self.assertEqual([None, os.strerror(110)], batch.errors)
+            self.assertEqual([2000, 0], list(batch.byte_counts))
+
+            with open(filename, 'a') as fds:
+                fds.write("\t100\t10\t500\t390\t0\t100\t0\t0\n")  # no response code
+            batch, = list(obj._read(last_pass=True))
+            self.assertEqual(["label2"], batch.labels)
+            self.assertEqual([None], batch.r_codes)
+
+            with open(filename, 'a') as fds:
+                fds.write("1432827099.500\tlabel2\tfoo\n")
+            self.assertRaises(ToolError, lambda: list(obj._read(last_pass=True)))
+
     class TestScheduler(BZTestCase):
         def _get_pbench(self):
             obj = PBenchExecutor()
@@ -441,6 +496,115 @@ if not is_windows():
             obj = self._get_pbench()
             self.check_schedule_size_estimate(obj, execution)
 
+        @staticmethod
+        def write_schedule_by_records(load, payload, sfd):
+            """ record by record writer, as it was before chunked one """
+            scheduler = Scheduler(load, io.BytesIO(payload), logging.getLogger(''))
+            prev_offset = 0
+            accum_interval = 0.0
+            for item in scheduler.generate():
+                time_offset, _, payload_offset, _, _, record_type, overall_len = item
+                if time_offset >= 0:
+                    accum_interval += 1000 * (time_offset - prev_offset)
+                    interval = int(math.floor(accum_interval))
+                    accum_interval -= interval
+                else:
+                    interval = 0xFFFFFF
+
+                type_and_delay = struct.pack("I", interval)[:-1] + b(chr(record_type))
+                sfd.write(type_and_delay + struct.pack('I', overall_len) + struct.pack('Q', payload_offset))
+                prev_offset = time_offset
+
+        def write_schedule_by_chunks(self, load, payload, sfd):
+            pbench = TaurusPBenchTool(self._get_pbench(), logging.getLogger(''))
+            pbench._write_schedule_file(load, Scheduler(load, io.BytesIO(payload), logging.getLogger('')), sfd)
+
+        def _get_load(self, execution):
+            obj = self._get_pbench()
+            obj.engine.config.merge({ScenarioExecutor.EXEC: execution, "provisioning": "local"})
+            obj.execution = obj.engine.config['execution']
+            return obj.get_load()
+
+        def test_schedule_chunks(self):
+            payload = b("5 test1\r\ntest1\r\n\r\n5 test2\r\ntest2\r\n5 test3\r\ntest3\r\n")
+            loads = [{"concurrency": 5, "ramp-up": 10, "hold-for": 5},
+                     {"concurrency": 5, "ramp-up": 10, "steps": 3},
+                     {"concurrency": 5, "iterations": 3},
+                     {"throughput": 9, "ramp-up": 12, "steps": 3, "hold-for": 10},
+                     {"throughput": 9, "ramp-up": 12, "hold-for": 10, "iterations": 5},
+                     {"throughput": 7.5, "hold-for": 10}]
+            for execution in loads:
+                load = self._get_load(execution)
+                expected = io.BytesIO()
+                self.write_schedule_by_records(load, payload, expected)
+                for chunk_size in (1, 2, 7, Scheduler.CHUNK_SIZE):
+                    scheduler = Scheduler(load, io.BytesIO(payload), logging.getLogger(''))
+                    chunks = list(scheduler.generate_chunks(chunk_size))
+                    self.assertEqual(len(expected.getvalue()) // 16, sum(len(chunk[0]) for chunk in chunks))
+
+                actual = io.BytesIO()
+                self.write_schedule_by_chunks(load, payload, actual)
+                self.assertEqual(expected.getvalue(), actual.getvalue(), execution)
+
+        def test_schedule_speed(self):
+            payload = b("".join("12 label%s\r\nGET /%s HTTP\r\n" % (num, num) for num in range(10)))
+            load = self._get_load({"throughput": 20000, "ramp-up": 30, "hold-for": 30, "iterations": 100000})
+
+            results = []
+            for writer in (self.write_schedule_by_records, self.write_schedule_by_chunks):
+                sfd = io.BytesIO()
+                start = time.time()
+                writer(load, payload, sfd)
+                elapsed = time.time() - start
+                records = len(sfd.getvalue()) // 16
+                logging.info("%s: %s records in %.3fs, %d records/s", writer.__name__, records, elapsed,
+                             records / elapsed)
+                results.append(sfd.getvalue())
+
+            self.assertEqual(results[0], results[1])
+
+        def generate_cached_schedule(self, obj):
+            pbench = TaurusPBenchTool(obj, logging.getLogger(''))
+            pbench.generate_payload(obj.get_scenario())
+            pbench.generate_schedule(obj.get_load())
+            return pbench.schedule_file
+
+        def test_schedule_cache(self):
+            obj = self._get_pbench()
+            obj.engine.config.merge({
+                ScenarioExecutor.EXEC: {"throughput": 10, "hold-for": 10, "scenario": {"requests": ["http://a.com/"]}},
+                "provisioning": "local"})
+            obj.execution = obj.engine.config['execution']
+            cache_dir = obj.engine.create_artifact("pbench-cache", "")
+            obj.settings.merge({"schedule-cache": {"path": cache_dir}})
+            self.generate_cached_schedule(obj)
+            self.assertFalse(os.path.exists(cache_dir))  # cache is off by default
+
+            obj.settings["schedule-cache"]["enabled"] = True
+            first = self.generate_cached_schedule(obj)
+            first_mode = os.stat(first).st_mode
+            second = self.generate_cached_schedule(obj)
+            self.assertNotEqual(first, second)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+            cached = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+            self.assertFalse(os.path.samefile(cached, first))  # generated artifact is copied into cache untouched
+            self.assertEqual(first_mode, os.stat(first).st_mode)
+            self.assertTrue(filecmp.cmp(cached, first, shallow=False))
+            self.assertTrue(os.path.samefile(cached, second))
+
+            os.utime(cached, (time.time() - 60, time.time() - 60))
+            obj.settings["schedule-cache"]["max-size"] = os.path.getsize(cached) * 1.5 / 1024 / 1024
+            obj.execution["throughput"] = 20
+            third = self.generate_cached_schedule(obj)
+            self.assertEqual(1, len(os.listdir(cache_dir)))  # least recently used one is evicted
+            self.assertNotEqual(cached, os.path.join(cache_dir, os.listdir(cache_dir)[0]))
+            self.assertTrue(filecmp.cmp(os.path.join(cache_dir, os.listdir(cache_dir)[0]), third, shallow=False))
+
+            obj.settings["schedule-cache"]["enabled"] = False
+            obj.execution["throughput"] = 30
+            self.generate_cached_schedule(obj)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+
 
 class DataPointLogger(AggregatorListener):
     def aggregated_second(self, data):
@@ -0,0 +1,205 @@
+""" parsing throughput of results readers, fixtures are multiplied to have enough data """
+import logging
+import os
+import shutil
+import time
+
+from bzt.modules.ab import TSVDataReader
+from bzt.modules.aggregator import SamplesBatch, DataPoint, KPISet
+from bzt.modules.gatling import DataLogReader as GatlingLogReader
+from bzt.modules.grinder import DataLogReader as GrinderLogReader
+from bzt.modules.jmeter import JTLReader, JTLErrorsReader
+from bzt.modules.locustio import SlavesReader
+from bzt.modules.pbench import PBenchKPIReader
+from bzt.modules.selenium import LoadSamplesReader
+from bzt.modules.siege import DataLogReader as SiegeLogReader
+from bzt.modules.tsung import TsungStatsReader
+from tests import BZTestCase, __dir__
+from tests.mocks import EngineEmul
+
+
+class TestReadersSpeed(BZTestCase):
+    DATA_SIZE = 4 * 1024 * 1024
+
+    def setUp(self):
+        super(TestReadersSpeed, self).setUp()
+        self.engine = EngineEmul()
+        self.log = logging.getLogger('')
+
+    def multiply(self, src, dst, header_lines=0):
+        """
+        Write header lines of src file once, the rest of lines is repeated
+
+        :return: how many times lines are repeated
+        """
+        with open(src, 'rb') as fds:
+            lines = fds.readlines()
+        if not lines[-1].endswith(b"\n"):
+            lines[-1] += b"\n"
+
+        body = b"".join(lines[header_lines:])
+        repeat = max(1, self.DATA_SIZE // len(body))
+        with open(dst, 'wb') as fds:
+            fds.writelines(lines[:header_lines])
+            for _ in range(repeat):
+                fds.write(body)
+        return repeat
+
+    @staticmethod
+    def count_samples(reader):
+        count = 0
+        for item in reader._read(True):
+            if item is None:
+                break
+            count += len(item) if isinstance(item, SamplesBatch) else 1
+        return count
+
+    def measure(self, fmt, src, dst, reader_class, *args, **kwargs):
+        header_lines = kwargs.pop("header_lines", 0)
+        single = self.count_samples(reader_class(src, *args))
+        repeat = self.multiply(src, dst, header_lines)
+
+        start = time.time()
+        count = self.count_samples(reader_class(dst, *args))
+        elapsed = time.time() - start
+        logging.info("%s: %s samples from %sMB in %.3fs, %d samples/s", fmt, count,
+                     os.path.getsize(dst) // 1024 // 1024, elapsed, count / elapsed)
+        self.assertEqual(single * repeat, count)
+
+    def test_jtl(self):
+        dst = self.engine.create_artifact("kpi", ".jtl")
+        self.measure("JTL", __dir__() + "/../jmeter/jtl/tabs.jtl", dst, JTLReader, self.log, None, header_lines=1)
+
+    def test_jtl_quoted(self):
+        dst = self.engine.create_artifact("kpi", ".jtl")
+        self.measure("JTL quoted", __dir__() + "/../jmeter/jtl/tranctl.jtl", dst, JTLReader, self.log, None,
+                     header_lines=1)
+
+    def test_jtl_errors(self):
+        src = __dir__() + "/../jmeter/jtl/standard-errors.jtl"
+        dst = self.engine.create_artifact("errors", ".jtl")
+        repeat = self.multiply(src, dst, header_lines=2)
+
+        single = JTLErrorsReader(src, self.log)
+        while single.file.offset < os.path.getsize(src):
+            single.read_file()
+        errors = sum(err['cnt'] for err in single.get_data(float('inf'))[''])
+
+        obj = JTLErrorsReader(dst, self.log)
+        start = time.time()
+        while obj.file.offset < os.path.getsize(dst):
+            obj.read_file()
+        elapsed = time.time() - start
+        count = sum(err['cnt'] for err in obj.get_data(float('inf'))[''])
+        logging.info("Errors JTL: %s errors from %sMB in %.3fs, %d errors/s", count,
+                     os.path.getsize(dst) // 1024 // 1024, elapsed, count / elapsed)
+        self.assertEqual(errors * repeat, count)
+
+    def test_gatling(self):
+        for prefix in ("gatling-0", "gatling-220"):
+            src_dir = __dir__() + "/../gatling"
+            dst_dir = self.engine.create_artifact("gatling", "")
+            os.makedirs(os.path.join(dst_dir, prefix + "-000"))
+
+            src = os.path.join(src_dir, prefix + "-000", "simulation.log")
+            dst = os.path.join(dst_dir, prefix + "-000", "simulation.log")
+            single = self.count_samples(GatlingLogReader(src_dir, self.log, prefix))
+            repeat = self.multiply(src, dst, header_lines=1)
+
+            start = time.time()
+            count = self.count_samples(GatlingLogReader(dst_dir, self.log, prefix))
+            elapsed = time.time() - start
+            logging.info("Gatling %s: %s samples from %sMB in %.3fs, %d samples/s", prefix, count,
+                         os.path.getsize(dst) // 1024 // 1024, elapsed, count / elapsed)
+            self.assertEqual(single * repeat, count)
+
+    def test_gatling_synthetic(self):
+        formats = {
+            "gatling-21": ("Sim\t%(user)s\tUSER\tSTART\t%(start)s\t0\n",
+                           "Sim\t%(user)s\tREQUEST\t\tlabel%(label)s\t%(start)s\t%(start)s\t%(end)s\t%(end)s"
+                           "\t%(status)s\n"),
+            "gatling-22": ("USER\tSim\t%(user)s\tSTART\t%(start)s\t%(start)s\n",
+                           "REQUEST\tSim\t%(user)s\t\tlabel%(label)s\t%(start)s\t%(end)s\t%(status)s\n"),
+        }
+        for prefix, (user_line, request_line) in formats.items():
+            dst_dir = self.engine.create_artifact("gatling", "")
+            os.makedirs(os.path.join(dst_dir, prefix + "-000"))
+            samples = 0
+            with open(os.path.join(dst_dir, prefix + "-000", "simulation.log"), 'w') as fds:
+                for user in range(100):
+                    fds.write(user_line % {"user": user, "start": 1452080822956})
+                for num in range(100000):
+                    start = 1452080822956 + num
+                    status = "OK\t " if num % 10 else "KO\tStatus was 500"
+                    fds.write(request_line % {"user": num % 100, "label": num % 10, "start": start,
+                                              "end": start + 50, "status": status})
+                    samples += 1
+
+            obj = GatlingLogReader(dst_dir, self.log, prefix)
+            start = time.time()
+            points = list(obj.datapoints(True))
+            elapsed = time.time() - start
+            logging.info("Gatling synthetic %s: %s samples from %sMB in %.3fs, %d samples/s", prefix, samples,
+                         os.path.getsize(obj.file.filename) // 1024 // 1024, elapsed, samples / elapsed)
+            cumulative = points[-1][DataPoint.CUMULATIVE]['']
+            self.assertEqual(samples, cumulative[KPISet.SAMPLE_COUNT])
+            self.assertEqual(samples // 10, cumulative[KPISet.FAILURES])
+            self.assertEqual(100, cumulative[KPISet.CONCURRENCY])
+
+            batches = list(GatlingLogReader(dst_dir, self.log, prefix)._read(True))
+            self.assertGreater(len(batches), 1)  # final pass is read by chunks
+            self.assertEqual(samples, sum(len(batch) for batch in batches))
+
+    def test_grinder(self):
+        dst = self.engine.create_artifact("grinder-kpi", ".log")
+        self.measure("Grinder", __dir__() + "/../grinder/grinder-bzt-kpi.log", dst, GrinderLogReader, self.log,
+                     header_lines=9)
+
+    def test_siege(self):
+        dst = self.engine.create_artifact("siege", ".out")
+        self.measure("Siege", __dir__() + "/../siege/siege.out", dst, SiegeLogReader, self.log)
+
+    def test_tsung(self):
+        src_dir = __dir__() + "/../tsung/stats"
+        dst_dir = self.engine.create_artifact("tsung", "")
+        os.makedirs(os.path.join(dst_dir, "tsung-stats"))
+        shutil.copy(os.path.join(src_dir, "tsung-stats", "tsung.log"), os.path.join(dst_dir, "tsung-stats"))
+        src = os.path.join(src_dir, "tsung-stats", "tsung.dump")
+        dst = os.path.join(dst_dir, "tsung-stats", "tsung.dump")
+
+        single = self.count_samples(TsungStatsReader(src_dir, self.log))
+        repeat = self.multiply(src, dst, header_lines=1)
+        start = time.time()
+        count = self.count_samples(TsungStatsReader(dst_dir, self.log))
+        elapsed = time.time() - start
+        logging.info("Tsung: %s samples from %sMB in %.3fs, %d samples/s", count,
+                     os.path.getsize(dst) // 1024 // 1024, elapsed, count / elapsed)
+        self.assertEqual(single * repeat, count)
+
+    def test_ab(self):
+        dst = self.engine.create_artifact("ab", ".tsv")
+        self.measure("AB", __dir__() + "/../ab/ab.tsv", dst, TSVDataReader, self.log, header_lines=1)
+
+    def test_ldjson(self):
+        dst = self.engine.create_artifact("report", ".ldjson")
+        self.measure("LDJSON", __dir__() + "/../selenium/report.ldjson", dst, LoadSamplesReader, self.log, None)
+
+    def test_pbench(self):
+        src = self.engine.create_artifact("pbench-kpi", ".txt")
+        with open(src, 'w') as fds:
+            for num in range(10):
+                fds.write("1432827097.%03d\tlabel%s\t1000\t100\t10\t500\t390\t0\t100\t2000\t0\t200\n" % (num, num))
+        dst = self.engine.create_artifact("pbench-kpi", ".txt")
+        self.measure("PBench", src, dst, PBenchKPIReader, self.log, None)
+
+    def test_locust_slaves(self):
+        src = __dir__() + "/../locust/locust-slaves.ldjson"
+        dst = self.engine.create_artifact("locust-slaves", ".ldjson")
+        self.multiply(src, dst)
+        obj = SlavesReader(dst, 2, self.log)
+        start = time.time()
+        points = list(obj.datapoints(True))
+        elapsed = time.time() - start
+        logging.info("Locust slaves: %s reports from %sMB in %.3fs", len(points),
+                     os.path.getsize(dst) // 1024 // 1024, elapsed)
+        self.assertGreater(len(points), 0)
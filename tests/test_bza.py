@@ -0,0 +1,111 @@
+import gzip
+import json
+import threading
+
+from bzt.bza import User, Session
+from bzt.six import BaseHTTPServer, socketserver, BytesIO
+from tests import BZTestCase
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.__respond(b'')
+
+    def do_POST(self):
+        self.__respond(self.rfile.read(int(self.headers['Content-Length'])))
+
+    def __respond(self, body):
+        if self.headers.get('Content-Encoding') == 'gzip':
+            body = gzip.GzipFile(fileobj=BytesIO(body)).read()
+        self.server.requests.append({"path": self.path, "port": self.client_address[1], "body": body,
+                                     "encoding": self.headers.get('Content-Encoding')})
+        resp = b'{"result": {"session": {}}}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(resp)))
+        self.end_headers()
+        self.wfile.write(resp)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class StubServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), StubHandler)
+        self.requests = []
+        self.address = 'http://127.0.0.1:%s' % self.server_address[1]
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+class TestBZAObject(BZTestCase):
+    def setUp(self):
+        super(TestBZAObject, self).setUp()
+        self.server = StubServer()
+        self.user = User()
+        self.user.address = self.server.address
+        self.user.data_address = self.server.address
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super(TestBZAObject, self).tearDown()
+
+    def test_connection_reuse(self):
+        session = Session(self.user, {'id': 1, 'testId': 2, 'userId': 3})
+        self.assertIs(self.user.http_session, session.http_session)
+        self.assertIs(self.user.request_stats, session.request_stats)
+
+        self.user.ping()
+        session.send_kpi_data('{}')
+        session.send_kpi_data('{}')
+        self.assertEqual(3, len(self.server.requests))
+        self.assertEqual(1, len(set(req['port'] for req in self.server.requests)))  # single connection
+
+        report = self.user.request_stats.get_report()
+        self.assertEqual(2, len(report))
+        self.assertTrue(report[1].startswith("POST 127.0.0.1:%s/submit.php: 2 calls, 0 errors" %
+                                             self.server.server_address[1]))
+
+    def test_own_connections(self):
+        session = Session(self.user, {'id': 1, 'testId': 2, 'userId': 3})
+        session.data_signature = 'sign'
+        clone = session.with_own_connections()
+        self.assertIsNot(session.http_session, clone.http_session)
+        self.assertEqual('sign', clone.data_signature)
+        self.assertEqual(session, clone)
+
+        session.send_kpi_data('{}')
+        clone.send_kpi_data('{}')
+        self.assertEqual(2, len(set(req['port'] for req in self.server.requests)))
+        self.assertTrue(self.user.request_stats.get_report()[0].startswith(
+            "POST 127.0.0.1:%s/submit.php: 2 calls" % self.server.server_address[1]))  # stats are shared
+
+    def test_gzip(self):
+        session = Session(self.user, {'id': 1, 'testId': 2, 'userId': 3})
+        session.gzip_threshold = 1024
+        small = json.dumps({"labels": []})
+        big = json.dumps({"labels": [{"name": "label%s" % num, "intervals": []} for num in range(100)]})
+        session.send_kpi_data(big)
+        self.assertIsNone(self.server.requests[0]['encoding'])  # disabled by default
+
+        session.gzip_requests = True
+        session.send_kpi_data(small)
+        session.send_kpi_data(big)
+        self.assertEqual([None, 'gzip'], [req['encoding'] for req in self.server.requests[1:]])
+        self.assertEqual(big, self.server.requests[2]['body'].decode('utf-8'))
+
+        session.upload_file("test.json", big)  # multipart uploads aren't compressed
+        session.send_monitoring_data(0, {"data": big})
+        self.assertEqual([None, None], [req['encoding'] for req in self.server.requests[3:]])
+        self.assertIn(b'c.monitoring.json', self.server.requests[4]['body'])
+
+    def test_endpoint_ids(self):
+        self.assertEqual("GET host/api/v4/masters/{id}/status",
+                         self.user.request_stats.get_endpoint("GET", "https://host/api/v4/masters/123/status?x=1"))
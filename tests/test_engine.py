@@ -1,7 +1,9 @@
 """ unit test """
+import logging
 import os
+import time
 
-from bzt.engine import ScenarioExecutor
+from bzt.engine import ScenarioExecutor, EngineModule, CheckScheduler
 from bzt.six import string_types
 from bzt.utils import BetterDict, EXE_SUFFIX, is_windows
 from tests import BZTestCase, __dir__, local_paths_config
@@ -108,6 +110,23 @@ class TestEngine(BZTestCase):
         ]
         self.assertRaises(TaurusConfigError, lambda: self.obj.configure(configs))
 
+    def test_reader_processes_startup(self):
+        started = []
+        self.obj.config.merge({"settings": {"aggregator": "consolidator"},
+                               "modules": {"consolidator": {"reader-processes": True}}})
+        self.obj.configure([self.paths])
+        self.assertIsNone(self.obj.update_thread.ident)  # no threads until reader processes are forked
+
+        self.obj.aggregator = StartedModule(started, lambda: self.obj.update_thread.ident)
+        self.obj.services = [StartedModule(started, lambda: self.obj.update_thread.ident)]
+        self.obj.reporters = []
+        self.obj.provisioning = StartedModule(started, lambda: self.obj.update_thread.ident)
+        self.obj._startup()
+        self.obj.update_thread.join()
+        self.assertEqual([self.obj.aggregator] + self.obj.services + [self.obj.provisioning],
+                         [module for module, _ in started])
+        self.assertEqual([False, True, True], [bool(ident) for _, ident in started])
+
 
 class TestScenarioExecutor(BZTestCase):
     def setUp(self):
@@ -243,3 +262,136 @@ class TestScenarioExecutor(BZTestCase):
             self.assertEqual(1, len(results))
         else:
             self.assertEqual(2, len(results))
+
+
+class StartedModule(EngineModule):
+    def __init__(self, started, get_state):
+        super(StartedModule, self).__init__()
+        self.started = started
+        self.get_state = get_state
+
+    def startup(self):
+        self.started.append((self, self.get_state()))
+
+
+class CheckedModule(EngineModule):
+    def __init__(self, checks, period=0, priority=0, duration=0, background=False):
+        super(CheckedModule, self).__init__()
+        self.checks = checks
+        self.check_period = period
+        self.check_priority = priority
+        self.check_in_background = background
+        self.duration = duration
+        self.finished = False
+
+    def check(self):
+        self.checks.append(self)
+        time.sleep(self.duration)
+        return self.finished
+
+
+class TestCheckScheduler(BZTestCase):
+    def setUp(self):
+        super(TestCheckScheduler, self).setUp()
+        self.obj = CheckScheduler(logging.getLogger(''))
+        self.checks = []
+
+    def test_priority(self):
+        first, second, third, fourth = [CheckedModule(self.checks, priority=prio) for prio in (0, 1, -1, 0)]
+        self.assertFalse(self.obj.check([first, second, third, fourth], 1))
+        self.assertEqual([second, first, fourth, third], self.checks)
+
+    def test_period(self):
+        every_tick = CheckedModule(self.checks)
+        periodic = CheckedModule(self.checks, period=60)
+        overridden = CheckedModule(self.checks)
+        overridden.settings.merge({"check-period": "1h"})
+        for _ in range(3):
+            self.obj.check([every_tick, periodic, overridden], 1)
+        self.assertEqual([every_tick, periodic, overridden, every_tick, every_tick], self.checks)
+
+    def test_budget(self):
+        slow = CheckedModule(self.checks, duration=0.02)
+        periodic = CheckedModule(self.checks, period=0.001)
+        every_tick = CheckedModule(self.checks)
+        self.obj.check([slow, periodic, every_tick], 0.01)
+        self.assertEqual([slow, every_tick], self.checks)  # periodic one is postponed
+
+    def test_deadline_misses(self):
+        module = CheckedModule(self.checks, period=5)
+        self.obj.last_checks[module] = time.time() - 5.5
+        self.obj.check([module], 1)
+        self.assertEqual(0, self.obj.misses_count)
+
+        self.obj.last_checks[module] = time.time() - 7
+        self.obj.check([module], 1)
+        self.assertEqual(1, self.obj.misses_count)
+        self.assertEqual({"CheckedModule": 1}, dict(self.obj.misses))
+
+    def test_engine_loop(self):
+        engine = EngineEmul()
+        engine.check_interval = 0.01
+        module = CheckedModule(self.checks, duration=0.03)
+        module.check = lambda: CheckedModule.check(module) or len(self.checks) >= 3
+        engine.reporters.append(module)
+        engine.started.append(module)
+        engine._wait()
+        self.assertEqual(3, len(self.checks))
+        self.assertGreater(engine.engine_loop_utilization, 1)
+        self.assertEqual(2, engine.engine_loop_misses)
+
+    def test_background(self):
+        self.obj.threads = 2
+        slow = CheckedModule(self.checks, duration=0.1, background=True)
+        slow.finished = True
+        every_tick = CheckedModule(self.checks)
+        started = time.time()
+        self.assertFalse(self.obj.check([slow, every_tick], 1))
+        self.assertLess(time.time() - started, 0.1)
+        self.assertIn(slow, self.obj.background)
+
+        self.assertFalse(self.obj.check([slow, every_tick], 1))  # still running, not checked again
+        self.obj.background[slow].join()
+        self.assertTrue(self.obj.check([every_tick], 1))  # result is picked up by next iteration
+        self.assertEqual(3, self.checks.count(every_tick))
+        self.assertEqual(1, self.checks.count(slow))
+
+    def test_background_disabled(self):
+        module = CheckedModule(self.checks, duration=0.05, background=True)
+        started = time.time()
+        self.obj.check([module], 1)
+        self.assertGreaterEqual(time.time() - started, 0.05)
+        self.assertEqual({}, self.obj.background)
+
+    def test_background_threads_limit(self):
+        self.obj.threads = 1
+        first, second = [CheckedModule(self.checks, period=60, duration=0.05, background=True) for _ in range(2)]
+        self.obj.check([first, second], 1)
+        self.assertEqual([first], list(self.obj.background))
+        self.obj.wait_background()
+        self.obj.check([first, second], 1)
+        self.obj.wait_background()
+        self.assertEqual([first, second], self.checks)
+
+    def test_background_exception(self):
+        self.obj.threads = 1
+        module = CheckedModule(self.checks, background=True)
+        module.check = lambda: 1 / 0
+        self.obj.check([module], 1)
+        self.obj.background[module].join()
+        self.assertRaises(ZeroDivisionError, self.obj.check, [], 1)
+
+    def test_background_overrun(self):
+        self.obj.threads = 1
+        self.obj.timeout = 0.05
+        module = CheckedModule(self.checks, duration=1, background=True)
+        self.obj.check([module], 1)
+        time.sleep(0.1)
+        self.obj.check([module], 1)
+        self.assertEqual(1, self.obj.overruns_count)
+        self.assertEqual([module], self.checks)
+
+        started = time.time()
+        self.obj.wait_background()  # doesn't wait for overrun check
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual({}, self.obj.background)
@@ -1,10 +1,15 @@
 """ unit test """
+import os
 import sys
 import logging
+import tempfile
+import threading
+import time
+import unittest
 
 from psutil import Popen
 
-from bzt.utils import log_std_streams, get_uniq_name
+from bzt.utils import log_std_streams, get_uniq_name, FileReader, FileChangesWaiter, INotify
 from tests.mocks import RecordingHandler
 from tests import BZTestCase
 
@@ -45,3 +50,97 @@ class TestLogStreams(BZTestCase):
         self.assertNotIn('test3', debug_buf)
         self.assertIn('test5', debug_buf)
         self.assertTrue(len(warn_buf) > 0)
+
+
+class TestFileReader(BZTestCase):
+    def setUp(self):
+        super(TestFileReader, self).setUp()
+        fds, self.filename = tempfile.mkstemp()
+        os.close(fds)
+        self.obj = FileReader(self.filename, logging.getLogger(''))
+
+    def tearDown(self):
+        self.obj.close()
+        os.remove(self.filename)
+        super(TestFileReader, self).tearDown()
+
+    def write(self, data, mode='ab'):
+        with open(self.filename, mode) as fds:
+            fds.write(data)
+
+    def test_partial_lines(self):
+        self.assertFalse(self.obj.is_ready())
+        self.assertEqual([], self.obj.get_text_lines())
+
+        self.write(b"first\nsec")
+        self.assertEqual(["first"], self.obj.get_text_lines())
+
+        self.write(b"ond\nthird\n")
+        self.assertEqual(["second", "third"], self.obj.get_text_lines())
+        self.assertEqual("", self.obj.get_text())
+
+    def test_chunk_size(self):
+        self.write(b"x" * (FileReader.MIN_CHUNK * 3) + b"\n")
+        self.assertEqual(FileReader.MIN_CHUNK, len(self.obj.get_bytes()))
+        self.assertEqual(FileReader.MIN_CHUNK * 2, len(self.obj.get_bytes()))
+        self.assertEqual(1, len(self.obj.get_bytes(last_pass=True)))
+
+    def test_truncation(self):
+        self.write(b"first\nsecond\n")
+        self.assertEqual(["first", "second"], self.obj.get_text_lines())
+
+        self.write(b"third\n", mode='wb')
+        self.assertEqual(["third"], self.obj.get_text_lines())
+
+    def test_rotation(self):
+        self.write(b"first\nsecond\n")
+        self.assertEqual(["first", "second"], self.obj.get_text_lines())
+
+        self.write(b"third\n")
+        os.rename(self.filename, self.filename + ".1")
+        try:
+            self.write(b"fourth\n")
+            self.assertEqual(["third"], self.obj.get_text_lines())
+            self.assertEqual(["fourth"], self.obj.get_text_lines())
+        finally:
+            os.remove(self.filename + ".1")
+
+
+@unittest.skipUnless(INotify.is_available(), "inotify is Linux-only")
+class TestFileChangesWaiter(BZTestCase):
+    def setUp(self):
+        super(TestFileChangesWaiter, self).setUp()
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, "kpi.jtl")
+        self.obj = FileChangesWaiter(logging.getLogger(''))
+        self.obj.watch([self.filename])
+
+    def tearDown(self):
+        self.obj.close()
+        for fname in os.listdir(self.dirname):
+            os.remove(os.path.join(self.dirname, fname))
+        os.rmdir(self.dirname)
+        super(TestFileChangesWaiter, self).tearDown()
+
+    def write_later(self, filename, delay=0.1):
+        def write():
+            time.sleep(delay)
+            with open(filename, 'a') as fds:
+                fds.write("line\n")
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        return thread
+
+    def test_wake_up(self):
+        thread = self.write_later(self.filename)
+        start = time.time()
+        self.assertTrue(self.obj.wait(10, min_delay=0.3))
+        self.assertLess(time.time() - start, 5)
+        self.assertGreaterEqual(time.time() - start, 0.3)
+        thread.join()
+
+    def test_other_files_ignored(self):
+        thread = self.write_later(os.path.join(self.dirname, "bzt.log"))
+        self.assertFalse(self.obj.wait(0.5))
+        thread.join()